@@ -1,13 +1,25 @@
 #!/usr/bin/env python3
 """
 Analytics aggregation script
-Usage: python aggregate_analytics.py [--today]
+Usage: python aggregate_analytics.py [--today | --start YYYY-MM-DD [--end YYYY-MM-DD]]
+
+Without arguments every day since the last rolled-up day is aggregated, up
+to yesterday, so days a run missed are caught up by the next one.
+
+All active tenants are aggregated together with a few GROUP BY queries per
+date range, and the results are upserted into analytics_daily, so re-running
+the script for the same days is safe. Each run also archives old raw events
+to Parquet, creates upcoming monthly partitions of the raw analytics tables
+and drops expired ones.
 """
 import os
 import sys
-from datetime import date, timedelta
-from sqlalchemy import create_engine, func, cast, Date
-from sqlalchemy.orm import sessionmaker
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, cast, Date, Integer, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, sessionmaker
 from dotenv import load_dotenv
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -15,104 +27,391 @@ load_dotenv('.env')
 
 from database import engine
 from models import (
-    AnalyticsSession, AnalyticsPageView, 
-    AnalyticsItemClick, AnalyticsDaily, Tenant
+    AnalyticsSession, AnalyticsPageView,
+    AnalyticsItemClick, AnalyticsDaily, AnalyticsDevice, AnalyticsDeviceDaily, Tenant
 )
+from analytics_optimizer import day_range
+from analytics_partitions import maintain_partitions
+from analytics_archive import archive_expired_days, oldest_raw_day
+from hyperloglog import HyperLogLog
+from analytics_funnels import FUNNEL_STEPS, compute_path_stats
 
-def aggregate_date(db, tenant_id, target_date):
-    """Aggregate analytics for a specific date"""
-    
-    sessions = db.query(AnalyticsSession).filter(
-        AnalyticsSession.tenant_id == tenant_id,
-        cast(AnalyticsSession.started_at, Date) == target_date
-    ).all()
-    
-    if not sessions:
-        return None
-    
-    # Calculate metrics
-    total_sessions = len(sessions)
-    unique_visitors = len(set(s.ip_address_hash for s in sessions if s.ip_address_hash))
-    
-    durations = [s.duration_seconds for s in sessions if s.duration_seconds and s.duration_seconds > 0]
-    avg_duration = sum(durations) / len(durations) if durations else 0
-    
-    # Count devices
-    device_counts = {'mobile': 0, 'desktop': 0, 'tablet': 0}
-    for session in sessions:
-        device_type = (session.device_type or 'desktop').lower()
-        if device_type in device_counts:
-            device_counts[device_type] += 1
-    
-    # Get page views and clicks
-    page_views = db.query(func.count(AnalyticsPageView.id)).filter(
-        AnalyticsPageView.tenant_id == tenant_id,
-        cast(AnalyticsPageView.timestamp, Date) == target_date
-    ).scalar() or 0
-    
-    item_clicks = db.query(func.count(AnalyticsItemClick.id)).filter(
-        AnalyticsItemClick.tenant_id == tenant_id,
-        cast(AnalyticsItemClick.timestamp, Date) == target_date
-    ).scalar() or 0
-    
-    # Update or create daily record
-    daily = db.query(AnalyticsDaily).filter(
-        AnalyticsDaily.tenant_id == tenant_id,
-        AnalyticsDaily.date == target_date
-    ).first()
-    
-    if daily:
-        daily.total_sessions = total_sessions
-        daily.unique_visitors = unique_visitors
-        daily.total_page_views = page_views
-        daily.total_item_clicks = item_clicks
-        daily.avg_session_duration = avg_duration
-        daily.mobile_sessions = device_counts['mobile']
-        daily.desktop_sessions = device_counts['desktop']
-        daily.tablet_sessions = device_counts['tablet']
-    else:
-        daily = AnalyticsDaily(
-            tenant_id=tenant_id,
-            date=target_date,
-            total_sessions=total_sessions,
-            unique_visitors=unique_visitors,
-            total_page_views=page_views,
-            total_item_clicks=item_clicks,
-            avg_session_duration=avg_duration,
-            mobile_sessions=device_counts['mobile'],
-            desktop_sessions=device_counts['desktop'],
-            tablet_sessions=device_counts['tablet']
+# Number of analytics_daily rows written per INSERT ... ON CONFLICT statement
+UPSERT_BATCH_SIZE = 1000
+
+# Rows streamed at a time when building visitor sketches
+SKETCH_BATCH_SIZE = 10000
+
+def _counts_by_tenant_day(db: Session, model, ts_column, start: datetime, end: datetime,
+                          tenant_ids: Optional[Iterable[int]]) -> Dict[Tuple[int, date], int]:
+    """Count rows of an event table per (tenant_id, day)"""
+    day = cast(ts_column, Date)
+    query = db.query(
+        model.tenant_id, day, func.count(model.id)
+    ).filter(
+        ts_column >= start,
+        ts_column < end
+    )
+    if tenant_ids is not None:
+        query = query.filter(model.tenant_id.in_(tenant_ids))
+
+    return {
+        (tenant_id, row_day): count
+        for tenant_id, row_day, count in query.group_by(model.tenant_id, day).all()
+    }
+
+def _breakdown_by_tenant_day(db: Session, model, ts_column, key_column, start: datetime, end: datetime,
+                             tenant_ids: Optional[Iterable[int]], *filters) -> Dict[Tuple[int, date], Dict]:
+    """Count rows of an event table per (tenant_id, day, key_column)"""
+    day = cast(ts_column, Date)
+    query = db.query(
+        model.tenant_id, day, key_column, func.count(model.id)
+    ).filter(
+        ts_column >= start,
+        ts_column < end,
+        key_column.isnot(None),
+        *filters
+    )
+    if tenant_ids is not None:
+        query = query.filter(model.tenant_id.in_(tenant_ids))
+
+    breakdown = {}
+    for tenant_id, row_day, key, count in query.group_by(model.tenant_id, day, key_column).all():
+        breakdown.setdefault((tenant_id, row_day), {})[key] = count
+    return breakdown
+
+def _visitor_sketches(db: Session, start: datetime, end: datetime,
+                      tenant_ids: Optional[Iterable[int]]) -> Dict[Tuple[int, date], HyperLogLog]:
+    """Build a HyperLogLog of distinct visitor IP hashes per (tenant_id, day)"""
+    day = cast(AnalyticsSession.started_at, Date)
+    query = db.query(
+        AnalyticsSession.tenant_id, day, AnalyticsSession.ip_address_hash
+    ).filter(
+        AnalyticsSession.started_at >= start,
+        AnalyticsSession.started_at < end,
+        AnalyticsSession.ip_address_hash.isnot(None)
+    ).distinct()
+    if tenant_ids is not None:
+        query = query.filter(AnalyticsSession.tenant_id.in_(tenant_ids))
+
+    sketches = {}
+    for tenant_id, row_day, ip_hash in query.yield_per(SKETCH_BATCH_SIZE):
+        sketch = sketches.get((tenant_id, row_day))
+        if sketch is None:
+            sketch = sketches[(tenant_id, row_day)] = HyperLogLog()
+        sketch.add(ip_hash)
+    return sketches
+
+def _ranked(counts: Dict, key_name: str) -> List[Dict]:
+    """Turn {key: count} into [{key_name: key, "count": count}, ...] sorted by count"""
+    return [
+        {key_name: key, "count": count}
+        for key, count in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+    ]
+
+def compute_daily_rows(db: Session, start_date: date, end_date: date,
+                       tenant_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+    """
+    Compute analytics_daily rows for every active tenant and day in the range.
+
+    Uses a fixed set of grouped queries (totals plus item, category and hourly
+    breakdowns), so the number of round trips does not depend on the number of
+    tenants or days. Only (tenant, day) pairs with at least one session produce
+    a row. top_items/top_categories hold every clicked item / viewed category
+    of the day so they can be merged exactly across any date range,
+    visitor_sketch is a HyperLogLog that merges into multi-day unique visitors,
+    and funnel/top_paths/upsell_followups come from analytics_funnels.py.
+    """
+    start, end = day_range(start_date, end_date)
+    if tenant_ids is not None:
+        tenant_ids = list(tenant_ids)
+
+    day = cast(AnalyticsSession.started_at, Date)
+    device = func.lower(func.coalesce(AnalyticsDevice.device_type, 'desktop'))
+
+    session_query = db.query(
+        AnalyticsSession.tenant_id,
+        day.label("day"),
+        func.count(AnalyticsSession.id).label("total_sessions"),
+        func.count(func.distinct(AnalyticsSession.ip_address_hash)).label("unique_visitors"),
+        func.avg(AnalyticsSession.duration_seconds).filter(
+            AnalyticsSession.duration_seconds > 0
+        ).label("avg_duration"),
+        func.count(AnalyticsSession.id).filter(device == 'mobile').label("mobile"),
+        func.count(AnalyticsSession.id).filter(device == 'desktop').label("desktop"),
+        func.count(AnalyticsSession.id).filter(device == 'tablet').label("tablet")
+    ).join(
+        Tenant, Tenant.id == AnalyticsSession.tenant_id
+    ).outerjoin(
+        AnalyticsDevice, AnalyticsDevice.id == AnalyticsSession.device_id
+    ).filter(
+        Tenant.status == 'active',
+        AnalyticsSession.started_at >= start,
+        AnalyticsSession.started_at < end
+    )
+    if tenant_ids is not None:
+        session_query = session_query.filter(AnalyticsSession.tenant_id.in_(tenant_ids))
+
+    session_stats = session_query.group_by(AnalyticsSession.tenant_id, day).all()
+    if not session_stats:
+        return []
+
+    page_views = _counts_by_tenant_day(
+        db, AnalyticsPageView, AnalyticsPageView.timestamp, start, end, tenant_ids
+    )
+    item_clicks = _counts_by_tenant_day(
+        db, AnalyticsItemClick, AnalyticsItemClick.timestamp, start, end, tenant_ids
+    )
+    items = _breakdown_by_tenant_day(
+        db, AnalyticsItemClick, AnalyticsItemClick.timestamp, AnalyticsItemClick.item_id,
+        start, end, tenant_ids
+    )
+    categories = _breakdown_by_tenant_day(
+        db, AnalyticsPageView, AnalyticsPageView.timestamp, AnalyticsPageView.category_id,
+        start, end, tenant_ids, AnalyticsPageView.page_type == "category"
+    )
+    hours = _breakdown_by_tenant_day(
+        db, AnalyticsSession, AnalyticsSession.started_at,
+        cast(func.extract('hour', AnalyticsSession.started_at), Integer),
+        start, end, tenant_ids
+    )
+    sketches = _visitor_sketches(db, start, end, tenant_ids)
+    path_stats = compute_path_stats(db, start, end, tenant_ids)
+
+    rows = []
+    for stats in session_stats:
+        key = (stats.tenant_id, stats.day)
+        total_page_views = page_views.get(key, 0)
+        hourly = hours.get(key, {})
+        paths = path_stats.get(key, {})
+        rows.append({
+            "tenant_id": stats.tenant_id,
+            "date": stats.day,
+            "total_sessions": stats.total_sessions,
+            "unique_visitors": stats.unique_visitors,
+            "total_page_views": total_page_views,
+            "total_item_clicks": item_clicks.get(key, 0),
+            "avg_session_duration": int(stats.avg_duration or 0),
+            "avg_pages_per_session": round(total_page_views / stats.total_sessions, 2),
+            "mobile_sessions": stats.mobile,
+            "desktop_sessions": stats.desktop,
+            "tablet_sessions": stats.tablet,
+            "top_items": _ranked(items.get(key, {}), "item_id"),
+            "top_categories": _ranked(categories.get(key, {}), "category_id"),
+            "hourly_distribution": {str(hour): hourly.get(hour, 0) for hour in range(24)},
+            "visitor_sketch": sketches[key].to_bytes() if key in sketches else None,
+            "funnel": paths.get("funnel", {step: 0 for step in FUNNEL_STEPS}),
+            "top_paths": paths.get("top_paths", []),
+            "upsell_followups": paths.get("upsell_followups", [])
+        })
+
+    return rows
+
+def upsert_daily_rows(db: Session, rows: List[Dict]) -> int:
+    """Bulk upsert analytics_daily rows keyed on (tenant_id, date)"""
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[i:i + UPSERT_BATCH_SIZE]
+        stmt = insert(AnalyticsDaily).values(batch)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AnalyticsDaily.tenant_id, AnalyticsDaily.date],
+            set_={
+                column: stmt.excluded[column]
+                for column in batch[0].keys()
+                if column not in ("tenant_id", "date")
+            }
         )
-        db.add(daily)
-    
+        db.execute(stmt)
+
+    db.commit()
+    return len(rows)
+
+def compute_device_rows(db: Session, start_date: date, end_date: date,
+                        tenant_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+    """Compute analytics_device_daily rows (sessions per device model) for active tenants"""
+    start, end = day_range(start_date, end_date)
+    day = cast(AnalyticsSession.started_at, Date)
+
+    # Sessions are grouped by device_id alone (index-only on the sessions
+    # index); the small device dimension is joined to the grouped result
+    query = db.query(
+        AnalyticsSession.tenant_id,
+        day.label("day"),
+        AnalyticsSession.device_id,
+        func.count(AnalyticsSession.id).label("sessions")
+    ).join(
+        Tenant, Tenant.id == AnalyticsSession.tenant_id
+    ).filter(
+        Tenant.status == 'active',
+        AnalyticsSession.started_at >= start,
+        AnalyticsSession.started_at < end
+    )
+    if tenant_ids is not None:
+        query = query.filter(AnalyticsSession.tenant_id.in_(list(tenant_ids)))
+    per_device = query.group_by(AnalyticsSession.tenant_id, day, AnalyticsSession.device_id).subquery()
+
+    rows = db.query(
+        per_device.c.tenant_id,
+        per_device.c.day,
+        AnalyticsDevice.device_brand,
+        AnalyticsDevice.device_model,
+        AnalyticsDevice.device_full_name,
+        AnalyticsDevice.device_type,
+        func.sum(per_device.c.sessions).label("sessions")
+    ).join(
+        AnalyticsDevice, AnalyticsDevice.id == per_device.c.device_id
+    ).filter(
+        AnalyticsDevice.device_brand.isnot(None)
+    ).group_by(
+        per_device.c.tenant_id,
+        per_device.c.day,
+        AnalyticsDevice.device_brand,
+        AnalyticsDevice.device_model,
+        AnalyticsDevice.device_full_name,
+        AnalyticsDevice.device_type
+    ).all()
+
+    return [
+        {
+            "tenant_id": row.tenant_id,
+            "date": row.day,
+            "device_brand": row.device_brand,
+            "device_model": row.device_model,
+            "device_full_name": row.device_full_name,
+            "device_type": row.device_type,
+            "sessions": int(row.sessions)
+        }
+        for row in rows
+    ]
+
+def replace_device_rows(db: Session, days: Iterable[Tuple[int, date]], rows: List[Dict]) -> int:
+    """Replace the analytics_device_daily rows of the given (tenant_id, day) pairs"""
+    days = list(days)
+    for i in range(0, len(days), UPSERT_BATCH_SIZE):
+        db.query(AnalyticsDeviceDaily).filter(
+            tuple_(AnalyticsDeviceDaily.tenant_id, AnalyticsDeviceDaily.date).in_(days[i:i + UPSERT_BATCH_SIZE])
+        ).delete(synchronize_session=False)
+
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        db.execute(insert(AnalyticsDeviceDaily).values(rows[i:i + UPSERT_BATCH_SIZE]))
+
     db.commit()
-    return device_counts
+    return len(rows)
+
+def aggregate_range(db: Session, start_date: date, end_date: date,
+                    tenant_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+    """Aggregate and store analytics for all days between start_date and end_date (inclusive)"""
+    if tenant_ids is not None:
+        tenant_ids = list(tenant_ids)
+
+    rows = compute_daily_rows(db, start_date, end_date, tenant_ids)
+    if rows:
+        upsert_daily_rows(db, rows)
+        # Only days that still have raw sessions are rebuilt, so re-running
+        # the job after raw events were archived keeps the existing summaries
+        replace_device_rows(
+            db,
+            [(row["tenant_id"], row["date"]) for row in rows],
+            compute_device_rows(db, start_date, end_date, tenant_ids)
+        )
+    return rows
+
+def aggregate_date(db, tenant_id, target_date):
+    """Aggregate analytics for a specific tenant and date"""
+    rows = aggregate_range(db, target_date, target_date, tenant_ids=[tenant_id])
+    if not rows:
+        return None
+
+    row = rows[0]
+    return {
+        'mobile': row['mobile_sessions'],
+        'desktop': row['desktop_sessions'],
+        'tablet': row['tablet_sessions']
+    }
+
+def pending_rollup_start(db: Session) -> date:
+    """
+    First day a scheduled rollup covers: the day after the last day in
+    analytics_daily (yesterday at the latest, re-running it is an upsert),
+    or the oldest raw day when nothing was rolled up yet
+    """
+    yesterday = date.today() - timedelta(days=1)
+    last_day = db.query(func.max(AnalyticsDaily.date)).scalar()
+    if last_day is not None:
+        return min(last_day + timedelta(days=1), yesterday)
+    return min(oldest_raw_day(db) or yesterday, yesterday)
+
+def run_rollup(db: Session, start_date: date, end_date: date) -> Dict:
+    """
+    One full maintenance run: roll up the days, archive raw days past the
+    archive horizon, then roll partitions forward and drop expired ones
+    """
+    rows = aggregate_range(db, start_date, end_date)
+    archived = archive_expired_days(db)
+    partitions = maintain_partitions(db)
+    return {"rows": rows, "archived": archived, "partitions": partitions}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate raw analytics into analytics_daily")
+    parser.add_argument("--today", action="store_true", help="Aggregate today instead of the days up to yesterday")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to backfill (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to backfill, inclusive (defaults to --start)")
+    return parser.parse_args(argv)
 
 def main():
+    args = parse_args()
+
     Session = sessionmaker(bind=engine)
     db = Session()
-    
-    # Determine date
-    if len(sys.argv) > 1 and sys.argv[1] == '--today':
-        target_date = date.today()
-        print(f"Aggregating for TODAY ({target_date})")
+
+    # Determine date range
+    if args.start:
+        start_date = args.start
+        end_date = args.end or args.start
+        print(f"Aggregating from {start_date} to {end_date}")
+    elif args.today:
+        start_date = end_date = date.today()
+        print(f"Aggregating for TODAY ({start_date})")
     else:
-        target_date = date.today() - timedelta(days=1)
-        print(f"Aggregating for YESTERDAY ({target_date})")
-    
+        start_date = pending_rollup_start(db)
+        end_date = date.today() - timedelta(days=1)
+        print(f"Aggregating from {start_date} to YESTERDAY ({end_date})")
+
+    if end_date < start_date:
+        print("❌ Error: --end must not be before --start")
+        sys.exit(1)
+
     try:
-        tenants = db.query(Tenant).filter(Tenant.status == 'active').all()
-        
-        for tenant in tenants:
-            devices = aggregate_date(db, tenant.id, target_date)
-            if devices:
-                print(f"✅ {tenant.name}: Mobile={devices['mobile']}, "
-                      f"Desktop={devices['desktop']}, Tablet={devices['tablet']}")
-            else:
-                print(f"ℹ️  {tenant.name}: No data")
-        
+        result = run_rollup(db, start_date, end_date)
+        rows = result["rows"]
+
+        per_day = {}
+        for row in rows:
+            per_day.setdefault(row['date'], []).append(row)
+
+        for day in sorted(per_day):
+            day_rows = per_day[day]
+            print(f"✅ {day}: {len(day_rows)} tenants, "
+                  f"Mobile={sum(r['mobile_sessions'] for r in day_rows)}, "
+                  f"Desktop={sum(r['desktop_sessions'] for r in day_rows)}, "
+                  f"Tablet={sum(r['tablet_sessions'] for r in day_rows)}")
+
+        if not rows:
+            print("ℹ️  No data")
+
+        # Raw days moved past the archive horizon out of PostgreSQL
+        archived = result["archived"]
+        for day in sorted(archived):
+            print(f"📦 Archived {day}: {sum(archived[day].values())} raw rows")
+
+        # Partitions rolled forward and raw months dropped past the retention window
+        partitions = result["partitions"]
+        for name in partitions["created"]:
+            print(f"🗂  Created partition {name}")
+        for name in partitions["removed"]:
+            print(f"🗑  Dropped partition {name}")
+
         print("\nAggregation complete!")
-        
+
     except Exception as e:
         print(f"❌ Error: {e}")
         db.rollback()
@@ -0,0 +1,36 @@
+"""Add analytics time range indexes
+
+Revision ID: 5b1e7c3a9d20
+Revises: d2423f523452
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e7c3a9d20'
+down_revision: Union[str, None] = 'd2423f523452'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Composite indexes backing the half-open timestamp range filters used by
+    # the analytics dashboard and the daily aggregation job.
+    # These may already exist from migrations/add_performance_indexes.sql
+    op.create_index('idx_analytics_sessions_tenant_started', 'analytics_sessions',
+                    ['tenant_id', 'started_at'], if_not_exists=True)
+    op.create_index('idx_analytics_page_views_tenant_timestamp', 'analytics_page_views',
+                    ['tenant_id', 'timestamp'], if_not_exists=True)
+    op.create_index('idx_analytics_item_clicks_tenant_timestamp', 'analytics_item_clicks',
+                    ['tenant_id', 'timestamp'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_analytics_item_clicks_tenant_timestamp', 'analytics_item_clicks', if_exists=True)
+    op.drop_index('idx_analytics_page_views_tenant_timestamp', 'analytics_page_views', if_exists=True)
+    op.drop_index('idx_analytics_sessions_tenant_started', 'analytics_sessions', if_exists=True)
@@ -0,0 +1,136 @@
+"""Partition analytics event tables by month
+
+Revision ID: 9c4f2a61e8b3
+Revises: 5b1e7c3a9d20
+Create Date: 2026-10-19 11:03:27.540913
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4f2a61e8b3'
+down_revision: Union[str, None] = '5b1e7c3a9d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months of partitions created ahead of today; analytics_partitions.py keeps this rolling
+MONTHS_AHEAD = 3
+
+# table -> (partition key, foreign keys, extra indexes)
+TABLES = {
+    'analytics_sessions': (
+        'started_at',
+        [('tenant_id', 'tenants')],
+        [('ix_analytics_sessions_session_id', ['session_id']),
+         ('idx_analytics_sessions_tenant_started', ['tenant_id', 'started_at'])],
+    ),
+    'analytics_page_views': (
+        'timestamp',
+        [('tenant_id', 'tenants'), ('category_id', 'categories'), ('item_id', 'menu_items')],
+        [('ix_analytics_page_views_session_id', ['session_id']),
+         ('ix_analytics_page_views_timestamp', ['timestamp']),
+         ('idx_analytics_page_views_tenant_timestamp', ['tenant_id', 'timestamp'])],
+    ),
+    'analytics_item_clicks': (
+        'timestamp',
+        [('tenant_id', 'tenants'), ('category_id', 'categories'), ('item_id', 'menu_items')],
+        [('ix_analytics_item_clicks_session_id', ['session_id']),
+         ('ix_analytics_item_clicks_item_id', ['item_id']),
+         ('ix_analytics_item_clicks_timestamp', ['timestamp']),
+         ('idx_analytics_item_clicks_tenant_timestamp', ['tenant_id', 'timestamp'])],
+    ),
+}
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _is_partitioned(conn, table: str) -> bool:
+    return conn.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE relname = :table"), {'table': table}
+    ).scalar() == 'p'
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    # session_id can no longer be unique once analytics_sessions is partitioned
+    # (unique constraints must include the partition key), so the event tables
+    # keep session_id as a plain indexed reference
+    op.execute('ALTER TABLE analytics_page_views DROP CONSTRAINT IF EXISTS analytics_page_views_session_id_fkey')
+    op.execute('ALTER TABLE analytics_item_clicks DROP CONSTRAINT IF EXISTS analytics_item_clicks_session_id_fkey')
+
+    current_month = date.today().replace(day=1)
+
+    for table, (key, foreign_keys, indexes) in TABLES.items():
+        if _is_partitioned(conn, table):
+            continue
+
+        legacy = f'{table}_legacy'
+        op.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+        op.execute(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE ("{key}")')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+
+        # One partition per month from the oldest row up to MONTHS_AHEAD months from now
+        oldest = conn.execute(sa.text(f'SELECT min("{key}") FROM {legacy}')).scalar()
+        month = oldest.date().replace(day=1) if oldest else current_month
+        while month <= _add_months(current_month, MONTHS_AHEAD):
+            next_month = _add_months(month, 1)
+            op.execute(
+                f'CREATE TABLE {table}_y{month.year}m{month.month:02d} PARTITION OF {table} '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+            )
+            month = next_month
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+        op.execute(f'INSERT INTO {table} SELECT * FROM {legacy}')
+        op.execute(f'DROP TABLE {legacy}')
+
+        # Constraints and indexes are created after the legacy table is gone so
+        # their names are free; on a partitioned table they cascade to every partition
+        op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, "{key}")')
+
+        for column, referenced in foreign_keys:
+            op.create_foreign_key(f'{table}_{column}_fkey', table, referenced, [column], ['id'])
+        op.create_index(f'ix_{table}_id', table, ['id'])
+        op.create_index(f'ix_{table}_tenant_id', table, ['tenant_id'])
+        for name, columns in indexes:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+
+    for table, (key, foreign_keys, indexes) in TABLES.items():
+        if not _is_partitioned(conn, table):
+            continue
+
+        partitioned = f'{table}_partitioned'
+        op.execute(f'ALTER TABLE {table} RENAME TO {partitioned}')
+        op.execute(f'CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS)')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+        op.execute(f'INSERT INTO {table} SELECT * FROM {partitioned}')
+        op.execute(f'DROP TABLE {partitioned} CASCADE')
+        op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id)')
+
+        for column, referenced in foreign_keys:
+            op.create_foreign_key(f'{table}_{column}_fkey', table, referenced, [column], ['id'])
+        op.create_index(f'ix_{table}_id', table, ['id'])
+        op.create_index(f'ix_{table}_tenant_id', table, ['tenant_id'])
+        for name, columns in indexes:
+            if name == 'ix_analytics_sessions_session_id':
+                op.create_index(name, table, columns, unique=True)
+            else:
+                op.create_index(name, table, columns)
+
+    op.create_foreign_key('analytics_page_views_session_id_fkey', 'analytics_page_views',
+                          'analytics_sessions', ['session_id'], ['session_id'])
+    op.create_foreign_key('analytics_item_clicks_session_id_fkey', 'analytics_item_clicks',
+                          'analytics_sessions', ['session_id'], ['session_id'])
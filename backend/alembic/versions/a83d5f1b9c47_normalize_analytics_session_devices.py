@@ -0,0 +1,97 @@
+"""Normalize analytics session devices
+
+Revision ID: a83d5f1b9c47
+Revises: f7a2c95d3e18
+Create Date: 2026-10-19 14:48:13.662091
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a83d5f1b9c47'
+down_revision: Union[str, None] = 'f7a2c95d3e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Parsed user agent columns moved from analytics_sessions to analytics_devices
+DEVICE_COLUMNS = [
+    ('user_agent', sa.String(length=500)),
+    ('device_type', sa.String(length=50)),
+    ('browser', sa.String(length=50)),
+    ('os', sa.String(length=50)),
+    ('device_brand', sa.String(length=50)),
+    ('device_model', sa.String(length=100)),
+    ('device_full_name', sa.String(length=150)),
+]
+
+# Same hash as hashlib.sha256(user_agent.encode()).hexdigest() in analytics_routes.py
+UA_HASH = "encode(sha256(convert_to(coalesce({table}.user_agent, ''), 'UTF8')), 'hex')"
+
+
+def upgrade() -> None:
+    op.create_table(
+        'analytics_devices',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('ua_hash', sa.String(length=64), nullable=False),
+        *[sa.Column(name, column_type, nullable=True) for name, column_type in DEVICE_COLUMNS],
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('ua_hash')
+    )
+    op.create_index('ix_analytics_devices_id', 'analytics_devices', ['id'])
+
+    columns = ', '.join(name for name, _ in DEVICE_COLUMNS)
+
+    # One device per distinct user agent, keeping the most recent parse of it
+    op.execute(f"""
+        INSERT INTO analytics_devices (ua_hash, {columns}, created_at)
+        SELECT DISTINCT ON (ua_hash) ua_hash, {columns}, started_at
+        FROM (
+            SELECT {UA_HASH.format(table='analytics_sessions')} AS ua_hash, {columns}, started_at
+            FROM analytics_sessions
+        ) sessions
+        ORDER BY ua_hash, started_at DESC
+    """)
+
+    op.add_column('analytics_sessions', sa.Column('device_id', sa.Integer(), nullable=True))
+    op.execute(f"""
+        UPDATE analytics_sessions
+        SET device_id = analytics_devices.id
+        FROM analytics_devices
+        WHERE analytics_devices.ua_hash = {UA_HASH.format(table='analytics_sessions')}
+    """)
+    op.create_foreign_key('analytics_sessions_device_id_fkey', 'analytics_sessions',
+                          'analytics_devices', ['device_id'], ['id'])
+
+    # Device breakdowns group sessions of a tenant/time range by device_id only
+    op.drop_index('idx_analytics_sessions_tenant_started', table_name='analytics_sessions')
+    op.create_index('idx_analytics_sessions_tenant_started', 'analytics_sessions',
+                    ['tenant_id', 'started_at', 'device_id'])
+
+    for name, _ in DEVICE_COLUMNS:
+        op.drop_column('analytics_sessions', name)
+
+
+def downgrade() -> None:
+    for name, column_type in DEVICE_COLUMNS:
+        op.add_column('analytics_sessions', sa.Column(name, column_type, nullable=True))
+
+    assignments = ', '.join(f'{name} = analytics_devices.{name}' for name, _ in DEVICE_COLUMNS)
+    op.execute(f"""
+        UPDATE analytics_sessions
+        SET {assignments}
+        FROM analytics_devices
+        WHERE analytics_devices.id = analytics_sessions.device_id
+    """)
+
+    op.drop_index('idx_analytics_sessions_tenant_started', table_name='analytics_sessions')
+    op.create_index('idx_analytics_sessions_tenant_started', 'analytics_sessions',
+                    ['tenant_id', 'started_at'])
+    op.drop_constraint('analytics_sessions_device_id_fkey', 'analytics_sessions', type_='foreignkey')
+    op.drop_column('analytics_sessions', 'device_id')
+    op.drop_index('ix_analytics_devices_id', table_name='analytics_devices')
+    op.drop_table('analytics_devices')
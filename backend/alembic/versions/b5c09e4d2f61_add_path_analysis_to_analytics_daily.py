@@ -0,0 +1,32 @@
+"""Add path analysis to analytics daily
+
+Revision ID: b5c09e4d2f61
+Revises: a83d5f1b9c47
+Create Date: 2026-10-19 15:31:40.128553
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5c09e4d2f61'
+down_revision: Union[str, None] = 'a83d5f1b9c47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled by the daily aggregation job (see analytics_funnels.py)
+    op.add_column('analytics_daily', sa.Column('funnel', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('analytics_daily', sa.Column('top_paths', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('analytics_daily', sa.Column('upsell_followups', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('analytics_daily', 'upsell_followups')
+    op.drop_column('analytics_daily', 'top_paths')
+    op.drop_column('analytics_daily', 'funnel')
@@ -0,0 +1,35 @@
+"""Add scheduled job runs
+
+Revision ID: c3e8a1f0d724
+Revises: b5c09e4d2f61
+Create Date: 2026-10-19 16:12:05.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a1f0d724'
+down_revision: Union[str, None] = 'b5c09e4d2f61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'scheduled_job_runs',
+        sa.Column('job_name', sa.String(length=100), nullable=False),
+        sa.Column('last_started_at', sa.DateTime(), nullable=True),
+        sa.Column('last_finished_at', sa.DateTime(), nullable=True),
+        sa.Column('last_duration', sa.Float(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('runs', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('job_name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('scheduled_job_runs')
@@ -0,0 +1,26 @@
+"""Add menu items best seller rank index
+
+Revision ID: d9b4e27c51a8
+Revises: c3e8a1f0d724
+Create Date: 2026-10-19 16:48:22.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9b4e27c51a8'
+down_revision: Union[str, None] = 'c3e8a1f0d724'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_menu_items_tenant_best_seller_rank', 'menu_items', ['tenant_id', 'best_seller_rank', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_menu_items_tenant_best_seller_rank', table_name='menu_items')
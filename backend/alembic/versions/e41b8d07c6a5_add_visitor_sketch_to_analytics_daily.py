@@ -0,0 +1,29 @@
+"""Add visitor sketch to analytics daily
+
+Revision ID: e41b8d07c6a5
+Revises: 9c4f2a61e8b3
+Create Date: 2026-10-19 13:26:08.914377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41b8d07c6a5'
+down_revision: Union[str, None] = '9c4f2a61e8b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # HyperLogLog of visitor IP hashes per tenant and day. Existing rows stay
+    # NULL until re-aggregated (python aggregate_analytics.py --start ...);
+    # until then their unique_visitors are summed instead of merged.
+    op.add_column('analytics_daily', sa.Column('visitor_sketch', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('analytics_daily', 'visitor_sketch')
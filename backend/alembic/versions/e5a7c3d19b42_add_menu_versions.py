@@ -0,0 +1,46 @@
+"""Add menu versions
+
+Revision ID: e5a7c3d19b42
+Revises: d9b4e27c51a8
+Create Date: 2026-10-19 18:05:37.216904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c3d19b42'
+down_revision: Union[str, None] = 'd9b4e27c51a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'menu_versions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('items', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('categories', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('item_count', sa.Integer(), nullable=True),
+        sa.Column('published_by', sa.Integer(), nullable=True),
+        sa.Column('published_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['published_by'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_menu_versions_id'), 'menu_versions', ['id'], unique=False)
+    op.create_index('idx_menu_versions_tenant_version', 'menu_versions', ['tenant_id', 'version'], unique=True)
+    op.add_column('tenants', sa.Column('published_menu_version', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tenants', 'published_menu_version')
+    op.drop_index('idx_menu_versions_tenant_version', table_name='menu_versions')
+    op.drop_index(op.f('ix_menu_versions_id'), table_name='menu_versions')
+    op.drop_table('menu_versions')
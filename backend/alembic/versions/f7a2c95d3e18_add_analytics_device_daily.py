@@ -0,0 +1,55 @@
+"""Add analytics device daily
+
+Revision ID: f7a2c95d3e18
+Revises: e41b8d07c6a5
+Create Date: 2026-10-19 14:02:51.207634
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a2c95d3e18'
+down_revision: Union[str, None] = 'e41b8d07c6a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'analytics_device_daily',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('device_brand', sa.String(length=50), nullable=True),
+        sa.Column('device_model', sa.String(length=100), nullable=True),
+        sa.Column('device_full_name', sa.String(length=150), nullable=True),
+        sa.Column('device_type', sa.String(length=50), nullable=True),
+        sa.Column('sessions', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_analytics_device_daily_id', 'analytics_device_daily', ['id'])
+    op.create_index('idx_analytics_device_daily_tenant_date', 'analytics_device_daily', ['tenant_id', 'date'])
+
+    # Backfill past days from the raw sessions still in the database
+    op.execute("""
+        INSERT INTO analytics_device_daily
+            (tenant_id, date, device_brand, device_model, device_full_name, device_type, sessions)
+        SELECT tenant_id, CAST(started_at AS DATE), device_brand, device_model,
+               device_full_name, device_type, count(id)
+        FROM analytics_sessions
+        WHERE device_brand IS NOT NULL
+          AND started_at < CURRENT_DATE
+        GROUP BY tenant_id, CAST(started_at AS DATE), device_brand, device_model,
+                 device_full_name, device_type
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_analytics_device_daily_tenant_date', table_name='analytics_device_daily')
+    op.drop_index('ix_analytics_device_daily_id', table_name='analytics_device_daily')
+    op.drop_table('analytics_device_daily')
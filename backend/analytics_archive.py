@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Analytics Archive for MenuIQ
+Usage: python analytics_archive.py archive [--before YYYY-MM-DD]
+       python analytics_archive.py query TABLE --tenant ID --start YYYY-MM-DD [--end YYYY-MM-DD]
+
+Raw analytics events of days that are already rolled up into analytics_daily
+are exported to zstd-compressed Parquet files and deleted from PostgreSQL,
+which keeps the OLTP tables small while the history stays queryable.
+
+Files are laid out hive-style so readers can prune by tenant and day:
+    {ANALYTICS_ARCHIVE_DIR}/{table}/tenant_id={id}/date={YYYY-MM-DD}/part-0.parquet
+{ANALYTICS_ARCHIVE_DIR}/archived_through records the last archived day.
+"""
+import os
+import sys
+import argparse
+import logging
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+from sqlalchemy import func, Boolean, DateTime, Date, Integer, Float
+from sqlalchemy.orm import Session, sessionmaker
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+load_dotenv('.env')
+
+from database import engine
+from models import AnalyticsSession, AnalyticsPageView, AnalyticsItemClick
+from analytics_optimizer import day_range
+from analytics_partitions import list_partitions
+
+logger = logging.getLogger(__name__)
+
+# Root directory of the archived Parquet datasets
+ARCHIVE_DIR = Path(os.getenv("ANALYTICS_ARCHIVE_DIR", "archive/analytics"))
+
+# Raw events older than this many days are archived (0 disables archival)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ANALYTICS_ARCHIVE_AFTER_DAYS", "90"))
+
+# Rows fetched from PostgreSQL and written to Parquet at a time
+ARCHIVE_BATCH_SIZE = 10000
+
+# Last day archived (ISO date), so finding the next one needs no table scan
+WATERMARK_PATH = ARCHIVE_DIR / "archived_through"
+
+# Table name -> (model, timestamp column)
+ARCHIVED_TABLES = {
+    "analytics_sessions": (AnalyticsSession, AnalyticsSession.started_at),
+    "analytics_page_views": (AnalyticsPageView, AnalyticsPageView.timestamp),
+    "analytics_item_clicks": (AnalyticsItemClick, AnalyticsItemClick.timestamp),
+}
+
+# tenant_id and date live in the directory names, not inside the files
+ARCHIVE_PARTITIONING = ds.partitioning(
+    pa.schema([("tenant_id", pa.int32()), ("date", pa.date32())]),
+    flavor="hive"
+)
+
+def _arrow_type(column):
+    """Arrow type used to store a SQLAlchemy column"""
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column.type, Date):
+        return pa.date32()
+    return pa.string()
+
+def archive_schema(model) -> pa.Schema:
+    """Parquet schema of an archived table (every column except tenant_id)"""
+    return pa.schema([
+        (column.name, _arrow_type(column))
+        for column in model.__table__.columns
+        if column.name != "tenant_id"
+    ])
+
+def dataset_schema(model) -> pa.Schema:
+    """Schema of archived rows as read back, including the partition columns"""
+    return pa.unify_schemas([archive_schema(model), ARCHIVE_PARTITIONING.schema])
+
+def partition_dir(table: str, tenant_id: int, day: date) -> Path:
+    """Directory holding the archived rows of one tenant and day"""
+    return ARCHIVE_DIR / table / f"tenant_id={tenant_id}" / f"date={day.isoformat()}"
+
+def _next_part_path(directory: Path) -> Path:
+    """First unused part-N.parquet in directory, so late rows never overwrite earlier exports"""
+    index = 0
+    while (directory / f"part-{index}.parquet").exists():
+        index += 1
+    return directory / f"part-{index}.parquet"
+
+def _export_day(db: Session, table: str, day: date) -> Dict[int, int]:
+    """Stream one day of a raw table into per-tenant Parquet files; returns rows per tenant"""
+    model, ts_column = ARCHIVED_TABLES[table]
+    start, end = day_range(day, day)
+    schema = archive_schema(model)
+    columns = [getattr(model, name) for name in schema.names]
+
+    query = db.query(model.tenant_id, *columns).filter(
+        ts_column >= start,
+        ts_column < end
+    ).order_by(model.tenant_id).yield_per(ARCHIVE_BATCH_SIZE)
+
+    exported = {}
+    writer = None
+    tmp_path = final_path = None
+    tenant_id = None
+    batch = []
+
+    def flush():
+        if batch:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            batch.clear()
+
+    def close():
+        # Files are renamed into place only once complete
+        flush()
+        writer.close()
+        tmp_path.rename(final_path)
+
+    try:
+        for row in query:
+            if row[0] != tenant_id:
+                if writer is not None:
+                    close()
+                tenant_id = row[0]
+                directory = partition_dir(table, tenant_id, day)
+                directory.mkdir(parents=True, exist_ok=True)
+                final_path = _next_part_path(directory)
+                tmp_path = final_path.with_suffix(".parquet.tmp")
+                writer = pq.ParquetWriter(tmp_path, schema, compression="zstd")
+                exported[tenant_id] = 0
+
+            batch.append(dict(zip(schema.names, row[1:])))
+            exported[tenant_id] += 1
+            if len(batch) >= ARCHIVE_BATCH_SIZE:
+                flush()
+
+        if writer is not None:
+            close()
+    except Exception:
+        if writer is not None and tmp_path.exists():
+            writer.close()
+            tmp_path.unlink()
+        raise
+
+    return exported
+
+def archive_day(db: Session, day: date) -> Dict[str, int]:
+    """
+    Export one day of raw events to Parquet and delete them from PostgreSQL.
+
+    Rows are deleted only after every file of the day has been written, so a
+    failure leaves the rows in place to be archived again on the next run.
+    """
+    start, end = day_range(day, day)
+    archived = {}
+
+    for table in ARCHIVED_TABLES:
+        archived[table] = sum(_export_day(db, table, day).values())
+
+    for table, (model, ts_column) in ARCHIVED_TABLES.items():
+        if archived[table]:
+            db.query(model).filter(
+                ts_column >= start,
+                ts_column < end
+            ).delete(synchronize_session=False)
+    db.commit()
+
+    return archived
+
+def archived_through() -> Optional[date]:
+    """Last day whose raw events were archived, if any run recorded it"""
+    try:
+        return date.fromisoformat(WATERMARK_PATH.read_text().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _record_archived_through(day: date):
+    """Advance the watermark to day (never backwards)"""
+    current = archived_through()
+    if current is not None and current >= day:
+        return
+    WATERMARK_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = WATERMARK_PATH.with_suffix(".tmp")
+    tmp_path.write_text(day.isoformat())
+    tmp_path.rename(WATERMARK_PATH)
+
+def archive_range(db: Session, start_date: date, end_date: date) -> Dict[date, Dict[str, int]]:
+    """Roll up, export and delete raw events for every day between start_date and end_date (inclusive)"""
+    from aggregate_analytics import aggregate_range
+
+    # analytics_daily must be final before the raw rows disappear
+    aggregate_range(db, start_date, end_date)
+
+    archived = {}
+    day = start_date
+    while day <= end_date:
+        counts = archive_day(db, day)
+        if any(counts.values()):
+            archived[day] = counts
+            logger.info(f"Archived analytics for {day}: {counts}")
+        day += timedelta(days=1)
+
+    _record_archived_through(end_date)
+    return archived
+
+def oldest_raw_day(db: Session) -> Optional[date]:
+    """
+    Earliest day that may still have raw events in PostgreSQL: the day after
+    the watermark, else the lowest monthly partition bound. Only a first run
+    on unpartitioned tables falls back to scanning for min(timestamp), as no
+    index leads with the timestamp columns.
+    """
+    watermark = archived_through()
+    if watermark is not None:
+        return watermark + timedelta(days=1)
+
+    months = [
+        month
+        for table in ARCHIVED_TABLES
+        for month in list_partitions(db, table).values()
+        if month is not None
+    ]
+    if months:
+        return min(months)
+
+    oldest = [
+        db.query(func.min(ts_column)).scalar()
+        for _, ts_column in ARCHIVED_TABLES.values()
+    ]
+    oldest = [ts for ts in oldest if ts is not None]
+    return min(oldest).date() if oldest else None
+
+def archive_expired_days(db: Session, before: Optional[date] = None) -> Dict[date, Dict[str, int]]:
+    """Archive every raw day older than before (defaults to ARCHIVE_AFTER_DAYS ago)"""
+    if before is None:
+        if ARCHIVE_AFTER_DAYS <= 0:
+            return {}
+        before = date.today() - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+    first_day = oldest_raw_day(db)
+    if first_day is None or first_day >= before:
+        # Nothing before the horizon: later runs can start from it
+        _record_archived_through(before - timedelta(days=1))
+        return {}
+
+    return archive_range(db, first_day, before - timedelta(days=1))
+
+def read_archive(
+    table: str,
+    tenant_id: int,
+    start_date: date,
+    end_date: date,
+    columns: Optional[List[str]] = None
+) -> pa.Table:
+    """
+    Read archived events of a tenant between start_date and end_date (inclusive).
+
+    Only the matching tenant/date directories are opened. The result is a
+    pyarrow Table, which can be grouped/filtered further or converted with
+    to_pylist() / to_pandas() for ad-hoc analysis.
+    """
+    if table not in ARCHIVED_TABLES:
+        raise ValueError(f"Unknown analytics table: {table}")
+
+    model, _ = ARCHIVED_TABLES[table]
+    root = ARCHIVE_DIR / table
+    if not (root / f"tenant_id={tenant_id}").exists():
+        schema = dataset_schema(model)
+        if columns is not None:
+            schema = pa.schema([schema.field(name) for name in columns])
+        return schema.empty_table()
+
+    # Explicit schema: files written before a column was added must not
+    # decide the columns (or types) of the whole result
+    dataset = ds.dataset(
+        root, schema=dataset_schema(model), format="parquet", partitioning=ARCHIVE_PARTITIONING
+    )
+    return dataset.to_table(
+        columns=columns,
+        filter=(ds.field("tenant_id") == tenant_id)
+        & (ds.field("date") >= start_date)
+        & (ds.field("date") <= end_date)
+    )
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Archive raw analytics to Parquet and query the archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive = commands.add_parser("archive", help="Export and delete raw events of old days")
+    archive.add_argument("--before", type=date.fromisoformat,
+                         help=f"Archive days before this date (defaults to {ARCHIVE_AFTER_DAYS} days ago)")
+
+    query = commands.add_parser("query", help="Print archived events as CSV")
+    query.add_argument("table", choices=sorted(ARCHIVED_TABLES))
+    query.add_argument("--tenant", type=int, required=True, help="Tenant ID")
+    query.add_argument("--start", type=date.fromisoformat, required=True, help="First day (YYYY-MM-DD)")
+    query.add_argument("--end", type=date.fromisoformat, help="Last day, inclusive (defaults to --start)")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+
+    if args.command == "query":
+        result = read_archive(args.table, args.tenant, args.start, args.end or args.start)
+        pa_csv.write_csv(result, sys.stdout.buffer)
+        return
+
+    Session = sessionmaker(bind=engine)
+    db = Session()
+
+    try:
+        archived = archive_expired_days(db, args.before)
+        for day in sorted(archived):
+            counts = archived[day]
+            print(f"📦 {day}: " + ", ".join(f"{table}={count}" for table, count in counts.items()))
+
+        if not archived:
+            print("ℹ️  Nothing to archive")
+
+        print("\nArchival complete!")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
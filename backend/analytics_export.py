@@ -0,0 +1,81 @@
+"""
+Analytics Export for MenuIQ
+
+Streams a tenant's raw analytics rows as CSV or NDJSON. Rows are fetched
+through a server-side cursor (yield_per) and written out in chunks, so memory
+use stays bounded no matter how long the requested date range is.
+
+Only rows still in PostgreSQL are exported; days moved to the Parquet archive
+are read with analytics_archive.py.
+"""
+import io
+import csv
+import json
+from datetime import date, datetime
+from typing import Iterator
+
+from database import SessionLocal
+from models import AnalyticsSession, AnalyticsPageView, AnalyticsItemClick
+from analytics_optimizer import day_range
+
+# Rows fetched per round trip and written per response chunk
+EXPORT_BATCH_SIZE = 1000
+
+# Export name -> (model, timestamp column)
+EXPORT_TABLES = {
+    "sessions": (AnalyticsSession, AnalyticsSession.started_at),
+    "page_views": (AnalyticsPageView, AnalyticsPageView.timestamp),
+    "item_clicks": (AnalyticsItemClick, AnalyticsItemClick.timestamp),
+}
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def stream_export(tenant_id: int, table: str, start_date: date, end_date: date,
+                  export_format: str) -> Iterator[str]:
+    """Yield the export of one table for a tenant and inclusive date range in chunks"""
+    model, ts_column = EXPORT_TABLES[table]
+    columns = list(model.__table__.columns)
+    names = [column.name for column in columns]
+    range_start, range_end = day_range(start_date, end_date)
+
+    # Own session: it must stay open until the last chunk has been sent
+    db = SessionLocal()
+    try:
+        rows = db.query(*columns).filter(
+            model.tenant_id == tenant_id,
+            ts_column >= range_start,
+            ts_column < range_end
+        ).order_by(ts_column).yield_per(EXPORT_BATCH_SIZE)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if export_format == "csv" else None
+        if writer:
+            writer.writerow(names)
+
+        pending = 0
+        for row in rows:
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps({name: _json_value(value) for name, value in zip(names, row)}))
+                buffer.write("\n")
+
+            pending += 1
+            if pending >= EXPORT_BATCH_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
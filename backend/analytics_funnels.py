@@ -0,0 +1,182 @@
+"""
+Funnel and Path Analysis for MenuIQ
+
+Turns the page view / item click sequence of each session into:
+- funnel: sessions reaching each step of menu -> category -> item click, in order
+- top_paths: the most common first steps of a session, e.g.
+  ["menu", "category:4", "item:17"] (consecutive repeats collapsed)
+- upsell_followups: items clicked after the session was exposed to an upsell
+  item (viewed a category holding one, or clicked one)
+
+Everything is computed per tenant and day by the daily aggregation job and
+stored on analytics_daily, so each run only reads one day of raw events and
+any date range is answered by merging the stored days.
+"""
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+FUNNEL_STEPS = ("menu", "category", "item_click")
+
+# Steps kept per session path and paths stored per tenant/day
+PATH_LENGTH = 4
+PATHS_PER_DAY = 50
+
+# Page views and clicks of the range as one ordered event stream
+EVENTS_SQL = """
+    SELECT tenant_id, session_id, timestamp AS ts, page_type AS step,
+           category_id, item_id,
+           CASE
+               WHEN page_type = 'category' THEN 'category:' || category_id
+               WHEN page_type = 'item_detail' THEN 'item_detail:' || item_id
+               ELSE page_type
+           END AS token
+    FROM analytics_page_views
+    WHERE timestamp >= :start AND timestamp < :end
+      AND (CAST(:tenant_ids AS integer[]) IS NULL OR tenant_id = ANY(:tenant_ids))
+    UNION ALL
+    SELECT tenant_id, session_id, timestamp, 'item_click', category_id, item_id,
+           'item:' || item_id
+    FROM analytics_item_clicks
+    WHERE timestamp >= :start AND timestamp < :end
+      AND (CAST(:tenant_ids AS integer[]) IS NULL OR tenant_id = ANY(:tenant_ids))
+"""
+
+FUNNEL_SQL = f"""
+    WITH events AS ({EVENTS_SQL}),
+    sessions AS (
+        SELECT tenant_id, CAST(ts AS DATE) AS day, session_id,
+               min(ts) FILTER (WHERE step = 'menu') AS menu_at,
+               min(ts) FILTER (WHERE step = 'category') AS category_at,
+               min(ts) FILTER (WHERE step = 'item_click') AS click_at
+        FROM events
+        GROUP BY tenant_id, CAST(ts AS DATE), session_id
+    )
+    SELECT tenant_id, day,
+           count(*) FILTER (WHERE menu_at IS NOT NULL) AS menu,
+           count(*) FILTER (WHERE category_at >= menu_at) AS category,
+           count(*) FILTER (WHERE click_at >= category_at AND category_at >= menu_at) AS item_click
+    FROM sessions
+    GROUP BY tenant_id, day
+"""
+
+PATHS_SQL = f"""
+    WITH events AS ({EVENTS_SQL}),
+    ordered AS (
+        SELECT tenant_id, CAST(ts AS DATE) AS day, session_id, ts, token,
+               lag(token) OVER (
+                   PARTITION BY tenant_id, CAST(ts AS DATE), session_id ORDER BY ts
+               ) AS previous_token
+        FROM events
+    ),
+    paths AS (
+        SELECT tenant_id, day, session_id,
+               (array_agg(token ORDER BY ts))[1:{PATH_LENGTH}] AS path
+        FROM ordered
+        WHERE previous_token IS DISTINCT FROM token
+        GROUP BY tenant_id, day, session_id
+    )
+    SELECT tenant_id, day, path, count(*) AS sessions
+    FROM paths
+    GROUP BY tenant_id, day, path
+"""
+
+UPSELL_SQL = f"""
+    WITH events AS ({EVENTS_SQL}),
+    upsell_categories AS (
+        SELECT DISTINCT category_id FROM menu_items WHERE is_upsell AND category_id IS NOT NULL
+    ),
+    exposure AS (
+        SELECT events.tenant_id, CAST(events.ts AS DATE) AS day, events.session_id,
+               min(events.ts) AS exposed_at
+        FROM events
+        LEFT JOIN menu_items upsell_item
+               ON upsell_item.id = events.item_id AND upsell_item.is_upsell
+        WHERE upsell_item.id IS NOT NULL
+           OR (events.step = 'category'
+               AND events.category_id IN (SELECT category_id FROM upsell_categories))
+        GROUP BY events.tenant_id, CAST(events.ts AS DATE), events.session_id
+    )
+    SELECT events.tenant_id, exposure.day, events.item_id, count(*) AS clicks
+    FROM events
+    JOIN exposure
+      ON exposure.tenant_id = events.tenant_id
+     AND exposure.session_id = events.session_id
+     AND exposure.day = CAST(events.ts AS DATE)
+    WHERE events.step = 'item_click' AND events.ts > exposure.exposed_at
+    GROUP BY events.tenant_id, exposure.day, events.item_id
+"""
+
+def compute_path_stats(db: Session, start: datetime, end: datetime,
+                       tenant_ids: Optional[Iterable[int]] = None) -> Dict[Tuple[int, date], Dict]:
+    """
+    Funnel, top paths and upsell follow-up clicks per (tenant_id, day) for
+    raw events in [start, end). Three statements regardless of tenant count.
+    """
+    params = {
+        "start": start,
+        "end": end,
+        "tenant_ids": list(tenant_ids) if tenant_ids is not None else None
+    }
+    stats = {}
+
+    def entry(tenant_id, day):
+        return stats.setdefault((tenant_id, day), {
+            "funnel": {step: 0 for step in FUNNEL_STEPS},
+            "top_paths": [],
+            "upsell_followups": []
+        })
+
+    for row in db.execute(text(FUNNEL_SQL), params):
+        entry(row.tenant_id, row.day)["funnel"] = {step: getattr(row, step) for step in FUNNEL_STEPS}
+
+    for row in db.execute(text(PATHS_SQL), params):
+        entry(row.tenant_id, row.day)["top_paths"].append({"path": list(row.path), "count": row.sessions})
+
+    for row in db.execute(text(UPSELL_SQL), params):
+        entry(row.tenant_id, row.day)["upsell_followups"].append({"item_id": row.item_id, "count": row.clicks})
+
+    for day_stats in stats.values():
+        day_stats["top_paths"] = sorted(
+            day_stats["top_paths"], key=lambda p: (-p["count"], p["path"])
+        )[:PATHS_PER_DAY]
+        day_stats["upsell_followups"].sort(key=lambda i: (-i["count"], i["item_id"]))
+
+    return stats
+
+def merge_path_stats(daily_stats: Iterable[Dict], limit: int = 10) -> Dict:
+    """
+    Merge per-day funnel/path/upsell stats into one result for a date range.
+
+    Paths are summed over each day's stored top PATHS_PER_DAY, so counts of
+    rare paths are lower bounds.
+    """
+    funnel = Counter()
+    paths = Counter()
+    followups = Counter()
+
+    for day in daily_stats:
+        funnel.update(day.get("funnel") or {})
+        for entry in day.get("top_paths") or []:
+            paths[tuple(entry["path"])] += entry["count"]
+        for entry in day.get("upsell_followups") or []:
+            followups[entry["item_id"]] += entry["count"]
+
+    steps = []
+    previous = None
+    for step in FUNNEL_STEPS:
+        sessions = funnel.get(step, 0)
+        steps.append({
+            "step": step,
+            "sessions": sessions,
+            "conversion": round(sessions / previous, 4) if previous else None
+        })
+        previous = sessions
+
+    return {
+        "funnel": steps,
+        "top_paths": [{"path": list(path), "sessions": count} for path, count in paths.most_common(limit)],
+        "upsell_followups": [{"item_id": item_id, "clicks": count} for item_id, count in followups.most_common(limit)]
+    }
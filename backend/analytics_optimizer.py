@@ -3,11 +3,45 @@ Analytics Query Optimizer for MenuIQ
 Optimizes analytics queries by using pre-aggregated data and efficient queries
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, case, cast, Date
-from datetime import date, datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-from models import AnalyticsDaily, AnalyticsSession, AnalyticsPageView, AnalyticsItemClick
+from sqlalchemy import and_, func, or_
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import Counter
+from models import (
+    AnalyticsDaily, AnalyticsDevice, AnalyticsDeviceDaily, AnalyticsSession,
+    AnalyticsPageView, AnalyticsItemClick
+)
 from simple_cache import cache, CACHE_TTL
+from realtime_counters import today_counters
+from hyperloglog import HyperLogLog
+from analytics_funnels import compute_path_stats, merge_path_stats
+
+def day_range(start_date: date, end_date: date) -> Tuple[datetime, datetime]:
+    """
+    Convert an inclusive date range into a half-open timestamp range
+    [start_date 00:00, end_date + 1 day 00:00).
+    
+    Filtering on the raw timestamp column (instead of casting it to a date)
+    keeps the predicate sargable for the (tenant_id, timestamp) indexes.
+    """
+    return (
+        datetime.combine(start_date, time.min),
+        datetime.combine(end_date + timedelta(days=1), time.min)
+    )
+
+def day_runs(days: Iterable[date]) -> List[Tuple[date, date]]:
+    """Group days into (first, last) runs of consecutive days, in order"""
+    runs = []
+    for day in sorted(set(days)):
+        if runs and day == runs[-1][1] + timedelta(days=1):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+def in_ranges(ts_column, ranges: List[Tuple[datetime, datetime]]):
+    """SQL condition of ts_column falling in any of the half-open ranges"""
+    return or_(*(and_(ts_column >= start, ts_column < end) for start, end in ranges))
 
 class AnalyticsOptimizer:
     """Provides optimized analytics queries using pre-aggregated data"""
@@ -20,137 +54,210 @@ class AnalyticsOptimizer:
         end_date: date
     ) -> Dict:
         """
-        Get dashboard overview using direct queries on raw analytics tables
-        This ensures all historical data is included
+        Get dashboard overview from the daily rollups plus raw events of the
+        days that have no rollup row (today, yesterday before the job ran,
+        days before the rollup existed).
+        
+        Unique visitors are estimated by merging the per-day HyperLogLog
+        sketches (~1.6% standard error, see hyperloglog.py), so no range of
+        any length needs a COUNT(DISTINCT) over raw sessions. Rollup rows
+        written before sketches existed have their visitors re-read instead.
         """
         # Check cache first
         cache_key = f"analytics_overview:{tenant_id}:{start_date}:{end_date}"
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            return cached_data
+        result = cache.get(cache_key)
+        
+        if result is None:
+            today = date.today()
+            totals = Counter()
+            duration_total = 0
+            visitors = HyperLogLog()
+            raw_days = []
+            unsketched = []
+            
+            # Past days: one read of the rollup rows
+            past_end = min(end_date, today - timedelta(days=1))
+            if start_date <= past_end:
+                daily_rows = db.query(
+                    AnalyticsDaily.date,
+                    AnalyticsDaily.total_sessions,
+                    AnalyticsDaily.unique_visitors,
+                    AnalyticsDaily.total_page_views,
+                    AnalyticsDaily.total_item_clicks,
+                    AnalyticsDaily.avg_session_duration,
+                    AnalyticsDaily.mobile_sessions,
+                    AnalyticsDaily.desktop_sessions,
+                    AnalyticsDaily.tablet_sessions,
+                    AnalyticsDaily.visitor_sketch
+                ).filter(
+                    AnalyticsDaily.tenant_id == tenant_id,
+                    AnalyticsDaily.date >= start_date,
+                    AnalyticsDaily.date <= past_end
+                ).all()
+                
+                for day in daily_rows:
+                    totals.update({
+                        "sessions": day.total_sessions or 0,
+                        "page_views": day.total_page_views or 0,
+                        "item_clicks": day.total_item_clicks or 0,
+                        "mobile": day.mobile_sessions or 0,
+                        "desktop": day.desktop_sessions or 0,
+                        "tablet": day.tablet_sessions or 0
+                    })
+                    duration_total += (day.avg_session_duration or 0) * (day.total_sessions or 0)
+                    if day.visitor_sketch:
+                        visitors.merge(HyperLogLog.from_bytes(day.visitor_sketch))
+                    else:
+                        unsketched.append(day)
+                
+                rolled_up = {day.date for day in daily_rows}
+                raw_days = [
+                    start_date + timedelta(days=offset)
+                    for offset in range((past_end - start_date).days + 1)
+                    if start_date + timedelta(days=offset) not in rolled_up
+                ]
+            
+            # Today is not rolled up yet
+            if start_date <= today <= end_date:
+                raw_days.append(today)
+            
+            # Days without a rollup row: one statement for the totals, plus their visitors
+            if raw_days:
+                stats = AnalyticsOptimizer._ranges_stats_query(
+                    db, tenant_id, [day_range(first, last) for first, last in day_runs(raw_days)]
+                ).first()
+                totals.update({
+                    "sessions": stats.total_sessions,
+                    "page_views": stats.page_views,
+                    "item_clicks": stats.item_clicks,
+                    "mobile": stats.mobile,
+                    "desktop": stats.desktop,
+                    "tablet": stats.tablet
+                })
+                duration_total += (stats.avg_duration or 0) * stats.total_sessions
+            
+            # Daily counts cannot be added up across days, so unsketched days
+            # contribute their visitors to the sketch like days without a row
+            visitors.update(AnalyticsOptimizer._visitor_hashes(
+                db, tenant_id, raw_days, [day.date for day in unsketched]
+            ))
+            
+            result = {
+                "total_sessions": totals["sessions"],
+                # A day whose visitors are gone from raw and archive still has its own count
+                "unique_visitors": max(
+                    [visitors.count()] + [day.unique_visitors or 0 for day in unsketched]
+                ),
+                "total_page_views": totals["page_views"],
+                "total_item_clicks": totals["item_clicks"],
+                "avg_session_duration": int(duration_total / totals["sessions"]) if totals["sessions"] else 0,
+                "device_breakdown": {
+                    "mobile": totals["mobile"],
+                    "desktop": totals["desktop"],
+                    "tablet": totals["tablet"]
+                }
+            }
+            
+            # Cache the result for 5 minutes
+            cache.set(cache_key, result, 300)
+        
+        # Today's tile is read live from the counters, not from the cached totals
+        today_stats = AnalyticsOptimizer._get_today_realtime_stats(db, tenant_id)
+        return {**result, "today_sessions": today_stats["sessions"]}
+    
+    @staticmethod
+    def _range_stats_query(
+        db: Session,
+        tenant_id: int,
+        range_start: datetime,
+        range_end: datetime
+    ):
+        """Single-row totals query (see _ranges_stats_query) for [range_start, range_end)"""
+        return AnalyticsOptimizer._ranges_stats_query(db, tenant_id, [(range_start, range_end)])
+    
+    @staticmethod
+    def _ranges_stats_query(
+        db: Session,
+        tenant_id: int,
+        ranges: List[Tuple[datetime, datetime]]
+    ):
+        """
+        Build a single-row query with session, device, page view and item click
+        totals for a tenant in the half-open timestamp ranges.
+        
+        Session figures come from one aggregate using FILTER clauses; page views
+        and item clicks are independent scalar subqueries. The only join is the
+        many-to-one device lookup, so no row is counted twice.
+        """
+        device = func.lower(AnalyticsDevice.device_type)
         
-        # Query raw analytics tables directly for accurate counts
-        session_stats = db.query(
+        sessions = db.query(
             func.count(AnalyticsSession.id).label("total_sessions"),
             func.count(func.distinct(AnalyticsSession.ip_address_hash)).label("unique_visitors"),
-            func.avg(AnalyticsSession.duration_seconds).label("avg_duration")
+            func.avg(AnalyticsSession.duration_seconds).filter(
+                AnalyticsSession.duration_seconds > 0
+            ).label("avg_duration"),
+            func.count(AnalyticsSession.id).filter(device == 'mobile').label("mobile"),
+            func.count(AnalyticsSession.id).filter(device == 'desktop').label("desktop"),
+            func.count(AnalyticsSession.id).filter(device == 'tablet').label("tablet")
+        ).outerjoin(
+            AnalyticsDevice, AnalyticsDevice.id == AnalyticsSession.device_id
         ).filter(
             AnalyticsSession.tenant_id == tenant_id,
-            cast(AnalyticsSession.started_at, Date) >= start_date,
-            cast(AnalyticsSession.started_at, Date) <= end_date
-        ).first()
+            in_ranges(AnalyticsSession.started_at, ranges)
+        ).subquery()
         
-        # Get page views count
         page_views = db.query(func.count(AnalyticsPageView.id)).filter(
             AnalyticsPageView.tenant_id == tenant_id,
-            cast(AnalyticsPageView.timestamp, Date) >= start_date,
-            cast(AnalyticsPageView.timestamp, Date) <= end_date
-        ).scalar() or 0
+            in_ranges(AnalyticsPageView.timestamp, ranges)
+        ).scalar_subquery()
         
-        # Get item clicks count
         item_clicks = db.query(func.count(AnalyticsItemClick.id)).filter(
             AnalyticsItemClick.tenant_id == tenant_id,
-            cast(AnalyticsItemClick.timestamp, Date) >= start_date,
-            cast(AnalyticsItemClick.timestamp, Date) <= end_date
-        ).scalar() or 0
-        
-        # Get device breakdown
-        device_stats = db.query(
-            AnalyticsSession.device_type,
-            func.count(AnalyticsSession.id)
-        ).filter(
-            AnalyticsSession.tenant_id == tenant_id,
-            cast(AnalyticsSession.started_at, Date) >= start_date,
-            cast(AnalyticsSession.started_at, Date) <= end_date
-        ).group_by(AnalyticsSession.device_type).all()
+            in_ranges(AnalyticsItemClick.timestamp, ranges)
+        ).scalar_subquery()
         
-        device_breakdown = {"mobile": 0, "desktop": 0, "tablet": 0}
-        for device_type, count in device_stats:
-            if device_type and device_type.lower() in device_breakdown:
-                device_breakdown[device_type.lower()] = count
+        return db.query(
+            sessions,
+            page_views.label("page_views"),
+            item_clicks.label("item_clicks")
+        )
+    
+    @staticmethod
+    def _visitor_hashes(
+        db: Session,
+        tenant_id: int,
+        raw_days: List[date],
+        rolled_up_days: List[date]
+    ) -> Iterator[str]:
+        """
+        Distinct visitor IP hashes of a tenant on raw_days, read from the raw
+        sessions, and on rolled_up_days, read from the Parquet archive once
+        those days are archived (see analytics_archive.py)
+        """
+        from analytics_archive import archived_through, read_archive
         
-        # Get today's sessions count
-        today_start = datetime.combine(date.today(), datetime.min.time())
-        today_sessions = db.query(func.count(AnalyticsSession.id)).filter(
-            AnalyticsSession.tenant_id == tenant_id,
-            AnalyticsSession.started_at >= today_start
-        ).scalar() or 0
-        
-        # Build result
-        result = {
-            "total_sessions": session_stats.total_sessions or 0,
-            "unique_visitors": session_stats.unique_visitors or 0,
-            "total_page_views": page_views,
-            "total_item_clicks": item_clicks,
-            "avg_session_duration": int(session_stats.avg_duration or 0),
-            "device_breakdown": device_breakdown,
-            "today_sessions": today_sessions
-        }
-        
-        # Cache the result for 5 minutes
-        cache.set(cache_key, result, 300)
+        watermark = archived_through()
+        archived_days = [day for day in rolled_up_days if watermark is not None and day <= watermark]
+        raw_days = sorted(set(raw_days) | (set(rolled_up_days) - set(archived_days)))
         
-        return result
+        if raw_days:
+            ranges = [day_range(first, last) for first, last in day_runs(raw_days)]
+            for ip_hash, in db.query(func.distinct(AnalyticsSession.ip_address_hash)).filter(
+                AnalyticsSession.tenant_id == tenant_id,
+                in_ranges(AnalyticsSession.started_at, ranges),
+                AnalyticsSession.ip_address_hash.isnot(None)
+            ).all():
+                yield ip_hash
+        
+        for first, last in day_runs(archived_days):
+            archived = read_archive("analytics_sessions", tenant_id, first, last, columns=["ip_address_hash"])
+            yield from filter(None, archived.column("ip_address_hash").to_pylist())
     
     @staticmethod
     def _get_today_realtime_stats(db: Session, tenant_id: int) -> Dict:
-        """Get real-time statistics for today only"""
-        # Use a single optimized query with subqueries
-        today_start = datetime.combine(date.today(), datetime.min.time())
-        
-        # Sessions and visitors count
-        session_stats = db.query(
-            func.count(AnalyticsSession.id).label("sessions"),
-            func.count(func.distinct(AnalyticsSession.ip_address_hash)).label("visitors")
-        ).filter(
-            AnalyticsSession.tenant_id == tenant_id,
-            AnalyticsSession.started_at >= today_start
-        ).first()
-        
-        # Page views and item clicks in one query using UNION
-        interaction_stats = db.query(
-            func.sum(case((AnalyticsPageView.id != None, 1), else_=0)).label("page_views"),
-            func.sum(case((AnalyticsItemClick.id != None, 1), else_=0)).label("item_clicks")
-        ).select_from(
-            AnalyticsSession
-        ).outerjoin(
-            AnalyticsPageView,
-            and_(
-                AnalyticsPageView.session_id == AnalyticsSession.session_id,
-                AnalyticsPageView.timestamp >= today_start
-            )
-        ).outerjoin(
-            AnalyticsItemClick,
-            and_(
-                AnalyticsItemClick.session_id == AnalyticsSession.session_id,
-                AnalyticsItemClick.timestamp >= today_start
-            )
-        ).filter(
-            AnalyticsSession.tenant_id == tenant_id,
-            AnalyticsSession.started_at >= today_start
-        ).first()
-        
-        # Device breakdown
-        device_stats = db.query(
-            AnalyticsSession.device_type,
-            func.count(AnalyticsSession.id)
-        ).filter(
-            AnalyticsSession.tenant_id == tenant_id,
-            AnalyticsSession.started_at >= today_start
-        ).group_by(AnalyticsSession.device_type).all()
-        
-        devices = {"mobile": 0, "desktop": 0, "tablet": 0}
-        for device_type, count in device_stats:
-            if device_type and device_type.lower() in devices:
-                devices[device_type.lower()] = count
-        
-        return {
-            "sessions": session_stats.sessions or 0,
-            "visitors": session_stats.visitors or 0,
-            "page_views": interaction_stats.page_views or 0,
-            "item_clicks": interaction_stats.item_clicks or 0,
-            "devices": devices
-        }
+        """Get real-time statistics for today only, read from the in-process counters"""
+        return today_counters.get(db, tenant_id)
     
     @staticmethod
     def get_timeline_optimized(
@@ -162,68 +269,77 @@ class AnalyticsOptimizer:
         end_date = date.today()
         start_date = end_date - timedelta(days=days)
         
-        # Check cache
+        # Check cache (past days only; today is always live)
         cache_key = f"analytics_timeline:{tenant_id}:{days}"
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            return cached_data
+        history = cache.get(cache_key)
         
-        # Get all daily data in one query
-        daily_data = db.query(
-            AnalyticsDaily.date,
-            AnalyticsDaily.total_sessions,
-            AnalyticsDaily.unique_visitors,
-            AnalyticsDaily.total_page_views,
-            AnalyticsDaily.total_item_clicks
-        ).filter(
-            AnalyticsDaily.tenant_id == tenant_id,
-            AnalyticsDaily.date >= start_date,
-            AnalyticsDaily.date < date.today()  # Exclude today
-        ).order_by(AnalyticsDaily.date).all()
-        
-        # Convert to list of dicts
-        timeline = []
-        for day in daily_data:
-            timeline.append({
-                "date": day.date.isoformat(),
-                "sessions": day.total_sessions,
-                "visitors": day.unique_visitors,
-                "page_views": day.total_page_views,
-                "item_clicks": day.total_item_clicks
-            })
-        
-        # Add today's real-time data if within range
-        if date.today() >= start_date:
-            today_stats = AnalyticsOptimizer._get_today_realtime_stats(db, tenant_id)
-            timeline.append({
-                "date": date.today().isoformat(),
-                "sessions": today_stats["sessions"],
-                "visitors": today_stats["visitors"],
-                "page_views": today_stats["page_views"],
-                "item_clicks": today_stats["item_clicks"]
-            })
-        
-        # Fill in missing dates with zeros
-        date_set = {datetime.fromisoformat(d["date"]).date() for d in timeline}
-        current_date = start_date
-        while current_date <= end_date:
-            if current_date not in date_set:
-                timeline.append({
+        if history is None:
+            # Get all daily data in one query
+            daily_data = db.query(
+                AnalyticsDaily.date,
+                AnalyticsDaily.total_sessions,
+                AnalyticsDaily.unique_visitors,
+                AnalyticsDaily.total_page_views,
+                AnalyticsDaily.total_item_clicks
+            ).filter(
+                AnalyticsDaily.tenant_id == tenant_id,
+                AnalyticsDaily.date >= start_date,
+                AnalyticsDaily.date < end_date  # Exclude today
+            ).order_by(AnalyticsDaily.date).all()
+            
+            daily_map = {day.date: day for day in daily_data}
+            
+            # One entry per past day, zeros where nothing was recorded
+            history = []
+            current_date = start_date
+            while current_date < end_date:
+                day = daily_map.get(current_date)
+                history.append({
                     "date": current_date.isoformat(),
-                    "sessions": 0,
-                    "visitors": 0,
-                    "page_views": 0,
-                    "item_clicks": 0
+                    "sessions": day.total_sessions if day else 0,
+                    "visitors": day.unique_visitors if day else 0,
+                    "page_views": day.total_page_views if day else 0,
+                    "item_clicks": day.total_item_clicks if day else 0
                 })
-            current_date += timedelta(days=1)
+                current_date += timedelta(days=1)
+            
+            # Cache the result
+            cache.set(cache_key, history, 300)  # 5 minutes cache
         
-        # Sort by date
-        timeline.sort(key=lambda x: x["date"])
+        # Add today's real-time data from the counters
+        today_stats = AnalyticsOptimizer._get_today_realtime_stats(db, tenant_id)
+        return history + [{
+            "date": end_date.isoformat(),
+            "sessions": today_stats["sessions"],
+            "visitors": today_stats["visitors"],
+            "page_views": today_stats["page_views"],
+            "item_clicks": today_stats["item_clicks"]
+        }]
+    
+    @staticmethod
+    def _merge_daily_counts(
+        db: Session,
+        tenant_id: int,
+        column,
+        key_name: str,
+        start_date: date
+    ) -> Counter:
+        """
+        Merge a ranked JSONB column (top_items / top_categories) of the daily
+        rollups from start_date up to yesterday into one Counter
+        """
+        rows = db.query(column).filter(
+            AnalyticsDaily.tenant_id == tenant_id,
+            AnalyticsDaily.date >= start_date,
+            AnalyticsDaily.date < date.today()
+        ).all()
         
-        # Cache the result
-        cache.set(cache_key, timeline, 300)  # 5 minutes cache
+        counts = Counter()
+        for (entries,) in rows:
+            for entry in entries or []:
+                counts[entry[key_name]] += entry["count"]
         
-        return timeline
+        return counts
     
     @staticmethod
     def get_popular_items_optimized(
@@ -232,33 +348,30 @@ class AnalyticsOptimizer:
         days: int = 30,
         limit: int = 10
     ) -> List[Dict]:
-        """Get popular items using aggregated click data"""
+        """Get popular items by merging daily rollups with today's live click counters"""
         cache_key = f"popular_items:{tenant_id}:{days}:{limit}"
         cached_data = cache.get(cache_key)
         if cached_data is not None:
             return cached_data
         
-        end_date = date.today()
-        start_date = end_date - timedelta(days=days)
+        start_date = date.today() - timedelta(days=days)
         
-        # Use aggregated data from analytics_daily
-        popular_items = db.query(
-            AnalyticsItemClick.item_id,
-            func.count(AnalyticsItemClick.id).label("click_count")
-        ).filter(
-            AnalyticsItemClick.tenant_id == tenant_id,
-            cast(AnalyticsItemClick.timestamp, Date) >= start_date,
-            cast(AnalyticsItemClick.timestamp, Date) <= end_date
-        ).group_by(
-            AnalyticsItemClick.item_id
-        ).order_by(
-            func.count(AnalyticsItemClick.id).desc()
-        ).limit(limit).all()
+        click_counts = AnalyticsOptimizer._merge_daily_counts(
+            db, tenant_id, AnalyticsDaily.top_items, "item_id", start_date
+        )
+        
+        # Today is not rolled up yet, so today's clicks come from the live counters
+        today_stats = AnalyticsOptimizer._get_today_realtime_stats(db, tenant_id)
+        click_counts.update(today_stats["item_clicks_by_item"])
+        
+        popular_items = click_counts.most_common(limit)
         
         # Get item details
         from models import MenuItem
         item_ids = [item_id for item_id, _ in popular_items]
-        items = db.query(MenuItem).filter(
+        items = db.query(
+            MenuItem.id, MenuItem.name, MenuItem.name_ar, MenuItem.category_id
+        ).filter(
             MenuItem.id.in_(item_ids)
         ).all()
         
@@ -279,4 +392,177 @@ class AnalyticsOptimizer:
         # Cache the result
         cache.set(cache_key, result, 600)  # 10 minutes cache
         
-        return result
\ No newline at end of file
+        return result
+    
+    @staticmethod
+    def get_category_performance_optimized(
+        db: Session,
+        tenant_id: int,
+        days: int = 30
+    ) -> List[Dict]:
+        """Get category view counts by merging daily rollups with today's raw page views"""
+        cache_key = f"category_performance:{tenant_id}:{days}"
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            return cached_data
+        
+        start_date = date.today() - timedelta(days=days)
+        today_start = datetime.combine(date.today(), datetime.min.time())
+        
+        view_counts = AnalyticsOptimizer._merge_daily_counts(
+            db, tenant_id, AnalyticsDaily.top_categories, "category_id", start_date
+        )
+        
+        today_views = db.query(
+            AnalyticsPageView.category_id,
+            func.count(AnalyticsPageView.id)
+        ).filter(
+            AnalyticsPageView.tenant_id == tenant_id,
+            AnalyticsPageView.timestamp >= today_start,
+            AnalyticsPageView.page_type == "category",
+            AnalyticsPageView.category_id.isnot(None)
+        ).group_by(AnalyticsPageView.category_id).all()
+        
+        for category_id, count in today_views:
+            view_counts[category_id] += count
+        
+        if not view_counts:
+            cache.set(cache_key, [], 600)
+            return []
+        
+        from models import Category
+        categories = db.query(
+            Category.id, Category.name, Category.icon
+        ).filter(
+            Category.tenant_id == tenant_id,
+            Category.id.in_(list(view_counts.keys()))
+        ).all()
+        
+        result = [
+            {
+                "id": cat.id,
+                "name": cat.name,
+                "icon": cat.icon,
+                "views": view_counts[cat.id]
+            }
+            for cat in categories
+        ]
+        result.sort(key=lambda c: c["views"], reverse=True)
+        
+        # Cache the result
+        cache.set(cache_key, result, 600)  # 10 minutes cache
+        
+        return result
+    
+    @staticmethod
+    def get_device_details_optimized(
+        db: Session,
+        tenant_id: int,
+        days: int = 30,
+        limit: int = 20
+    ) -> List[Dict]:
+        """Get the most used device models from analytics_device_daily plus today's raw sessions"""
+        cache_key = f"device_details:{tenant_id}:{days}:{limit}"
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            return cached_data
+        
+        start_date = date.today() - timedelta(days=days)
+        today_start = datetime.combine(date.today(), datetime.min.time())
+        
+        past_devices = db.query(
+            AnalyticsDeviceDaily.device_brand,
+            AnalyticsDeviceDaily.device_model,
+            AnalyticsDeviceDaily.device_full_name,
+            AnalyticsDeviceDaily.device_type,
+            func.sum(AnalyticsDeviceDaily.sessions)
+        ).filter(
+            AnalyticsDeviceDaily.tenant_id == tenant_id,
+            AnalyticsDeviceDaily.date >= start_date,
+            AnalyticsDeviceDaily.date < date.today()
+        ).group_by(
+            AnalyticsDeviceDaily.device_brand,
+            AnalyticsDeviceDaily.device_model,
+            AnalyticsDeviceDaily.device_full_name,
+            AnalyticsDeviceDaily.device_type
+        ).all()
+        
+        # Today is not rolled up yet
+        today_per_device = db.query(
+            AnalyticsSession.device_id,
+            func.count(AnalyticsSession.id).label("sessions")
+        ).filter(
+            AnalyticsSession.tenant_id == tenant_id,
+            AnalyticsSession.started_at >= today_start
+        ).group_by(AnalyticsSession.device_id).subquery()
+        
+        today_devices = db.query(
+            AnalyticsDevice.device_brand,
+            AnalyticsDevice.device_model,
+            AnalyticsDevice.device_full_name,
+            AnalyticsDevice.device_type,
+            today_per_device.c.sessions
+        ).join(
+            today_per_device, today_per_device.c.device_id == AnalyticsDevice.id
+        ).filter(
+            AnalyticsDevice.device_brand.isnot(None)
+        ).all()
+        
+        session_counts = Counter()
+        for brand, model, full_name, device_type, count in past_devices + today_devices:
+            session_counts[(brand, model, full_name, device_type)] += int(count)
+        
+        result = [
+            {
+                "brand": brand,
+                "model": model,
+                "full_name": full_name,
+                "type": device_type,
+                "sessions": count
+            }
+            for (brand, model, full_name, device_type), count in session_counts.most_common(limit)
+        ]
+        
+        # Cache the result
+        cache.set(cache_key, result, 600)  # 10 minutes cache
+        
+        return result
+    
+    @staticmethod
+    def get_path_analysis_optimized(
+        db: Session,
+        tenant_id: int,
+        days: int = 30,
+        limit: int = 10
+    ) -> Dict:
+        """Get funnel conversion, top session paths and upsell follow-up clicks"""
+        cache_key = f"path_analysis:{tenant_id}:{days}:{limit}"
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            return cached_data
+        
+        start_date = date.today() - timedelta(days=days)
+        
+        daily_stats = [
+            {"funnel": row.funnel, "top_paths": row.top_paths, "upsell_followups": row.upsell_followups}
+            for row in db.query(
+                AnalyticsDaily.funnel,
+                AnalyticsDaily.top_paths,
+                AnalyticsDaily.upsell_followups
+            ).filter(
+                AnalyticsDaily.tenant_id == tenant_id,
+                AnalyticsDaily.date >= start_date,
+                AnalyticsDaily.date < date.today()
+            ).all()
+        ]
+        
+        # Today is not rolled up yet, so only today's events are analysed raw
+        today_start, today_end = day_range(date.today(), date.today())
+        daily_stats.extend(compute_path_stats(db, today_start, today_end, [tenant_id]).values())
+        
+        result = merge_path_stats(daily_stats, limit)
+        
+        # Cache the result
+        cache.set(cache_key, result, 600)  # 10 minutes cache
+        
+        return result
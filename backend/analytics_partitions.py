@@ -0,0 +1,182 @@
+"""
+Analytics Partition Management for MenuIQ
+
+analytics_sessions, analytics_page_views and analytics_item_clicks are
+range-partitioned by month on their timestamp column. This module:
+- Creates monthly partitions ahead of time so inserts never hit a missing range
+- Detaches and drops partitions older than the retention window, after their
+  days have been rolled up into analytics_daily and archived to Parquet
+"""
+import os
+import re
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Partitioned table -> partition key column
+PARTITIONED_TABLES = {
+    "analytics_sessions": "started_at",
+    "analytics_page_views": "timestamp",
+    "analytics_item_clicks": "timestamp",
+}
+
+# How many future months get a partition in advance
+PARTITION_MONTHS_AHEAD = int(os.getenv("ANALYTICS_PARTITION_MONTHS_AHEAD", "3"))
+
+# Raw events older than this many whole months are dropped (0 disables retention)
+RAW_RETENTION_MONTHS = int(os.getenv("ANALYTICS_RAW_RETENTION_MONTHS", "13"))
+
+PARTITION_NAME_RE = re.compile(r"_y(\d{4})m(\d{2})$")
+
+def month_start(day: date) -> date:
+    """First day of the month containing day"""
+    return day.replace(day=1)
+
+def add_months(month: date, months: int) -> date:
+    """Shift a first-of-month date by a number of months"""
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, month: date) -> str:
+    """Name of the monthly partition of table, e.g. analytics_sessions_y2025m07"""
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+def list_partitions(db: Session, table: str) -> Dict[str, Optional[date]]:
+    """Map partition name -> month (None for the default partition)"""
+    rows = db.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table
+    """), {"table": table}).scalars().all()
+
+    partitions = {}
+    for name in rows:
+        match = PARTITION_NAME_RE.search(name)
+        partitions[name] = date(int(match.group(1)), int(match.group(2)), 1) if match else None
+    return partitions
+
+def create_month_partition(db: Session, table: str, month: date) -> bool:
+    """
+    Create the partition of table for month if it does not exist yet.
+
+    Rows of that month already in the default partition (written while the
+    partition was missing) would make CREATE ... PARTITION OF fail, so they
+    are moved into the new partition first: the default partition is
+    detached, the month created and filled, and the default reattached, in
+    one transaction. Failures are raised (the scheduler records them).
+    """
+    name = partition_name(table, month)
+    default = f"{table}_default"
+    column = PARTITIONED_TABLES[table]
+    bounds = {"start": month, "end": add_months(month, 1)}
+    create = (
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{bounds['end'].isoformat()}')"
+    )
+
+    try:
+        stranded = default in list_partitions(db, table) and db.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {column} >= :start AND {column} < :end)"
+        ), bounds).scalar()
+
+        if not stranded:
+            db.execute(text(create))
+        else:
+            db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+            db.execute(text(create))
+            moved = db.execute(text(
+                f"WITH moved AS (DELETE FROM {default} WHERE {column} >= :start AND {column} < :end RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ), bounds).rowcount
+            db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+            logger.warning(f"Moved {moved} rows of {name} out of {default}")
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to create partition {name}: {e}")
+        raise
+
+def ensure_partitions(db: Session, months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Make sure the current month and the next months_ahead months have partitions"""
+    current = month_start(date.today())
+    created = []
+
+    for table in PARTITIONED_TABLES:
+        existing = list_partitions(db, table)
+        if f"{table}_default" not in existing:
+            # Safety net so tracking never fails if the job falls behind
+            db.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+            db.commit()
+            created.append(f"{table}_default")
+
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            name = partition_name(table, month)
+            if name not in existing and create_month_partition(db, table, month):
+                created.append(name)
+
+    return created
+
+def expired_months(db: Session, retention_months: int = RAW_RETENTION_MONTHS) -> List[date]:
+    """Months whose raw partitions are entirely outside the retention window"""
+    if retention_months <= 0:
+        return []
+
+    cutoff = add_months(month_start(date.today()), -retention_months)
+    months = set()
+    for table in PARTITIONED_TABLES:
+        for month in list_partitions(db, table).values():
+            if month is not None and month < cutoff:
+                months.add(month)
+
+    return sorted(months)
+
+def drop_expired_partitions(
+    db: Session,
+    retention_months: int = RAW_RETENTION_MONTHS,
+    drop: bool = True
+) -> List[str]:
+    """
+    Detach (and by default drop) monthly partitions older than the retention window.
+
+    Each month is re-aggregated into analytics_daily and, unless archival is
+    disabled, exported to Parquet first, so nothing is lost.
+    """
+    from aggregate_analytics import aggregate_range
+    from analytics_archive import ARCHIVE_AFTER_DAYS, archive_range
+
+    removed = []
+    for month in expired_months(db, retention_months):
+        last_day = add_months(month, 1) - timedelta(days=1)
+        if ARCHIVE_AFTER_DAYS > 0:
+            archive_range(db, month, last_day)
+        else:
+            aggregate_range(db, month, last_day)
+
+        for table in PARTITIONED_TABLES:
+            name = partition_name(table, month)
+            if name not in list_partitions(db, table):
+                continue
+
+            db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            if drop:
+                db.execute(text(f"DROP TABLE {name}"))
+            db.commit()
+            removed.append(name)
+            logger.info(f"{'Dropped' if drop else 'Detached'} analytics partition {name}")
+
+    return removed
+
+def maintain_partitions(db: Session) -> Dict[str, List[str]]:
+    """Create upcoming partitions and apply the raw-event retention policy"""
+    return {
+        "created": ensure_partitions(db),
+        "removed": drop_expired_partitions(db)
+    }
@@ -7,9 +7,12 @@ This module provides endpoints for:
 - Aggregating analytics metrics
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, desc, Date, cast
+from sqlalchemy.dialects.postgresql import insert
 from datetime import datetime, timedelta, date
 from typing import Optional, Dict, List
 import hashlib
@@ -17,13 +20,20 @@ import uuid
 from user_agents import parse
 import re
 
-from database import get_db
+from database import SessionLocal, get_db
+from simple_cache import cache
 from models import (
     AnalyticsSession, AnalyticsPageView, AnalyticsItemClick, 
-    AnalyticsDaily, MenuItem, Category, Tenant
+    AnalyticsDaily, AnalyticsDevice, MenuItem, Category, Tenant, User
+)
+from auth import (
+    get_current_user_dict, get_current_tenant_user, get_tenant_id_from_request,
+    create_access_token, decode_token
 )
-from auth import get_current_user_dict, get_tenant_id_from_request
 from analytics_optimizer import AnalyticsOptimizer
+from realtime_counters import today_counters
+from analytics_stream import analytics_stream
+from analytics_export import EXPORT_FORMATS, EXPORT_TABLES, stream_export
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
@@ -176,6 +186,68 @@ def hash_ip(ip_address: str) -> str:
     """Hash IP address for privacy"""
     return hashlib.sha256(ip_address.encode()).hexdigest()
 
+def get_or_create_device(db: Session, user_agent: str) -> Dict:
+    """
+    Return {"id", "device_type"} of the analytics_devices row for a user agent.
+    
+    The user agent is only parsed the first time it is seen; afterwards the
+    row is found through the cache or the unique ua_hash.
+    """
+    ua_hash = hashlib.sha256(user_agent.encode()).hexdigest()
+    cache_key = f"analytics_device:{ua_hash}"
+    device = cache.get(cache_key)
+    if device is not None:
+        return device
+    
+    existing = db.query(AnalyticsDevice.id, AnalyticsDevice.device_type).filter(
+        AnalyticsDevice.ua_hash == ua_hash
+    ).first()
+    
+    if existing:
+        device = {"id": existing.id, "device_type": existing.device_type}
+    else:
+        # Get device details once
+        try:
+            device_details = get_device_details(user_agent)
+            if not isinstance(device_details, dict):
+                device_details = {'brand': 'Unknown', 'model': 'Unknown', 'full_name': 'Unknown Device'}
+            
+            # Log unknown devices for future improvement
+            if device_details['brand'] == 'Unknown' and user_agent:
+                print(f"[Analytics] Unknown device detected - User Agent: {user_agent}")
+                
+        except Exception as e:
+            print(f"Error getting device details: {e}")
+            device_details = {'brand': 'Unknown', 'model': 'Unknown', 'full_name': 'Unknown Device'}
+        
+        parsed = parse(user_agent)
+        device_type = get_device_type(user_agent)
+        
+        # Concurrent first sessions with the same user agent insert only one row
+        device_id = db.execute(
+            insert(AnalyticsDevice).values(
+                ua_hash=ua_hash,
+                user_agent=user_agent[:500],
+                device_type=device_type,
+                browser=parsed.browser.family[:50],
+                os=parsed.os.family[:50],
+                device_brand=device_details.get('brand', 'Unknown'),
+                device_model=device_details.get('model', 'Unknown'),
+                device_full_name=device_details.get('full_name', 'Unknown Device')
+            ).on_conflict_do_nothing(
+                index_elements=[AnalyticsDevice.ua_hash]
+            ).returning(AnalyticsDevice.id)
+        ).scalar()
+        
+        if device_id is None:
+            device_id = db.query(AnalyticsDevice.id).filter(AnalyticsDevice.ua_hash == ua_hash).scalar()
+        db.commit()
+        
+        device = {"id": device_id, "device_type": device_type}
+    
+    cache.set(cache_key, device, 86400)
+    return device
+
 # Public endpoints for tracking (no auth required)
 @router.post("/track/session")
 async def track_session_start(
@@ -198,19 +270,7 @@ async def track_session_start(
     user_agent = request.headers.get("user-agent", "")
     referrer = request.headers.get("referer", "")
     
-    # Get device details once
-    try:
-        device_details = get_device_details(user_agent)
-        if not isinstance(device_details, dict):
-            device_details = {'brand': 'Unknown', 'model': 'Unknown', 'full_name': 'Unknown Device'}
-        
-        # Log unknown devices for future improvement
-        if device_details['brand'] == 'Unknown' and user_agent:
-            print(f"[Analytics] Unknown device detected - User Agent: {user_agent}")
-            
-    except Exception as e:
-        print(f"Error getting device details: {e}")
-        device_details = {'brand': 'Unknown', 'model': 'Unknown', 'full_name': 'Unknown Device'}
+    device = get_or_create_device(db, user_agent)
     
     # Create session
     session_id = str(uuid.uuid4())
@@ -218,13 +278,7 @@ async def track_session_start(
         tenant_id=tenant.id,
         session_id=session_id,
         ip_address_hash=hash_ip(client_ip),
-        device_brand=device_details.get('brand', 'Unknown'),
-        device_model=device_details.get('model', 'Unknown'),
-        device_full_name=device_details.get('full_name', 'Unknown Device'),
-        user_agent=user_agent,
-        device_type=get_device_type(user_agent),
-        browser=parse(user_agent).browser.family,
-        os=parse(user_agent).os.family,
+        device_id=device["id"],
         referrer=referrer,
         language=language
     )
@@ -232,6 +286,9 @@ async def track_session_start(
     db.add(session)
     db.commit()
     
+    today_counters.record_session(tenant.id, session.ip_address_hash, device["device_type"], session.started_at)
+    analytics_stream.record_session(tenant.id, session_id, device["device_type"])
+    
     return {"session_id": session_id}
 
 @router.post("/track/pageview")
@@ -263,6 +320,9 @@ async def track_page_view(
     db.add(page_view)
     db.commit()
     
+    today_counters.record_page_view(session.tenant_id)
+    analytics_stream.record_page_view(session.tenant_id, session_id, page_type, category_id, item_id)
+    
     return {"status": "recorded"}
 
 @router.post("/track/item-click")
@@ -294,13 +354,15 @@ async def track_item_click(
     db.add(item_click)
     db.commit()
     
+    today_counters.record_item_click(session.tenant_id, item_id)
+    analytics_stream.record_item_click(session.tenant_id, session_id, item_id, category_id)
+    
     return {"status": "recorded"}
 
 @router.post("/track/session-end")
 async def track_session_end(
     session_id: str,
-    db: Session = Depends(get_db),
-    background_tasks: BackgroundTasks = BackgroundTasks()
+    db: Session = Depends(get_db)
 ):
     """End a session and calculate duration"""
     session = db.query(AnalyticsSession).filter(
@@ -315,8 +377,10 @@ async def track_session_end(
     
     db.commit()
     
-    # Schedule daily aggregation update
-    background_tasks.add_task(update_daily_analytics, session.tenant_id, date.today(), db)
+    analytics_stream.record_session_end(session.tenant_id, session_id)
+    
+    # analytics_daily is filled by the scheduler's analytics_rollup job;
+    # today's numbers are served from the live counters
     
     return {"status": "session_ended"}
 
@@ -368,6 +432,82 @@ async def get_analytics_timeline(
         "timeline": timeline_data
     }
 
+# Lifetime and purpose of the tokens that open the analytics stream
+STREAM_TOKEN_SECONDS = 60
+STREAM_TOKEN_PURPOSE = "analytics_stream"
+
+@router.post("/dashboard/stream-token")
+async def create_stream_token(current_user: User = Depends(get_current_tenant_user)):
+    """
+    Short-lived token for opening the analytics stream.
+    
+    EventSource cannot send headers, so the stream accepts this token as
+    ?token= instead of the access token, keeping access tokens out of URLs.
+    """
+    token = create_access_token(
+        {
+            "user_id": current_user.id,
+            "tenant_id": current_user.tenant_id,
+            "purpose": STREAM_TOKEN_PURPOSE
+        },
+        expires_delta=timedelta(seconds=STREAM_TOKEN_SECONDS)
+    )
+    return {"token": token, "expires_in": STREAM_TOKEN_SECONDS}
+
+def _stream_tenant_id(token: Optional[str], credentials: Optional[HTTPAuthorizationCredentials]) -> int:
+    """Tenant of the tenant user opening the stream, checked as get_current_user does"""
+    if credentials:
+        payload = decode_token(credentials.credentials)
+        if payload.get("user_type") != "tenant_user":
+            raise HTTPException(status_code=401, detail="Invalid token or not a tenant user")
+    elif token:
+        payload = decode_token(token)
+        if payload.get("purpose") != STREAM_TOKEN_PURPOSE:
+            raise HTTPException(status_code=401, detail="Invalid stream token")
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    user_id = payload.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    # Own short session: a dependency's session would be held until the stream closes
+    db = SessionLocal()
+    try:
+        tenant_id = db.query(User.tenant_id).filter(User.id == user_id).scalar()
+    finally:
+        db.close()
+    
+    if tenant_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if tenant_id != payload.get("tenant_id"):
+        raise HTTPException(status_code=403, detail="Tenant access required")
+    return tenant_id
+
+@router.get("/dashboard/stream")
+async def stream_analytics(
+    request: Request,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    """
+    Server-Sent Events stream of live analytics deltas for the tenant dashboard.
+    
+    Authenticates with the Authorization header or, for EventSource, with a
+    token from /dashboard/stream-token passed as ?token=.
+    No database session is held for the lifetime of the connection.
+    """
+    tenant_id = _stream_tenant_id(token, credentials)
+    
+    return StreamingResponse(
+        analytics_stream.events(tenant_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable nginx response buffering
+        }
+    )
+
 @router.get("/dashboard/top-items")
 async def get_top_items(
     days: int = 30,
@@ -393,128 +533,73 @@ async def get_category_performance(
     current_user: dict = Depends(get_current_user_dict),
     db: Session = Depends(get_db)
 ):
-    """Get category view statistics"""
+    """Get category view statistics from daily rollups"""
     tenant_id = current_user["tenant_id"]
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    category_stats = db.query(
-        Category.id,
-        Category.name,
-        Category.icon,
-        func.count(AnalyticsPageView.id).label("view_count")
-    ).join(
-        AnalyticsPageView, Category.id == AnalyticsPageView.category_id
-    ).filter(
-        AnalyticsPageView.tenant_id == tenant_id,
-        AnalyticsPageView.timestamp >= start_date,
-        AnalyticsPageView.page_type == "category"
-    ).group_by(
-        Category.id, Category.name, Category.icon
-    ).order_by(
-        desc("view_count")
-    ).all()
+    
+    categories = AnalyticsOptimizer.get_category_performance_optimized(
+        db, tenant_id, days
+    )
     
     return {
-        "categories": [
-            {
-                "id": cat.id,
-                "name": cat.name,
-                "icon": cat.icon,
-                "views": cat.view_count
-            }
-            for cat in category_stats
-        ]
+        "categories": categories
     }
 
+@router.get("/dashboard/paths")
+async def get_path_analysis(
+    days: int = 30,
+    limit: int = 10,
+    current_user: dict = Depends(get_current_user_dict),
+    db: Session = Depends(get_db)
+):
+    """Get menu -> category -> item funnel, top session paths and clicks after upsell exposure"""
+    tenant_id = current_user["tenant_id"]
+    
+    return AnalyticsOptimizer.get_path_analysis_optimized(
+        db, tenant_id, days, limit
+    )
+
 @router.get("/dashboard/device-details")
 async def get_device_details_dashboard(
     days: int = 30,
     current_user: dict = Depends(get_current_user_dict),
     db: Session = Depends(get_db)
 ):
-    """Get detailed device information"""
+    """Get detailed device information from the daily device summaries"""
     tenant_id = current_user["tenant_id"]
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    # Get all sessions with device details
-    device_sessions = db.query(
-        AnalyticsSession.device_brand,
-        AnalyticsSession.device_model,
-        AnalyticsSession.device_full_name,
-        AnalyticsSession.device_type,
-        func.count(AnalyticsSession.id).label("session_count")
-    ).filter(
-        AnalyticsSession.tenant_id == tenant_id,
-        AnalyticsSession.started_at >= start_date,
-        AnalyticsSession.device_brand.isnot(None)
-    ).group_by(
-        AnalyticsSession.device_brand,
-        AnalyticsSession.device_model,
-        AnalyticsSession.device_full_name,
-        AnalyticsSession.device_type
-    ).order_by(
-        desc("session_count")
-    ).limit(20).all()
+    
+    devices = AnalyticsOptimizer.get_device_details_optimized(
+        db, tenant_id, days
+    )
     
     return {
-        "devices": [
-            {
-                "brand": device.device_brand,
-                "model": device.device_model,
-                "full_name": device.device_full_name,
-                "type": device.device_type,
-                "sessions": device.session_count
-            }
-            for device in device_sessions
-        ]
+        "devices": devices
     }
 
-def update_daily_analytics(tenant_id: int, target_date: date, db: Session):
-    """Update daily analytics aggregation (background task)"""
-    # This would be better as a scheduled job, but for now we'll update on session end
-    # Calculate aggregated stats for the day
-    
-    # Get session stats
-    session_stats = db.query(
-        func.count(AnalyticsSession.id).label("total_sessions"),
-        func.count(func.distinct(AnalyticsSession.ip_address_hash)).label("unique_visitors")
-    ).filter(
-        AnalyticsSession.tenant_id == tenant_id,
-        cast(AnalyticsSession.started_at, Date) == target_date
-    ).first()
-    
-    # Get page view stats
-    page_views = db.query(func.count(AnalyticsPageView.id)).filter(
-        AnalyticsPageView.tenant_id == tenant_id,
-        cast(AnalyticsPageView.timestamp, Date) == target_date
-    ).scalar() or 0
-    
-    # Get item clicks
-    item_clicks = db.query(func.count(AnalyticsItemClick.id)).filter(
-        AnalyticsItemClick.tenant_id == tenant_id,
-        cast(AnalyticsItemClick.timestamp, Date) == target_date
-    ).scalar() or 0
-    
-    # Update or create daily record
-    daily_record = db.query(AnalyticsDaily).filter(
-        AnalyticsDaily.tenant_id == tenant_id,
-        AnalyticsDaily.date == target_date
-    ).first()
-    
-    if daily_record:
-        daily_record.total_sessions = session_stats.total_sessions or 0
-        daily_record.unique_visitors = session_stats.unique_visitors or 0
-        daily_record.total_page_views = page_views
-        daily_record.total_item_clicks = item_clicks
-    else:
-        daily_record = AnalyticsDaily(
-            tenant_id=tenant_id,
-            date=target_date,
-            total_sessions=session_stats.total_sessions or 0,
-            unique_visitors=session_stats.unique_visitors or 0,
-            total_page_views=page_views,
-            total_item_clicks=item_clicks
-        )
-        db.add(daily_record)
-    
-    db.commit()
\ No newline at end of file
+@router.get("/export/{table}")
+async def export_analytics(
+    table: str,
+    start_date: date,
+    end_date: Optional[date] = None,
+    format: str = "csv",
+    current_user: dict = Depends(get_current_user_dict)
+):
+    """Stream raw sessions, page views or item clicks of a date range as CSV or NDJSON"""
+    tenant_id = current_user["tenant_id"]
+    if not tenant_id:
+        raise HTTPException(status_code=403, detail="Tenant access required")
+    
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table. Use one of: {', '.join(EXPORT_TABLES)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Use one of: {', '.join(EXPORT_FORMATS)}")
+    
+    end_date = end_date or start_date
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    
+    filename = f"{table}_{start_date.isoformat()}_{end_date.isoformat()}.{format}"
+    return StreamingResponse(
+        stream_export(tenant_id, table, start_date, end_date, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
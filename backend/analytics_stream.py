@@ -0,0 +1,118 @@
+"""
+Live Analytics Stream for MenuIQ
+
+Pushes analytics deltas to open tenant dashboards over Server-Sent Events
+instead of having them poll the /dashboard endpoints. The tracking endpoints
+publish each recorded event here after committing it, so the stream never
+queries the database.
+
+Events (all JSON):
+- snapshot:   {"active_sessions": n} sent when a dashboard connects
+- session:    {"device_type": ..., "active_sessions": n}
+- page_view:  {"page_type": ..., "category_id": ..., "item_id": ...}
+- item_click: {"item_id": ..., "category_id": ..., "active_sessions": n}
+- session_end: {"active_sessions": n}
+
+Subscribers and active sessions are kept per process, like the in-memory
+cache; a dashboard only sees events handled by the worker it is connected to.
+"""
+import json
+import time
+import asyncio
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Optional, Set
+
+# A session counts as active if it produced an event within this many seconds
+ACTIVE_SESSION_SECONDS = 300
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+
+# Events buffered per dashboard before a slow client starts missing deltas
+SUBSCRIBER_QUEUE_SIZE = 100
+
+class AnalyticsStream:
+    """In-process publish/subscribe of analytics events per tenant"""
+
+    def __init__(self):
+        self.subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self.sessions: Dict[int, Dict[str, float]] = defaultdict(dict)
+
+    def active_sessions(self, tenant_id: int) -> int:
+        """Number of sessions of a tenant seen within ACTIVE_SESSION_SECONDS"""
+        sessions = self.sessions.get(tenant_id)
+        if not sessions:
+            return 0
+
+        cutoff = time.time() - ACTIVE_SESSION_SECONDS
+        for session_id in [sid for sid, seen in sessions.items() if seen < cutoff]:
+            del sessions[session_id]
+        return len(sessions)
+
+    def touch_session(self, tenant_id: int, session_id: str):
+        """Mark a session as active now"""
+        self.sessions[tenant_id][session_id] = time.time()
+
+    def end_session(self, tenant_id: int, session_id: str):
+        """Forget an ended session"""
+        self.sessions[tenant_id].pop(session_id, None)
+
+    def publish(self, tenant_id: int, event: str, data: Dict):
+        """Send an event to every dashboard of a tenant"""
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        for queue in self.subscribers.get(tenant_id, ()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # The dashboard is not keeping up; it resyncs from the REST endpoints
+                pass
+
+    def record_session(self, tenant_id: int, session_id: str, device_type: Optional[str]):
+        self.touch_session(tenant_id, session_id)
+        self.publish(tenant_id, "session", {
+            "device_type": device_type,
+            "active_sessions": self.active_sessions(tenant_id)
+        })
+
+    def record_page_view(self, tenant_id: int, session_id: str, page_type: str,
+                         category_id: Optional[int], item_id: Optional[int]):
+        self.touch_session(tenant_id, session_id)
+        self.publish(tenant_id, "page_view", {
+            "page_type": page_type,
+            "category_id": category_id,
+            "item_id": item_id
+        })
+
+    def record_item_click(self, tenant_id: int, session_id: str, item_id: int,
+                          category_id: Optional[int]):
+        self.touch_session(tenant_id, session_id)
+        self.publish(tenant_id, "item_click", {
+            "item_id": item_id,
+            "category_id": category_id,
+            "active_sessions": self.active_sessions(tenant_id)
+        })
+
+    def record_session_end(self, tenant_id: int, session_id: str):
+        self.end_session(tenant_id, session_id)
+        self.publish(tenant_id, "session_end", {
+            "active_sessions": self.active_sessions(tenant_id)
+        })
+
+    async def events(self, tenant_id: int, is_disconnected) -> AsyncIterator[str]:
+        """SSE body for one dashboard connection"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers[tenant_id].add(queue)
+        try:
+            yield f"event: snapshot\ndata: {json.dumps({'active_sessions': self.active_sessions(tenant_id)})}\n\n"
+            while not await is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.subscribers[tenant_id].discard(queue)
+            if not self.subscribers[tenant_id]:
+                del self.subscribers[tenant_id]
+
+# Singleton instance
+analytics_stream = AnalyticsStream()
@@ -0,0 +1,117 @@
+"""
+Change Capture for MenuIQ
+
+Tracks, per database transaction, which tenants' menu data changed and
+invalidates each of those tenants' caches exactly once after the
+transaction commits, so no write path has to remember to invalidate (or
+invalidates more than once).
+
+- ORM writes to watched models (tenants, settings, categories, menu items
+  and their images, allergen icons, flows and flow steps) are picked up
+  from the session before each flush.
+- Once a tenant has published its menu (menu_publishing.py), changes to
+  menu data are draft edits: they only refresh the dashboard, and guests
+  keep the published menu until the next publish.
+- Set-based statements (UPDATE ... FROM, bulk inserts, raw SQL) bypass the
+  session's unit of work, so the helpers issuing them call
+  mark_tenants_changed.
+- Nothing is invalidated if the transaction rolls back.
+
+Caches are only dropped, not rebuilt: the next public request (or the
+scheduler's cache_warm job for the busiest tenants) rebuilds them.
+"""
+import logging
+from itertools import chain
+from typing import Iterable
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import (
+    AllergenIcon, Category, Flow, FlowStep, MenuItem, MenuItemImage, Settings, Tenant
+)
+from simple_cache import invalidate_dashboard_cache, invalidate_public_menu_cache
+
+logger = logging.getLogger(__name__)
+
+# session.info keys: (tenant id, menu_data) pairs marked in the current
+# transaction, and the subdomains whose caches to invalidate on commit -
+# entirely, or only the dashboard for draft edits
+CHANGED_TENANT_IDS = "changed_tenant_ids"
+CHANGED_SUBDOMAINS = "changed_subdomains"
+DRAFT_SUBDOMAINS = "draft_subdomains"
+
+# Models carrying a tenant_id: menu data (versioned by publishing), then the rest
+MENU_MODELS = (Category, MenuItem, AllergenIcon)
+TENANT_MODELS = (Settings, Flow)
+
+def mark_tenants_changed(session: Session, tenant_ids: Iterable[int], menu_data: bool = True):
+    """
+    Invalidate these tenants' caches when session's transaction commits.
+    Menu data changes of tenants with a published menu only invalidate the dashboard.
+    """
+    known = session.info.setdefault(CHANGED_TENANT_IDS, set())
+    marks = {(tenant_id, menu_data) for tenant_id in tenant_ids if tenant_id} - known
+    if not marks:
+        return
+
+    # Resolved now: after the commit the session can no longer query
+    rows = session.connection().execute(
+        select(Tenant.subdomain, Tenant.published_menu_version).where(
+            Tenant.id.in_([tenant_id for tenant_id, _ in marks])
+        )
+    ).all()
+    known.update(marks)
+    for subdomain, published_menu_version in rows:
+        key = DRAFT_SUBDOMAINS if menu_data and published_menu_version is not None else CHANGED_SUBDOMAINS
+        session.info.setdefault(key, set()).add(subdomain)
+
+@event.listens_for(SessionLocal, "before_flush")
+def _capture_flush(session: Session, flush_context, instances):
+    menu_tenant_ids, tenant_ids, flow_ids, item_ids = set(), set(), set(), set()
+
+    modified = (obj for obj in session.dirty if session.is_modified(obj))
+    for obj in chain(session.new, modified, session.deleted):
+        if isinstance(obj, Tenant):
+            # Including the old subdomain of a renamed tenant
+            subdomains = session.info.setdefault(CHANGED_SUBDOMAINS, set())
+            subdomains.add(obj.subdomain)
+            subdomains.update(inspect(obj).attrs.subdomain.history.deleted)
+        elif isinstance(obj, MENU_MODELS):
+            menu_tenant_ids.add(obj.tenant_id)
+        elif isinstance(obj, TENANT_MODELS):
+            tenant_ids.add(obj.tenant_id)
+        elif isinstance(obj, FlowStep):
+            flow_ids.add(obj.flow_id)
+        elif isinstance(obj, MenuItemImage):
+            item_ids.add(obj.menu_item_id)
+
+    if flow_ids:
+        tenant_ids.update(session.connection().execute(
+            select(Flow.tenant_id).where(Flow.id.in_(flow_ids))
+        ).scalars())
+    if item_ids:
+        menu_tenant_ids.update(session.connection().execute(
+            select(MenuItem.tenant_id).where(MenuItem.id.in_(item_ids))
+        ).scalars())
+    mark_tenants_changed(session, menu_tenant_ids)
+    mark_tenants_changed(session, tenant_ids, menu_data=False)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_changed(session: Session):
+    session.info.pop(CHANGED_TENANT_IDS, None)
+    changed = session.info.pop(CHANGED_SUBDOMAINS, set())
+    drafts = session.info.pop(DRAFT_SUBDOMAINS, set()) - changed
+    try:
+        for subdomain in changed:
+            invalidate_public_menu_cache(subdomain, warm_cache=False)
+        for subdomain in drafts:
+            invalidate_dashboard_cache(subdomain)
+    except Exception as e:
+        logger.error(f"Cache invalidation after commit failed: {e}")
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_changed(session: Session):
+    session.info.pop(CHANGED_TENANT_IDS, None)
+    session.info.pop(CHANGED_SUBDOMAINS, None)
+    session.info.pop(DRAFT_SUBDOMAINS, None)
@@ -15,10 +15,11 @@ from database import get_db
 from models import Flow, FlowStep, FlowInteraction, Tenant, User
 from pydantic_models import (
     FlowCreate, FlowUpdate, FlowResponse,
-    FlowStepCreate, FlowStepUpdate, FlowStepResponse,
+    FlowStepCreate, FlowStepUpdate, FlowStepMove, FlowStepResponse,
     FlowInteractionCreate, FlowInteractionUpdate, FlowInteractionResponse
 )
 from auth import get_current_tenant_user
+from ordering import FLOW_STEPS, move
 
 router = APIRouter()
 
@@ -381,14 +382,7 @@ def delete_flow_step(
     if not step:
         raise HTTPException(status_code=404, detail="Step not found")
     
-    # Update order positions of remaining steps
-    db.query(FlowStep).filter(
-        FlowStep.flow_id == flow_id,
-        FlowStep.order_position > step.order_position
-    ).update({
-        FlowStep.order_position: FlowStep.order_position - 1
-    })
-    
+    # Remaining steps keep their order; the gap is left for later moves
     db.delete(step)
     db.commit()
     
@@ -424,6 +418,43 @@ def reorder_flow_steps(
     
     return {"message": "Steps reordered successfully"}
 
+@router.post("/flows/{flow_id}/steps/{step_id}/move", response_model=FlowStepResponse)
+def move_flow_step(
+    flow_id: int,
+    step_id: int,
+    move_data: FlowStepMove,
+    current_user: User = Depends(get_current_tenant_user),
+    db: Session = Depends(get_db)
+):
+    """Move a step right after after_id and/or right before before_id."""
+    # Verify flow belongs to tenant
+    flow = db.query(Flow).filter(
+        Flow.id == flow_id,
+        Flow.tenant_id == current_user.tenant_id
+    ).first()
+    
+    if not flow:
+        raise HTTPException(status_code=404, detail="Flow not found")
+    
+    step = db.query(FlowStep).filter(
+        FlowStep.id == step_id,
+        FlowStep.flow_id == flow_id
+    ).first()
+    
+    if not step:
+        raise HTTPException(status_code=404, detail="Step not found")
+    
+    try:
+        move(db, FLOW_STEPS, step, move_data.before_id, move_data.after_id)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    db.commit()
+    db.refresh(step)
+    
+    return step
+
 # Flow Interaction Tracking Endpoints
 
 @router.get("/flow-interactions", response_model=List[FlowInteractionResponse])
@@ -0,0 +1,78 @@
+"""
+HyperLogLog Sketches for MenuIQ Analytics
+
+A HyperLogLog sketch estimates the number of distinct values it has seen
+using a fixed number of small registers, and two sketches merge losslessly
+(register-wise max). analytics_daily stores one sketch of visitor IP hashes
+per tenant and day, so unique visitors of any date range are estimated by
+merging daily sketches instead of running COUNT(DISTINCT) over raw sessions.
+
+Error bound: with precision p there are m = 2^p registers and the relative
+standard error of an estimate is 1.04 / sqrt(m). The default p = 12
+(4096 registers) gives about 1.6%, so roughly 95% of estimates fall within
+3.3% of the true count. Small counts (below 2.5 * m, i.e. ~10k visitors) use
+linear counting and are close to exact.
+"""
+import math
+import zlib
+import hashlib
+from typing import Iterable, Optional
+
+DEFAULT_PRECISION = 12
+
+class HyperLogLog:
+    """Distinct-count sketch with 2^precision one-byte registers"""
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[bytearray] = None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        """64-bit hash of value"""
+        return int.from_bytes(hashlib.sha256(value.encode()).digest()[:8], "big")
+
+    def add(self, value: str):
+        """Add a value to the sketch"""
+        x = self._hash(value)
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        # Position of the leftmost 1 bit in the remaining 64 - p bits
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[str]):
+        """Add many values to the sketch"""
+        for value in values:
+            if value:
+                self.add(value)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Fold another sketch of the same precision into this one"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        """Estimated number of distinct values added"""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.m * math.log(self.m / zeros)
+
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        """Serialize as precision byte + zlib-compressed registers"""
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        """Load a sketch written by to_bytes()"""
+        return cls(data[0], bytearray(zlib.decompress(data[1:])))
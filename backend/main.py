@@ -51,6 +51,10 @@ from analytics_routes import router as analytics_router        # Analytics track
 from flowiq_routes import router as flowiq_router              # FlowIQ management
 from public_flowiq_routes import router as public_flowiq_router # Public FlowIQ endpoints
 
+# Import analytics maintenance helpers
+from analytics_partitions import ensure_partitions
+from scheduler import scheduler, SCHEDULER_ENABLED
+
 # Create all database tables if they don't exist
 Base.metadata.create_all(bind=engine)
 
@@ -142,6 +146,15 @@ async def health_check(db: Session = Depends(get_db)):
 async def startup_event():
     db = next(get_db())
     
+    # Make sure the partitioned analytics tables have partitions for the coming months
+    try:
+        created = ensure_partitions(db)
+        if created:
+            print(f"Created analytics partitions: {', '.join(created)}")
+    except Exception as e:
+        db.rollback()
+        print(f"Analytics partition check failed: {e}")
+    
     # Check if we have any system admins
     admin_count = db.query(func.count(SystemAdmin.id)).scalar()
     
@@ -383,6 +396,14 @@ async def startup_event():
         print(f"Created demo tenant: demo.menuiq.io (admin@demo.menuiq.io / demo123)")
     
     db.close()
+    
+    # Start background jobs (analytics rollup, cache sweep, cache warming)
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await scheduler.stop()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,548 @@
+"""
+Bulk Menu Import/Export for MenuIQ
+
+Imports a whole menu from a CSV, XLSX or JSON file and exports it in the
+same formats, so onboarding a restaurant is one upload instead of one
+POST /menu-items per item.
+
+File layout (one row/object per menu item):
+- any MenuItem column by name (name, price, calories, halal, tags, ...)
+- id: existing item to update; leave empty to create a new item
+- category: category name (created if missing) or category_id
+- allergens: comma-separated allergen names (a list in JSON)
+- parent_item: name or id of the multi-item this row is a sub-item of
+
+Empty cells leave a field unchanged (new items get the column default;
+new items and categories are appended to the end of their list).
+Rows are read one at a time and coerced with the same rules as the item
+update endpoint (menu_item_fields.py); every error is collected with its
+row number and nothing is written unless the whole file is valid. Valid
+files are written in one transaction with a fixed number of batched
+statements (categories, item inserts, item updates, allergen links,
+sub-item links, price ranges); the tenant's cache is invalidated once on
+commit (change_capture.py).
+"""
+import io
+import csv
+import json
+import codecs
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from change_capture import mark_tenants_changed
+from models import Category, MenuItem, AllergenIcon, Tenant, item_allergens
+from menu_item_fields import COMPUTED_FIELDS, coerce_menu_item_field, refresh_price_ranges
+from ordering import ORDER_GAP
+
+IMPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "json": "application/json",
+}
+
+# Maintained by the system, never read from a file
+SYSTEM_FIELDS = COMPUTED_FIELDS | {
+    "id", "tenant_id", "category_id", "parent_item_id", "created_at", "updated_at"
+}
+
+ITEM_FIELDS = [
+    column.name for column in MenuItem.__table__.columns
+    if column.name not in SYSTEM_FIELDS
+]
+
+EXPORT_COLUMNS = ["id", "category", "parent_item", "allergens"] + ITEM_FIELDS
+
+# Errors returned for an invalid file
+MAX_REPORTED_ERRORS = 100
+
+# Rows fetched per round trip and written per response chunk when exporting
+EXPORT_BATCH_SIZE = 500
+
+class MenuImportError(Exception):
+    """The file is invalid; nothing was written"""
+
+    def __init__(self, message: str, errors: Optional[List[Dict]] = None):
+        super().__init__(message)
+        self.message = message
+        self.errors = (errors or [])[:MAX_REPORTED_ERRORS]
+        self.error_count = len(errors or [])
+
+def _is_empty(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+def read_rows(file, file_format: str) -> Iterator[Tuple[int, Dict]]:
+    """Yield (row number, {column: value}) from an uploaded file"""
+    if file_format == "csv":
+        reader = csv.DictReader(codecs.iterdecode(file, "utf-8-sig"))
+        for number, row in enumerate(reader, start=2):
+            yield number, row
+
+    elif file_format == "xlsx":
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else None for cell in next(rows, [])]
+            for number, cells in enumerate(rows, start=2):
+                if all(_is_empty(cell) for cell in cells):
+                    continue
+                yield number, {name: cell for name, cell in zip(header, cells) if name}
+        finally:
+            workbook.close()
+
+    elif file_format == "json":
+        data = json.load(file)
+        if isinstance(data, dict):
+            data = data.get("items", [])
+        if not isinstance(data, list):
+            raise MenuImportError("JSON file must hold a list of items or {\"items\": [...]}")
+        for number, row in enumerate(data, start=1):
+            if not isinstance(row, dict):
+                raise MenuImportError(f"Item {number} is not an object")
+            yield number, row
+
+    else:
+        raise MenuImportError(f"Unknown format. Use one of: {', '.join(IMPORT_FORMATS)}")
+
+class MenuImporter:
+    """Validates an import file against a tenant's menu and writes it in batches"""
+
+    def __init__(self, db: Session, tenant: Tenant):
+        self.db = db
+        self.tenant = tenant
+
+        items = db.query(MenuItem.id, MenuItem.name).filter(MenuItem.tenant_id == tenant.id).all()
+        self.item_ids = {item_id for item_id, _ in items}
+
+        categories = db.query(Category.id, Category.name).filter(Category.tenant_id == tenant.id).all()
+        self.category_ids = {category_id for category_id, _ in categories}
+        self.categories_by_name = {name.strip().lower(): category_id for category_id, name in categories if name}
+
+        allergens = db.query(AllergenIcon.id, AllergenIcon.name, AllergenIcon.display_name).filter(
+            AllergenIcon.tenant_id == tenant.id
+        ).all()
+        self.allergens_by_name = {}
+        for allergen_id, name, display_name in allergens:
+            for label in (name, display_name):
+                if label:
+                    self.allergens_by_name.setdefault(label.strip().lower(), allergen_id)
+
+        self.rows: List[Dict] = []
+        self.new_categories: Dict[str, str] = {}
+        self.errors: List[Dict] = []
+
+    def _error(self, row: int, field: Optional[str], message: str):
+        self.errors.append({"row": row, "field": field, "error": message})
+
+    def validate_row(self, number: int, raw: Dict):
+        """Coerce one row and record it, or record its errors"""
+        raw = {str(key).strip(): value for key, value in raw.items() if key is not None}
+        error_count = len(self.errors)
+        values = {}
+
+        for field in ITEM_FIELDS:
+            value = raw.get(field)
+            if _is_empty(value):
+                continue
+            if isinstance(value, str):
+                value = value.strip()
+            try:
+                values[field] = coerce_menu_item_field(field, value)
+            except (ValueError, TypeError) as e:
+                self._error(number, field, str(e))
+
+        item_id = None
+        if not _is_empty(raw.get("id")):
+            try:
+                item_id = int(raw["id"])
+            except (ValueError, TypeError):
+                item_id = -1
+            if item_id not in self.item_ids:
+                self._error(number, "id", f"Unknown menu item id '{raw['id']}' (leave id empty to create an item)")
+
+        category_id = None
+        category_name = None
+        if not _is_empty(raw.get("category_id")):
+            try:
+                category_id = int(raw["category_id"])
+            except (ValueError, TypeError):
+                category_id = -1
+            if category_id not in self.category_ids:
+                self._error(number, "category_id", f"Unknown category id '{raw['category_id']}'")
+        elif not _is_empty(raw.get("category")):
+            category_name = str(raw["category"]).strip()
+            category_id = self.categories_by_name.get(category_name.lower())
+            if category_id is None:
+                self.new_categories.setdefault(category_name.lower(), category_name)
+
+        if item_id is None:
+            if "name" not in values:
+                self._error(number, "name", "Name is required for new items")
+            if category_id is None and category_name is None:
+                self._error(number, "category", "Category is required for new items")
+
+        allergen_ids = None
+        if not _is_empty(raw.get("allergens")):
+            names = raw["allergens"]
+            if isinstance(names, str):
+                names = names.split(",")
+            allergen_ids = []
+            for name in names:
+                name = str(name).strip()
+                if not name:
+                    continue
+                allergen_id = self.allergens_by_name.get(name.lower())
+                if allergen_id is None:
+                    self._error(number, "allergens", f"Unknown allergen '{name}'")
+                else:
+                    allergen_ids.append(allergen_id)
+
+        parent = raw.get("parent_item")
+        if isinstance(parent, float) and parent.is_integer():
+            parent = int(parent)
+        parent = None if _is_empty(parent) else str(parent).strip()
+
+        if len(self.errors) == error_count:
+            self.rows.append({
+                "row": number,
+                "id": item_id,
+                "values": values,
+                "category_id": category_id,
+                "category_name": category_name,
+                "allergen_ids": allergen_ids,
+                "parent": parent
+            })
+
+    def validate(self, rows: Iterator[Tuple[int, Dict]]):
+        """Validate every row and the tenant limits; raises MenuImportError if anything is invalid"""
+        for number, raw in rows:
+            self.validate_row(number, raw)
+
+        if self.errors:
+            raise MenuImportError("Import file has invalid rows; nothing was imported", self.errors)
+        if not self.rows:
+            raise MenuImportError("Import file has no rows")
+
+        new_items = sum(1 for row in self.rows if row["id"] is None)
+        if len(self.item_ids) + new_items > self.tenant.max_menu_items:
+            raise MenuImportError(
+                f"Menu item limit reached. Maximum allowed: {self.tenant.max_menu_items}, "
+                f"file adds {new_items} to {len(self.item_ids)} existing items"
+            )
+        if len(self.category_ids) + len(self.new_categories) > self.tenant.max_categories:
+            raise MenuImportError(
+                f"Category limit reached. Maximum allowed: {self.tenant.max_categories}, "
+                f"file adds {len(self.new_categories)} categories"
+            )
+
+    def _create_categories(self):
+        if not self.new_categories:
+            return
+
+        # Appended after the existing categories, ORDER_GAP apart (see ordering.py)
+        last_sort_order = self.db.query(func.max(Category.sort_order)).filter(
+            Category.tenant_id == self.tenant.id
+        ).scalar() or 0
+
+        created = self.db.execute(
+            insert(Category).returning(Category.id, Category.name, sort_by_parameter_order=True),
+            [{
+                "tenant_id": self.tenant.id,
+                "name": name,
+                "value": name.lower().replace(" ", "_"),
+                "label": name,
+                "icon": "🍴",
+                "color_theme": "#6B7280",
+                "sort_order": last_sort_order + (index + 1) * ORDER_GAP
+            } for index, name in enumerate(self.new_categories.values())]
+        ).all()
+
+        for category_id, name in created:
+            self.categories_by_name[name.lower()] = category_id
+
+    def _insert_items(self, rows: List[Dict]) -> List[int]:
+        if not rows:
+            return []
+
+        # Top-level items without a sort_order are appended to the menu in file order
+        last_sort_order = self.db.query(func.max(MenuItem.sort_order)).filter(
+            MenuItem.tenant_id == self.tenant.id,
+            MenuItem.parent_item_id.is_(None)
+        ).scalar() or 0
+        for row in rows:
+            if "sort_order" not in row["values"] and not row["parent"]:
+                last_sort_order += ORDER_GAP
+                row["values"]["sort_order"] = last_sort_order
+            # Tags are always a list, as in create_menu_item
+            row["values"].setdefault("tags", [])
+
+        # One key set for all rows so they go out as a single batch; columns
+        # missing from a row get their scalar default
+        fields = sorted({field for row in rows for field in row["values"]} | {"category_id"})
+        defaults = {}
+        for field in fields:
+            default = MenuItem.__table__.columns[field].default
+            defaults[field] = default.arg if default is not None and default.is_scalar else None
+
+        params = []
+        for row in rows:
+            values = {field: row["values"].get(field, defaults[field]) for field in fields}
+            values["tenant_id"] = self.tenant.id
+            values["category_id"] = row["category_id"]
+            params.append(values)
+
+        return self.db.execute(
+            insert(MenuItem).returning(MenuItem.id, sort_by_parameter_order=True), params
+        ).scalars().all()
+
+    def _update_items(self, rows: List[Dict]):
+        params = []
+        for row in rows:
+            values = dict(row["values"])
+            if row["category_id"] is not None:
+                values["category_id"] = row["category_id"]
+            params.append({"id": row["id"], "updated_at": datetime.utcnow(), **values})
+
+        if params:
+            # Bulk UPDATE by primary key, one executemany per distinct column set
+            self.db.execute(update(MenuItem), params)
+
+    def _link_allergens(self, rows: List[Dict]):
+        rows = [row for row in rows if row["allergen_ids"] is not None]
+        if not rows:
+            return
+
+        self.db.execute(item_allergens.delete().where(
+            item_allergens.c.item_id.in_([row["id"] for row in rows])
+        ))
+        links = [
+            {"item_id": row["id"], "allergen_id": allergen_id}
+            for row in rows
+            for allergen_id in dict.fromkeys(row["allergen_ids"])
+        ]
+        if links:
+            self.db.execute(item_allergens.insert(), links)
+
+    def _link_sub_items(self, rows: List[Dict]) -> List[int]:
+        """Attach rows with parent_item to their multi-item; returns the parent ids"""
+        rows = [row for row in rows if row["parent"]]
+        if not rows:
+            return []
+
+        items = self.db.query(MenuItem.id, MenuItem.name, MenuItem.is_multi_item).filter(
+            MenuItem.tenant_id == self.tenant.id
+        ).all()
+        multi_items = {item_id for item_id, _, is_multi_item in items if is_multi_item}
+        by_name: Dict[str, List[int]] = {}
+        for item_id, name, _ in items:
+            by_name.setdefault((name or "").strip().lower(), []).append(item_id)
+
+        errors = []
+        attached = []
+        for row in rows:
+            parent = row["parent"]
+            candidates = [int(parent)] if parent.isdigit() else by_name.get(parent.lower(), [])
+            if len(candidates) != 1:
+                message = "is ambiguous" if candidates else "was not found"
+                errors.append({"row": row["row"], "field": "parent_item", "error": f"Parent item '{parent}' {message}"})
+                continue
+
+            parent_id = candidates[0]
+            if parent_id not in multi_items:
+                errors.append({"row": row["row"], "field": "parent_item", "error": f"Parent item '{parent}' is not a multi-item"})
+            elif row["values"].get("is_multi_item"):
+                errors.append({"row": row["row"], "field": "parent_item", "error": "A multi-item cannot be a sub-item"})
+            else:
+                attached.append((row, parent_id))
+
+        # A sub_item_order from the file is kept, a sub-item staying with its
+        # parent keeps its position, and sub-items new to a parent go last
+        current = {
+            item_id: (parent_id, position) for item_id, parent_id, position in self.db.query(
+                MenuItem.id, MenuItem.parent_item_id, MenuItem.sub_item_order
+            ).filter(MenuItem.id.in_([row["id"] for row, _ in attached]))
+        }
+        positions: Dict[int, int] = dict(self.db.query(
+            MenuItem.parent_item_id, func.max(MenuItem.sub_item_order)
+        ).filter(
+            MenuItem.tenant_id == self.tenant.id,
+            MenuItem.parent_item_id.isnot(None)
+        ).group_by(MenuItem.parent_item_id).all())
+        for row, parent_id in attached:
+            position = row["values"].get("sub_item_order")
+            if position is not None:
+                positions[parent_id] = max(positions.get(parent_id) or 0, position)
+
+        params = []
+        parent_ids = set()
+        for row, parent_id in attached:
+            position = row["values"].get("sub_item_order")
+            if position is None:
+                current_parent, position = current.get(row["id"], (None, None))
+                if current_parent != parent_id or position is None:
+                    positions[parent_id] = (positions.get(parent_id) or 0) + ORDER_GAP
+                    position = positions[parent_id]
+            parent_ids.add(parent_id)
+            params.append({"id": row["id"], "parent_item_id": parent_id, "sub_item_order": position})
+
+        if errors:
+            raise MenuImportError("Import file has invalid rows; nothing was imported", errors)
+
+        self.db.execute(update(MenuItem), params)
+        return list(parent_ids)
+
+    def write(self) -> Dict:
+        """Write the validated rows in one transaction"""
+        # Bulk statements bypass the session's change tracking
+        mark_tenants_changed(self.db, [self.tenant.id])
+        self._create_categories()
+        for row in self.rows:
+            if row["category_id"] is None and row["category_name"]:
+                row["category_id"] = self.categories_by_name[row["category_name"].lower()]
+
+        new_rows = [row for row in self.rows if row["id"] is None]
+        existing_rows = [row for row in self.rows if row["id"] is not None]
+
+        for row, item_id in zip(new_rows, self._insert_items(new_rows)):
+            row["id"] = item_id
+        self._update_items(existing_rows)
+        self._link_allergens(self.rows)
+        parent_ids = self._link_sub_items(self.rows)
+
+        # Multi-items whose sub-items were (re)assigned or repriced
+        imported_ids = [row["id"] for row in self.rows]
+        parent_ids += [
+            parent_id for parent_id, in self.db.query(MenuItem.parent_item_id).filter(
+                MenuItem.id.in_(imported_ids),
+                MenuItem.parent_item_id.isnot(None)
+            ).distinct().all()
+        ]
+        refresh_price_ranges(self.db, parent_ids)
+
+        return {
+            "created": len(new_rows),
+            "updated": len(existing_rows),
+            "categories_created": len(self.new_categories)
+        }
+
+def import_menu(db: Session, tenant: Tenant, file, file_format: str, dry_run: bool = False) -> Dict:
+    """Validate and import a menu file for a tenant; raises MenuImportError if it is invalid"""
+    importer = MenuImporter(db, tenant)
+    importer.validate(read_rows(file, file_format))
+
+    if dry_run:
+        return {
+            "created": sum(1 for row in importer.rows if row["id"] is None),
+            "updated": sum(1 for row in importer.rows if row["id"] is not None),
+            "categories_created": len(importer.new_categories),
+            "dry_run": True
+        }
+
+    try:
+        result = importer.write()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return result
+
+def _export_value(value, file_format: str):
+    """Cell/field value of a column in the given export format"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if file_format == "json":
+        return str(value) if isinstance(value, Decimal) else value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if file_format == "csv" and isinstance(value, bool):
+        return "true" if value else "false"
+    # XLSX keeps numbers and booleans typed
+    return value
+
+def _export_rows(db: Session, tenant_id: int) -> Iterator[Dict]:
+    """Menu items of a tenant as export rows, parents before their sub-items"""
+    categories = dict(db.query(Category.id, Category.name).filter(Category.tenant_id == tenant_id).all())
+    names = dict(db.query(MenuItem.id, MenuItem.name).filter(MenuItem.tenant_id == tenant_id).all())
+
+    allergens: Dict[int, List[str]] = {}
+    for item_id, name in db.query(item_allergens.c.item_id, AllergenIcon.name).join(
+        AllergenIcon, AllergenIcon.id == item_allergens.c.allergen_id
+    ).filter(AllergenIcon.tenant_id == tenant_id).all():
+        allergens.setdefault(item_id, []).append(name)
+
+    columns = [MenuItem.__table__.columns[field] for field in ["id", "category_id", "parent_item_id"] + ITEM_FIELDS]
+    rows = db.query(*columns).filter(
+        MenuItem.tenant_id == tenant_id
+    ).order_by(
+        MenuItem.parent_item_id.isnot(None), MenuItem.category_id, MenuItem.sort_order,
+        MenuItem.sub_item_order, MenuItem.id
+    ).yield_per(EXPORT_BATCH_SIZE)
+
+    for row in rows:
+        values = row._asdict()
+        yield {
+            "id": values["id"],
+            "category": categories.get(values["category_id"]),
+            "parent_item": names.get(values["parent_item_id"]),
+            "allergens": allergens.get(values["id"], []),
+            **{field: values[field] for field in ITEM_FIELDS}
+        }
+
+def stream_menu_export(tenant_id: int, file_format: str) -> Iterator[bytes]:
+    """Yield a tenant's menu as CSV, XLSX or JSON in chunks"""
+    # Own session: it must stay open until the last chunk has been sent
+    db = SessionLocal()
+    try:
+        if file_format == "json":
+            yield b'{"items": ['
+            separator = b"\n"
+            for row in _export_rows(db, tenant_id):
+                row = {key: _export_value(value, "json") for key, value in row.items()}
+                yield separator + json.dumps(row, ensure_ascii=False).encode()
+                separator = b",\n"
+            yield b"\n]}\n"
+
+        elif file_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            pending = 0
+            for row in _export_rows(db, tenant_id):
+                row["allergens"] = ",".join(row["allergens"])
+                writer.writerow([_export_value(row[column], "csv") for column in EXPORT_COLUMNS])
+                pending += 1
+                if pending >= EXPORT_BATCH_SIZE:
+                    yield buffer.getvalue().encode()
+                    buffer.seek(0)
+                    buffer.truncate()
+                    pending = 0
+            yield buffer.getvalue().encode()
+
+        elif file_format == "xlsx":
+            from openpyxl import Workbook
+
+            # Write-only workbooks keep rows on disk; the zip is sent once complete
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet("Menu")
+            sheet.append(EXPORT_COLUMNS)
+            for row in _export_rows(db, tenant_id):
+                row["allergens"] = ",".join(row["allergens"])
+                sheet.append([_export_value(row[column], "xlsx") for column in EXPORT_COLUMNS])
+
+            with tempfile.TemporaryFile() as output:
+                workbook.save(output)
+                output.seek(0)
+                while True:
+                    chunk = output.read(64 * 1024)
+                    if not chunk:
+                        break
+                    yield chunk
+    finally:
+        db.close()
@@ -0,0 +1,239 @@
+"""
+Menu item field coercion shared by the item endpoints and bulk import
+
+Incoming values come from JSON bodies or from CSV/XLSX cells (where
+everything may be a string), so each field is converted to the type of its
+MenuItem column the same way wherever an item is written. The converters
+are looked up once, at import, from the MenuItem column types, and a whole
+payload is parsed in one pass that reports every invalid field. Also holds
+the set-based writes of an item's relationships (allergens, sub-items) and
+of multi-item price ranges, so saving an item is a handful of statements in
+one transaction.
+"""
+import json
+import decimal
+from datetime import date, datetime
+from decimal import Decimal
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Tuple
+from sqlalchemy import (
+    JSON, Boolean, Date, DateTime, Integer, Numeric, column, func, update, values
+)
+from sqlalchemy.orm import Session, aliased
+
+from models import AllergenIcon, MenuItem, item_allergens
+from ordering import ORDER_GAP
+from change_capture import mark_tenants_changed
+
+# Never written from a payload (relationships are not columns and are
+# handled by set_item_allergens/assign_sub_items)
+PROTECTED_FIELDS = {"id", "tenant_id", "created_at", "allergens"}
+
+# Computed by background jobs (popularity ranking, refresh_price_ranges); ignored in every payload
+COMPUTED_FIELDS = {"best_seller_rank", "price_min", "price_max"}
+
+# Maintained by the system (ratings, popularity, multi-items); ignored when creating an item
+DERIVED_FIELDS = COMPUTED_FIELDS | {
+    "customer_rating", "review_count", "reorder_rate", "parent_item_id", "sub_item_order"
+}
+
+TRUE_STRINGS = {"true", "1", "yes", "y"}
+FALSE_STRINGS = {"false", "0", "no", "n", ""}
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+def _to_int(value):
+    if _is_blank(value):
+        return None
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"expected a whole number, got '{value}'")
+    try:
+        return int(value.strip() if isinstance(value, str) else value)
+    except (ValueError, TypeError):
+        raise ValueError(f"expected a whole number, got '{value}'")
+
+def _to_decimal(value):
+    if _is_blank(value):
+        return None
+    try:
+        return Decimal(str(value).strip())
+    except decimal.InvalidOperation:
+        raise ValueError(f"expected a number, got '{value}'")
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if _is_blank(value):
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip()).date()
+    except ValueError:
+        raise ValueError(f"expected a date (YYYY-MM-DD), got '{value}'")
+
+def _to_datetime(value):
+    if isinstance(value, datetime) or _is_blank(value):
+        return value or None
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"expected a date and time (ISO 8601), got '{value}'")
+
+def _to_json(value, empty: Callable = lambda: None):
+    if _is_blank(value):
+        return empty()
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            raise ValueError(f"expected JSON, got '{value}'")
+    return value
+
+def _to_bool(value):
+    if isinstance(value, str):
+        normalized = value.strip().lower()
+        if normalized in TRUE_STRINGS:
+            return True
+        if normalized in FALSE_STRINGS:
+            return False
+        raise ValueError(f"expected true/false, got '{value}'")
+    return value
+
+def _unchanged(value):
+    return value
+
+# Checked in order: more specific column types first
+CONVERTERS_BY_TYPE = [
+    (Boolean, _to_bool),
+    (Integer, _to_int),
+    (Numeric, _to_decimal),
+    (DateTime, _to_datetime),
+    (Date, _to_date),
+    (JSON, _to_json),
+]
+
+def _compile_converters(model) -> Dict[str, Callable]:
+    """Converter for every column of model, chosen from its SQLAlchemy type"""
+    converters = {}
+    for col in model.__table__.columns:
+        converters[col.name] = next(
+            (convert for column_type, convert in CONVERTERS_BY_TYPE if isinstance(col.type, column_type)),
+            _unchanged
+        )
+    return converters
+
+MENU_ITEM_CONVERTERS = _compile_converters(MenuItem)
+# Tags are always a list, never null
+MENU_ITEM_CONVERTERS["tags"] = partial(_to_json, empty=list)
+
+def coerce_menu_item_field(field: str, value):
+    """
+    Convert a payload value to the Python type of the MenuItem column.
+    Blank values become None; a value that does not parse raises ValueError.
+    """
+    return MENU_ITEM_CONVERTERS.get(field, _unchanged)(value)
+
+def parse_menu_item_payload(payload: Dict, ignored: Iterable[str] = ()) -> Tuple[Dict, List[Dict]]:
+    """
+    Coerce every MenuItem column in a request payload in one pass.
+
+    Returns (values, errors) where errors lists {"field", "error"} for each
+    invalid value. Relationship, protected, ignored and unknown keys are
+    left out of values.
+    """
+    skipped = PROTECTED_FIELDS.union(ignored)
+    parsed, errors = {}, []
+    for field, value in payload.items():
+        convert = MENU_ITEM_CONVERTERS.get(field)
+        if convert is None or field in skipped:
+            continue
+        try:
+            parsed[field] = convert(value)
+        except ValueError as e:
+            errors.append({"field": field, "error": str(e)})
+    return parsed, errors
+
+def refresh_price_ranges(db: Session, parent_ids: Iterable[int]) -> None:
+    """Set price_min/price_max of multi-items from their sub-items with one UPDATE"""
+    parent_ids = [parent_id for parent_id in set(parent_ids) if parent_id]
+    if not parent_ids:
+        return
+
+    sub_item = aliased(MenuItem)
+    ranges = db.query(
+        sub_item.parent_item_id.label("parent_item_id"),
+        func.min(sub_item.price).label("price_min"),
+        func.max(sub_item.price).label("price_max")
+    ).filter(
+        sub_item.parent_item_id.in_(parent_ids),
+        sub_item.price.isnot(None)
+    ).group_by(sub_item.parent_item_id).subquery()
+
+    db.execute(
+        update(MenuItem)
+        .where(MenuItem.id == ranges.c.parent_item_id, MenuItem.is_multi_item == True)
+        .values(price_min=ranges.c.price_min, price_max=ranges.c.price_max)
+        .execution_options(synchronize_session=False)
+    )
+
+def set_item_allergens(db: Session, tenant_id: int, item_id: int, allergen_ids: Iterable) -> None:
+    """Replace the allergens of an item with those of allergen_ids belonging to the tenant"""
+    allergen_ids = list(dict.fromkeys(int(allergen_id) for allergen_id in allergen_ids or []))
+    mark_tenants_changed(db, [tenant_id])
+    db.execute(item_allergens.delete().where(item_allergens.c.item_id == item_id))
+    if not allergen_ids:
+        return
+
+    found = {allergen_id for allergen_id, in db.query(AllergenIcon.id).filter(
+        AllergenIcon.id.in_(allergen_ids),
+        AllergenIcon.tenant_id == tenant_id
+    ).all()}
+    links = [
+        {"item_id": item_id, "allergen_id": allergen_id}
+        for allergen_id in allergen_ids if allergen_id in found
+    ]
+    if links:
+        db.execute(item_allergens.insert(), links)
+
+def assign_sub_items(db: Session, tenant_id: int, parent_id: int, sub_item_ids: Iterable,
+                     unassigned_only: bool = False) -> List[int]:
+    """
+    Make sub_item_ids, in that order, the sub-items of a multi-item, unlinking
+    its previous ones. With unassigned_only, items already under another
+    multi-item are skipped instead of moved.
+
+    Returns the ids of multi-items whose price range needs refreshing.
+    """
+    mark_tenants_changed(db, [tenant_id])
+    db.query(MenuItem).filter(MenuItem.parent_item_id == parent_id).update(
+        {"parent_item_id": None, "sub_item_order": 0}, synchronize_session=False
+    )
+
+    sub_item_ids = [int(sub_item_id) for sub_item_id in sub_item_ids or []]
+    query = db.query(MenuItem.id, MenuItem.parent_item_id).filter(
+        MenuItem.id.in_(sub_item_ids),
+        MenuItem.tenant_id == tenant_id,
+        MenuItem.is_multi_item == False
+    )
+    if unassigned_only:
+        query = query.filter(MenuItem.parent_item_id.is_(None))
+    previous_parents = dict(query.all())
+
+    positions = {}
+    for index, sub_item_id in enumerate(sub_item_ids):
+        if sub_item_id in previous_parents and sub_item_id not in positions:
+            positions[sub_item_id] = (index + 1) * ORDER_GAP
+    if positions:
+        new_sub_items = values(
+            column("id", Integer), column("position", Integer), name="new_sub_items"
+        ).data(list(positions.items()))
+        db.execute(
+            update(MenuItem)
+            .where(MenuItem.id == new_sub_items.c.id)
+            .values(parent_item_id=parent_id, sub_item_order=new_sub_items.c.position)
+            .execution_options(synchronize_session=False)
+        )
+
+    return [parent_id] + [parent for parent in previous_parents.values() if parent]
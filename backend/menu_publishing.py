@@ -0,0 +1,128 @@
+"""
+Menu Publishing for MenuIQ
+
+Lets a tenant edit its menu as a draft and publish it in one step. Until a
+tenant first publishes, guests see menu edits as soon as they are saved.
+After that:
+
+- Items and categories edited in the dashboard are the draft. Saving them
+  refreshes the dashboard but neither the public menu nor its cache
+  (see change_capture.py).
+- Publishing serializes the draft into a menu_versions row once. It then
+  points tenants.published_menu_version at that row in the same
+  transaction, so guests switch from the old menu to the new one
+  atomically and never see half-edited menus.
+- Public menu endpoints serve the published snapshot. They slice it for
+  pagination and field selection instead of querying the menu tables.
+- The last MENU_VERSIONS_KEPT versions are kept, so a previous menu can
+  be put back by switching the pointer.
+
+Settings and tenant details (currency, colors, logo) are not versioned
+and stay live: snapshots store prices as numbers, and the current currency
+is added when they are served (public_menu_routes.format_prices).
+"""
+import os
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import MenuVersion, Tenant
+from simple_cache import cache, CACHE_TTL
+
+# Published versions kept per tenant (the current one included)
+MENU_VERSIONS_KEPT = int(os.getenv("MENU_VERSIONS_KEPT", "10"))
+
+def published_menu(db: Session, tenant: Tenant) -> Optional[Dict]:
+    """Items and categories of the tenant's published menu, or None if it serves its menu live"""
+    version = tenant.published_menu_version
+    if version is None:
+        return None
+
+    # Versions never change once published
+    cache_key = f"menu_version:tenant_id:{tenant.id}:version:{version}"
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        row = db.query(MenuVersion.items, MenuVersion.categories).filter(
+            MenuVersion.tenant_id == tenant.id,
+            MenuVersion.version == version
+        ).first()
+        if row is None:
+            return None
+        snapshot = {"items": row.items, "categories": row.categories}
+        cache.set(cache_key, snapshot, CACHE_TTL["menu_version"])
+    return snapshot
+
+def publish_menu(db: Session, tenant_id: int, user_id: Optional[int] = None) -> MenuVersion:
+    """Snapshot the tenant's current menu as a new version and publish it; commits"""
+    # Import here to avoid circular imports
+    from public_menu_routes import (
+        build_public_categories, public_items_query, serialize_public_item
+    )
+
+    # Row lock: concurrent publishes of a tenant get consecutive versions
+    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).with_for_update().one()
+
+    items = [serialize_public_item(item) for item in public_items_query(db, tenant.id).all()]
+    categories = build_public_categories(db, tenant.id)
+
+    last_version = db.query(func.max(MenuVersion.version)).filter(
+        MenuVersion.tenant_id == tenant.id
+    ).scalar() or 0
+    menu_version = MenuVersion(
+        tenant_id=tenant.id,
+        version=last_version + 1,
+        items=items,
+        categories=categories,
+        item_count=len(items),
+        published_by=user_id
+    )
+    db.add(menu_version)
+
+    # Guests switch to the new version when this commits
+    tenant.published_menu_version = menu_version.version
+
+    db.query(MenuVersion).filter(
+        MenuVersion.tenant_id == tenant.id,
+        MenuVersion.version <= menu_version.version - MENU_VERSIONS_KEPT
+    ).delete(synchronize_session=False)
+
+    db.commit()
+    db.refresh(menu_version)
+    return menu_version
+
+def switch_menu_version(db: Session, tenant: Tenant, version: Optional[int]):
+    """
+    Publish an earlier kept version, or with None serve the menu live again;
+    commits. Raises ValueError if the version is not kept.
+    """
+    if version is not None:
+        exists = db.query(
+            db.query(MenuVersion.id).filter(
+                MenuVersion.tenant_id == tenant.id,
+                MenuVersion.version == version
+            ).exists()
+        ).scalar()
+        if not exists:
+            raise ValueError(f"Menu version {version} not found")
+
+    tenant.published_menu_version = version
+    db.commit()
+
+def list_menu_versions(db: Session, tenant: Tenant) -> List[Dict]:
+    """Kept versions, newest first"""
+    versions = db.query(
+        MenuVersion.version, MenuVersion.item_count, MenuVersion.published_by, MenuVersion.published_at
+    ).filter(
+        MenuVersion.tenant_id == tenant.id
+    ).order_by(MenuVersion.version.desc()).all()
+
+    return [
+        {
+            "version": row.version,
+            "item_count": row.item_count,
+            "published_by": row.published_by,
+            "published_at": row.published_at,
+            "is_published": row.version == tenant.published_menu_version
+        }
+        for row in versions
+    ]
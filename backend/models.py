@@ -14,7 +14,7 @@ Key Models:
 - AllergenIcon: Allergen information
 """
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, DECIMAL, JSON, Date, Table, Numeric, Index
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, DECIMAL, JSON, Date, Table, Numeric, Index, LargeBinary
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from database import Base
@@ -51,6 +51,8 @@ class Tenant(Base):
     max_categories = Column(Integer, default=10)
     custom_domain_enabled = Column(Boolean, default=False)
     analytics_enabled = Column(Boolean, default=False)
+    # Menu version guests see (menu_versions); NULL serves menu edits live
+    published_menu_version = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -224,7 +226,7 @@ class MenuItem(Base):
     award_winning = Column(Boolean, default=False)
     customer_rating = Column(DECIMAL(2, 1))
     review_count = Column(Integer, default=0)
-    best_seller_rank = Column(Integer)
+    best_seller_rank = Column(Integer)  # 1 = most clicked recently, maintained by popularity.py
     reorder_rate = Column(DECIMAL(3, 1))
     reward_points = Column(Integer, default=0)
     
@@ -260,6 +262,11 @@ class MenuItem(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Tenant menus sorted by popularity
+        Index('idx_menu_items_tenant_best_seller_rank', 'tenant_id', 'best_seller_rank', 'id'),
+    )
+    
     # Relationships
     tenant = relationship("Tenant", back_populates="menu_items")
     category = relationship("Category", back_populates="menu_items")
@@ -493,7 +500,64 @@ class ActivityLog(Base):
     last_login = Column(DateTime)
 
 
+class ScheduledJobRun(Base):
+    """
+    Last run of each locked background job (see scheduler.py), shared by
+    all workers so a job done by one of them is not repeated by the others
+    within the same interval.
+    """
+    __tablename__ = "scheduled_job_runs"
+    
+    job_name = Column(String(100), primary_key=True)
+    last_started_at = Column(DateTime)
+    last_finished_at = Column(DateTime)
+    last_duration = Column(Float)
+    last_error = Column(Text)
+    runs = Column(Integer, default=0)
+
+
+class MenuVersion(Base):
+    """
+    A published snapshot of a tenant's public menu (see menu_publishing.py).
+    Menu edits are a draft until published; guests are served the version
+    tenants.published_menu_version points to.
+    """
+    __tablename__ = "menu_versions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    items = Column(JSONB, nullable=False)  # public menu items, in menu order, all fields
+    categories = Column(JSONB, nullable=False)  # public categories, in order
+    item_count = Column(Integer, default=0)
+    published_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    published_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_menu_versions_tenant_version', 'tenant_id', 'version', unique=True),
+    )
+
+
 # Analytics Models
+class AnalyticsDevice(Base):
+    """
+    Deduplicated device dimension: one row per distinct user agent string.
+    Sessions reference it by id instead of repeating the parsed UA text.
+    """
+    __tablename__ = "analytics_devices"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    ua_hash = Column(String(64), unique=True, nullable=False)  # sha256 hex of the user agent
+    user_agent = Column(String(500))
+    device_type = Column(String(50))  # mobile, tablet, desktop
+    browser = Column(String(50))
+    os = Column(String(50))
+    device_brand = Column(String(50))
+    device_model = Column(String(100))
+    device_full_name = Column(String(150))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class AnalyticsSession(Base):
     """
     Tracks individual user sessions on the public menu.
@@ -501,30 +565,39 @@ class AnalyticsSession(Base):
     """
     __tablename__ = "analytics_sessions"
     
-    id = Column(Integer, primary_key=True, index=True)
+    # Partitioned by month on started_at (see analytics_partitions.py), so the
+    # partition key is part of the primary key and session_id cannot be unique
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
-    session_id = Column(String(100), unique=True, nullable=False, index=True)
-    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    session_id = Column(String(100), nullable=False, index=True)
+    started_at = Column(DateTime, primary_key=True, default=datetime.utcnow, nullable=False)
     ended_at = Column(DateTime)
     duration_seconds = Column(Integer)
     ip_address_hash = Column(String(64))  # Hashed for privacy
-    user_agent = Column(String(500))
-    device_type = Column(String(50))  # mobile, tablet, desktop
-    browser = Column(String(50))
-    os = Column(String(50))
+    device_id = Column(Integer, ForeignKey("analytics_devices.id"))  # Parsed user agent
     referrer = Column(String(500))
     language = Column(String(10))
     country = Column(String(2))
     city = Column(String(100))
-    device_brand = Column(String(50))
-    device_model = Column(String(100))
-    device_full_name = Column(String(150))
-    city = Column(String(100))
+    
+    # Dashboard queries filter on tenant and a half-open started_at range;
+    # device_id is included so device breakdowns are index-only scans
+    __table_args__ = (
+        Index('idx_analytics_sessions_tenant_started', 'tenant_id', 'started_at', 'device_id'),
+        {"postgresql_partition_by": "RANGE (started_at)"},
+    )
     
     # Relationships
     tenant = relationship("Tenant")
-    page_views = relationship("AnalyticsPageView", back_populates="session", cascade="all, delete-orphan")
-    item_clicks = relationship("AnalyticsItemClick", back_populates="session", cascade="all, delete-orphan")
+    device = relationship("AnalyticsDevice")
+    page_views = relationship(
+        "AnalyticsPageView", back_populates="session",
+        primaryjoin="AnalyticsSession.session_id == foreign(AnalyticsPageView.session_id)"
+    )
+    item_clicks = relationship(
+        "AnalyticsItemClick", back_populates="session",
+        primaryjoin="AnalyticsSession.session_id == foreign(AnalyticsItemClick.session_id)"
+    )
 
 
 class AnalyticsPageView(Base):
@@ -534,18 +607,28 @@ class AnalyticsPageView(Base):
     """
     __tablename__ = "analytics_page_views"
     
-    id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String(100), ForeignKey("analytics_sessions.session_id"), nullable=False, index=True)
+    # Partitioned by month on timestamp; session_id is a logical reference only
+    # because a partitioned analytics_sessions cannot have a unique session_id
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    session_id = Column(String(100), nullable=False, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
     page_type = Column(String(50))  # menu, category, item_detail
     category_id = Column(Integer, ForeignKey("categories.id"))
     item_id = Column(Integer, ForeignKey("menu_items.id"))
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    timestamp = Column(DateTime, primary_key=True, default=datetime.utcnow, nullable=False, index=True)
     time_on_page_seconds = Column(Integer)
     scroll_depth = Column(Integer)  # Percentage of page scrolled
     
+    __table_args__ = (
+        Index('idx_analytics_page_views_tenant_timestamp', 'tenant_id', 'timestamp'),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+    
     # Relationships
-    session = relationship("AnalyticsSession", back_populates="page_views")
+    session = relationship(
+        "AnalyticsSession", back_populates="page_views",
+        primaryjoin="AnalyticsSession.session_id == foreign(AnalyticsPageView.session_id)"
+    )
     tenant = relationship("Tenant")
     category = relationship("Category")
     item = relationship("MenuItem")
@@ -558,16 +641,25 @@ class AnalyticsItemClick(Base):
     """
     __tablename__ = "analytics_item_clicks"
     
-    id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String(100), ForeignKey("analytics_sessions.session_id"), nullable=False, index=True)
+    # Partitioned by month on timestamp, like analytics_page_views
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    session_id = Column(String(100), nullable=False, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
     item_id = Column(Integer, ForeignKey("menu_items.id"), nullable=False, index=True)
     category_id = Column(Integer, ForeignKey("categories.id"))
     action_type = Column(String(50))  # view_details, share, add_favorite
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    timestamp = Column(DateTime, primary_key=True, default=datetime.utcnow, nullable=False, index=True)
+    
+    __table_args__ = (
+        Index('idx_analytics_item_clicks_tenant_timestamp', 'tenant_id', 'timestamp'),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
     
     # Relationships
-    session = relationship("AnalyticsSession", back_populates="item_clicks")
+    session = relationship(
+        "AnalyticsSession", back_populates="item_clicks",
+        primaryjoin="AnalyticsSession.session_id == foreign(AnalyticsItemClick.session_id)"
+    )
     tenant = relationship("Tenant")
     item = relationship("MenuItem")
     category = relationship("Category")
@@ -592,9 +684,13 @@ class AnalyticsDaily(Base):
     mobile_sessions = Column(Integer, default=0)
     desktop_sessions = Column(Integer, default=0)
     tablet_sessions = Column(Integer, default=0)
-    top_categories = Column(JSONB)  # [{category_id: count}, ...]
-    top_items = Column(JSONB)  # [{item_id: count}, ...]
-    hourly_distribution = Column(JSONB)  # {0: count, 1: count, ..., 23: count}
+    top_categories = Column(JSONB)  # [{"category_id": id, "count": n}, ...] sorted by count
+    top_items = Column(JSONB)  # [{"item_id": id, "count": n}, ...] sorted by count
+    hourly_distribution = Column(JSONB)  # {"0": count, "1": count, ..., "23": count} sessions by start hour
+    visitor_sketch = Column(LargeBinary)  # HyperLogLog of visitor IP hashes, merged for multi-day unique visitors
+    funnel = Column(JSONB)  # {"menu": n, "category": n, "item_click": n} sessions reaching each step in order
+    top_paths = Column(JSONB)  # [{"path": ["menu", "category:4", "item:17"], "count": n}, ...] top session paths
+    upsell_followups = Column(JSONB)  # [{"item_id": id, "count": n}, ...] clicks after upsell exposure
     
     # Unique constraint on tenant_id + date
     __table_args__ = (
@@ -605,6 +701,28 @@ class AnalyticsDaily(Base):
     tenant = relationship("Tenant")
 
 
+class AnalyticsDeviceDaily(Base):
+    """
+    Sessions per device model, tenant and day.
+    Rebuilt by the aggregation job alongside AnalyticsDaily so the device
+    details dashboard never groups raw sessions of past days.
+    """
+    __tablename__ = "analytics_device_daily"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    device_brand = Column(String(50))
+    device_model = Column(String(100))
+    device_full_name = Column(String(150))
+    device_type = Column(String(50))
+    sessions = Column(Integer, default=0)
+    
+    __table_args__ = (
+        Index('idx_analytics_device_daily_tenant_date', 'tenant_id', 'date'),
+    )
+
+
 # FlowIQ Models
 class Flow(Base):
     """
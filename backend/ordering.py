@@ -0,0 +1,203 @@
+"""
+Ordering helpers for MenuIQ
+
+Ordered lists (menu items, sub-items of a multi-item, categories, flow
+steps) keep their order in an integer column with gaps of ORDER_GAP between
+neighbours. Moving a row between two others writes only that row, at the
+midpoint of its new neighbours; when two neighbours have no integer left
+between them the list is renumbered with fresh gaps first. The scheduler's
+ordering_rebalance job renumbers crowded lists in the background so that
+rarely has to happen during a request.
+
+Full reorders sent as a list of positions (drag-and-drop of a whole list)
+are applied with one set-based UPDATE ... FROM (VALUES ...) scoped to the
+tenant, so the number of round trips does not grow with the list.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import Integer, column, func, select, tuple_, update, values
+from sqlalchemy.orm import Session
+
+from models import Category, FlowStep, MenuItem
+from change_capture import mark_tenants_changed
+
+# Distance between neighbours after a renumber, and the smallest distance
+# the background job tolerates before renumbering a list
+ORDER_GAP = 1024
+REBALANCE_MIN_GAP = 8
+
+class OrderedList:
+    """Rows of model ordered by order_column within groups sharing scope columns"""
+
+    def __init__(self, name: str, model, order_column: str, scope: Tuple[str, ...], condition=None):
+        self.name = name
+        self.model = model
+        self.order_column = order_column
+        self.scope = scope
+        self.condition = condition
+
+    @property
+    def column(self):
+        return getattr(self.model, self.order_column)
+
+    def filters(self, row) -> List:
+        """Filters selecting the list row belongs to"""
+        filters = [getattr(self.model, name) == getattr(row, name) for name in self.scope]
+        if self.condition is not None:
+            filters.append(self.condition)
+        return filters
+
+MENU_ITEMS = OrderedList("menu_items", MenuItem, "sort_order", ("tenant_id",), MenuItem.parent_item_id.is_(None))
+SUB_ITEMS = OrderedList("sub_items", MenuItem, "sub_item_order", ("parent_item_id",), MenuItem.parent_item_id.isnot(None))
+CATEGORIES = OrderedList("categories", Category, "sort_order", ("tenant_id",))
+FLOW_STEPS = OrderedList("flow_steps", FlowStep, "order_position", ("flow_id",))
+
+ORDERED_LISTS = (MENU_ITEMS, SUB_ITEMS, CATEGORIES, FLOW_STEPS)
+
+def apply_sort_orders(db: Session, model, tenant_id: int, orders: Iterable[Dict],
+                      order_column: str = "sort_order") -> int:
+    """
+    Set order_column of model rows from [{"id": ..., order_column: ...}, ...]
+    in one statement. Rows of other tenants are ignored.
+
+    Returns the number of rows updated; the caller commits.
+    """
+    rows = {}
+    for entry in orders:
+        rows[int(entry["id"])] = int(entry[order_column])
+    if not rows:
+        return 0
+
+    new_orders = values(
+        column("id", Integer), column("position", Integer), name="new_orders"
+    ).data(list(rows.items()))
+
+    target = getattr(model, order_column)
+    result = db.execute(
+        update(model)
+        .where(
+            model.id == new_orders.c.id,
+            model.tenant_id == tenant_id,
+            target.is_distinct_from(new_orders.c.position)
+        )
+        .values({target: new_orders.c.position})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        mark_tenants_changed(db, [tenant_id])
+    return result.rowcount
+
+def next_position(db: Session, ordered: OrderedList, row) -> int:
+    """Position that appends a new row to the end of the list row would belong to"""
+    last = db.query(func.max(ordered.column)).filter(*ordered.filters(row)).scalar()
+    return (last or 0) + ORDER_GAP
+
+def _renumber(db: Session, ordered: OrderedList, filters: List) -> int:
+    """Renumber the rows matching filters with ORDER_GAP spacing, keeping their order"""
+    model, col = ordered.model, ordered.column
+    partition = [getattr(model, name) for name in ordered.scope]
+    ranked = select(
+        model.id.label("id"),
+        (func.row_number().over(partition_by=partition, order_by=(col, model.id)) * ORDER_GAP).label("position")
+    ).where(*filters).subquery()
+
+    result = db.execute(
+        update(model)
+        .where(model.id == ranked.c.id, col.is_distinct_from(ranked.c.position))
+        .values({col: ranked.c.position})
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+def rebalance(db: Session, ordered: OrderedList, row) -> int:
+    """Renumber the list row belongs to"""
+    return _renumber(db, ordered, ordered.filters(row))
+
+def rebalance_crowded(db: Session, min_gap: int = REBALANCE_MIN_GAP) -> Dict[str, int]:
+    """
+    Renumber every list that has neighbours closer than min_gap (or
+    duplicate/missing positions). One statement per kind of list; commits.
+    """
+    renumbered = {}
+    for ordered in ORDERED_LISTS:
+        model, col = ordered.model, ordered.column
+        partition = [getattr(model, name) for name in ordered.scope]
+        conditions = [ordered.condition] if ordered.condition is not None else []
+
+        gaps = select(
+            *partition,
+            col.label("position"),
+            (col - func.lag(col).over(partition_by=partition, order_by=(col, model.id))).label("gap")
+        ).where(*conditions).subquery()
+        scope_columns = [gaps.c[name] for name in ordered.scope]
+        crowded = select(*scope_columns).where(
+            (gaps.c.gap < min_gap) | gaps.c.position.is_(None)
+        ).distinct()
+
+        renumbered[ordered.name] = _renumber(db, ordered, conditions + [tuple_(*partition).in_(crowded)])
+
+    db.commit()
+    return renumbered
+
+def _position(db: Session, ordered: OrderedList, row, neighbour_id: int) -> Optional[int]:
+    """Position of a neighbour, which must be in the same list; raises ValueError otherwise"""
+    model = ordered.model
+    neighbour = db.query(model.id, ordered.column).filter(
+        model.id == neighbour_id, *ordered.filters(row)
+    ).first()
+    if neighbour is None or neighbour_id == row.id:
+        raise ValueError(f"{neighbour_id} is not another row of the same list")
+    return neighbour[1]
+
+def _bounds(db: Session, ordered: OrderedList, row, before_id: Optional[int],
+            after_id: Optional[int]) -> Tuple[Optional[int], Optional[int], bool]:
+    """(low, high, known) positions the moved row must fall strictly between"""
+    model, col = ordered.model, ordered.column
+    others = [model.id != row.id, col.isnot(None), *ordered.filters(row)]
+
+    low = high = None
+    if after_id is not None:
+        low = _position(db, ordered, row, after_id)
+        if low is None:
+            return None, None, False
+    if before_id is not None:
+        high = _position(db, ordered, row, before_id)
+        if high is None:
+            return None, None, False
+
+    if after_id is not None and before_id is None:
+        # Row right after the anchor in (position, id) order
+        following = db.query(col).filter(
+            *others, tuple_(col, model.id) > tuple_(low, after_id)
+        ).order_by(col, model.id).first()
+        high = following[0] if following else low + 2 * ORDER_GAP
+    elif before_id is not None and after_id is None:
+        preceding = db.query(col).filter(
+            *others, tuple_(col, model.id) < tuple_(high, before_id)
+        ).order_by(col.desc(), model.id.desc()).first()
+        low = preceding[0] if preceding else high - 2 * ORDER_GAP
+
+    return low, high, True
+
+def move(db: Session, ordered: OrderedList, row, before_id: Optional[int] = None,
+         after_id: Optional[int] = None) -> int:
+    """
+    Place row right after after_id and/or right before before_id, writing only
+    row unless the neighbours leave no room. Returns the new position; the
+    caller commits. Raises ValueError for invalid neighbours.
+    """
+    if before_id is None and after_id is None:
+        raise ValueError("before_id or after_id is required")
+
+    low, high, known = _bounds(db, ordered, row, before_id, after_id)
+    if not known or high - low < 2:
+        if known and high < low:
+            raise ValueError("after_id must come before before_id")
+        # No integer left between the neighbours: spread the list out, then retry
+        rebalance(db, ordered, row)
+        low, high, known = _bounds(db, ordered, row, before_id, after_id)
+        if not known or high - low < 2:
+            raise ValueError("after_id must come before before_id")
+
+    position = (low + high) // 2
+    setattr(row, ordered.order_column, position)
+    return position
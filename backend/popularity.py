@@ -0,0 +1,79 @@
+"""
+Item Popularity Ranking for MenuIQ
+
+Maintains MenuItem.best_seller_rank from real interest: each item's score is
+its daily click counts (analytics_daily.top_items) over the last
+POPULARITY_WINDOW_DAYS, each day weighted by 0.5 ^ (age / half-life), so
+recent clicks count more and last month's favourite fades out. Items are
+ranked per tenant (1 = most popular); items without clicks in the window
+get no rank and sort last.
+
+Scores and ranks are computed and written by a single UPDATE, only touching
+items whose rank changes; the scheduler runs it periodically (see
+scheduler.py) and tenant menus sorted by popularity read the
+(tenant_id, best_seller_rank) index.
+"""
+import os
+from datetime import date, timedelta
+from typing import List
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from change_capture import mark_tenants_changed
+
+# Days of clicks considered and the age at which a day's clicks weigh half
+POPULARITY_WINDOW_DAYS = int(os.getenv("POPULARITY_WINDOW_DAYS", "30"))
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv("POPULARITY_HALF_LIFE_DAYS", "7"))
+
+UPDATE_RANKS_SQL = """
+    WITH scores AS (
+        SELECT daily.tenant_id,
+               CAST(clicks.entry ->> 'item_id' AS INTEGER) AS item_id,
+               sum(CAST(clicks.entry ->> 'count' AS INTEGER)
+                   * power(0.5, (:today - daily.date) / :half_life)) AS score
+        FROM analytics_daily daily
+        CROSS JOIN LATERAL jsonb_array_elements(daily.top_items) AS clicks(entry)
+        WHERE daily.date >= :since AND daily.date < :today
+        GROUP BY daily.tenant_id, CAST(clicks.entry ->> 'item_id' AS INTEGER)
+    ),
+    ranked AS (
+        SELECT menu_items.id AS item_id,
+               CAST(rank() OVER (
+                   PARTITION BY menu_items.tenant_id ORDER BY scores.score DESC
+               ) AS INTEGER) AS best_seller_rank
+        FROM scores
+        JOIN menu_items
+          ON menu_items.id = scores.item_id AND menu_items.tenant_id = scores.tenant_id
+    ),
+    touched AS (
+        SELECT item_id AS id FROM ranked
+        UNION
+        SELECT id FROM menu_items WHERE best_seller_rank IS NOT NULL
+    )
+    UPDATE menu_items
+    SET best_seller_rank = ranked.best_seller_rank
+    FROM touched
+    LEFT JOIN ranked ON ranked.item_id = touched.id
+    WHERE menu_items.id = touched.id
+      AND menu_items.best_seller_rank IS DISTINCT FROM ranked.best_seller_rank
+    RETURNING menu_items.tenant_id
+"""
+
+def update_best_seller_ranks(db: Session, today: date = None) -> List[int]:
+    """
+    Recompute best_seller_rank for all tenants in one statement.
+    Returns the ids of tenants whose ranks changed.
+    """
+    today = today or date.today()
+    changed = db.execute(text(UPDATE_RANKS_SQL), {
+        "today": today,
+        "since": today - timedelta(days=POPULARITY_WINDOW_DAYS),
+        "half_life": POPULARITY_HALF_LIFE_DAYS
+    }).scalars().all()
+
+    # Menu payloads are cached whole; drop them once per changed tenant on commit
+    tenant_ids = sorted(set(changed))
+    mark_tenants_changed(db, tenant_ids)
+    db.commit()
+
+    return tenant_ids
@@ -4,10 +4,16 @@ Public menu routes that return data in the exact format expected by the frontend
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
 from database import get_db
 from models import Tenant, MenuItem, Category, Settings, AllergenIcon
 from simple_cache import cache, cached, CACHE_TTL
+from menu_publishing import published_menu
+from time_windows import (
+    WINDOWS_KEY, item_windows, next_transition, resolve_items, schedule_rebuild,
+    tenant_timezone, ttl_until
+)
 
 router = APIRouter(prefix="/api/public", tags=["public-menu"])
 
@@ -25,6 +31,310 @@ def get_tenant_by_subdomain(db: Session, subdomain: str) -> Tenant:
     
     return tenant
 
+def public_currency(db: Session, tenant_id: int) -> str:
+    """Currency prices are displayed in"""
+    currency = db.query(Settings.currency).filter(Settings.tenant_id == tenant_id).scalar()
+    return currency or "SAR"
+
+# Price fields of serialized items, formatted with the currency when served
+PRICE_FIELDS = ("price", "priceWithoutVat", "promotionPrice", "price_min", "price_max")
+
+def _amount(value) -> Optional[float]:
+    return float(value) if value else None
+
+def format_prices(items: List[dict], currency: str) -> List[dict]:
+    """Serialized items with their prices formatted as "12.00 SAR" (done per request, never stored)"""
+    formatted = []
+    for item_data in items:
+        current = dict(item_data)
+        for field in PRICE_FIELDS:
+            # Snapshots published before prices were stored as numbers hold strings
+            if isinstance(current.get(field), (int, float)):
+                current[field] = f"{current[field]:.2f} {currency}"
+        if current.get("sub_items"):
+            current["sub_items"] = format_prices(current["sub_items"], currency)
+        formatted.append(current)
+    return formatted
+
+def public_items_query(db: Session, tenant_id: int):
+    """Available top-level items (sub-items are listed under their multi-item), in menu order"""
+    return db.query(MenuItem).filter(
+        MenuItem.tenant_id == tenant_id,
+        MenuItem.is_available == True,
+        MenuItem.parent_item_id == None  # Only get top-level items
+    ).options(
+        joinedload(MenuItem.sub_items),
+        joinedload(MenuItem.allergens),
+        joinedload(MenuItem.category)
+    ).order_by(MenuItem.sort_order, MenuItem.id)
+
+def build_public_categories(db: Session, tenant_id: int) -> List[dict]:
+    """Active categories in frontend format"""
+    categories = db.query(Category).filter(
+        Category.tenant_id == tenant_id,
+        Category.is_active == True
+    ).order_by(Category.sort_order, Category.id).all()
+    
+    return [
+        {
+            "id": cat.id,
+            "value": cat.value or f"category_{cat.id}",
+            "label": cat.label or cat.name,
+            "labelAr": cat.label_ar or cat.name,
+            "sortOrder": cat.sort_order
+        }
+        for cat in categories
+    ]
+
+def project_public_item(item_data: dict, requested_fields: Optional[Set[str]]) -> dict:
+    """A fully serialized item limited to requested_fields, as serialize_public_item would return it"""
+    if requested_fields is None:
+        return item_data
+    
+    projected = {
+        field: value for field, value in item_data.items()
+        if field == "id" or (field in requested_fields and field != "sub_items")
+    }
+    if "sub_items" in item_data:
+        projected["sub_items"] = item_data["sub_items"] if "sub_items" in requested_fields else []
+    return projected
+
+def serialize_public_item(item: MenuItem, requested_fields: Optional[Set[str]] = None) -> dict:
+    """
+    A top-level menu item (with sub-items) in frontend format, limited to
+    requested_fields. Prices are numbers; format_prices adds the currency.
+    """
+    # Get category value
+    category_value = None
+    if item.category:
+        category_value = item.category.value or f"category_{item.category_id}"
+    
+    # Get allergens with full details
+    allergen_data = [{
+        "id": allergen.id,
+        "name": allergen.name,
+        "display_name": allergen.display_name,
+        "display_name_ar": allergen.display_name_ar,
+        "icon_url": allergen.icon_url
+    } for allergen in item.allergens]
+    
+    # Format item for frontend - build dynamically based on requested fields
+    item_data = {"id": item.id}  # Always include ID
+    
+    # Helper function to add field if requested
+    def add_field(field_name, value):
+        if requested_fields is None or field_name in requested_fields:
+            item_data[field_name] = value
+    
+    # Basic fields
+    add_field("name", item.name)
+    add_field("nameAr", item.name_ar)
+    add_field("description", item.description)
+    add_field("descriptionAr", item.description_ar)
+    add_field("category", category_value)
+    add_field("categoryId", item.category_id)
+    add_field("image", item.image)
+    add_field("price", _amount(item.price))
+    add_field("priceWithoutVat", _amount(item.price_without_vat))
+    add_field("promotionPrice", _amount(item.promotion_price))
+    
+    # Feature flags
+    add_field("signatureDish", item.signature_dish)
+    add_field("instagramWorthy", item.instagram_worthy)
+    add_field("isFeatured", item.is_featured)
+    
+    # Basic nutrition
+    add_field("calories", item.calories)
+    add_field("preparationTime", item.preparation_time)
+    add_field("servingSize", item.serving_size)
+    
+    # Dietary restrictions
+    add_field("halal", item.halal)
+    add_field("vegetarian", item.vegetarian)
+    add_field("vegan", item.vegan)
+    add_field("glutenFree", item.gluten_free)
+    add_field("dairyFree", item.dairy_free)
+    add_field("nutFree", item.nut_free)
+    add_field("spicyLevel", item.spicy_level)
+    add_field("highSodium", item.high_sodium)
+    add_field("containsCaffeine", item.contains_caffeine)
+    add_field("organic", item.organic_certified)
+    
+    # Exercise info
+    add_field("walkMinutes", item.walk_minutes)
+    add_field("runMinutes", item.run_minutes)
+    
+    # Allergens
+    add_field("allergens", allergen_data)
+    
+    # Detailed nutrition info
+    add_field("totalFat", float(item.total_fat) if item.total_fat else None)
+    add_field("saturatedFat", float(item.saturated_fat) if item.saturated_fat else None)
+    add_field("transFat", float(item.trans_fat) if item.trans_fat else None)
+    add_field("cholesterol", item.cholesterol)
+    add_field("sodium", item.sodium)
+    add_field("totalCarbs", float(item.total_carbs) if item.total_carbs else None)
+    add_field("dietaryFiber", float(item.dietary_fiber) if item.dietary_fiber else None)
+    add_field("sugars", float(item.sugars) if item.sugars else None)
+    add_field("protein", float(item.protein) if item.protein else None)
+    add_field("vitaminA", item.vitamin_a)
+    add_field("vitaminC", item.vitamin_c)
+    add_field("vitaminD", item.vitamin_d)
+    add_field("calcium", item.calcium)
+    add_field("iron", item.iron)
+    add_field("caffeineMg", item.caffeine_mg)
+    
+    # Upsell fields
+    add_field("is_upsell", item.is_upsell)
+    add_field("upsell_style", item.upsell_style)
+    add_field("upsell_border_color", item.upsell_border_color)
+    add_field("upsell_background_color", item.upsell_background_color)
+    add_field("upsell_badge_text", item.upsell_badge_text)
+    add_field("upsell_badge_color", item.upsell_badge_color)
+    add_field("upsell_animation", item.upsell_animation)
+    add_field("upsell_icon", item.upsell_icon)
+    
+    # Multi-item fields
+    add_field("is_multi_item", item.is_multi_item)
+    add_field("price_min", _amount(item.price_min))
+    add_field("price_max", _amount(item.price_max))
+    add_field("display_as_grid", item.display_as_grid)
+    
+    # Sub-items (only if requested)
+    if (requested_fields is None or "sub_items" in requested_fields) and item.is_multi_item:
+        sub_items = []
+        for sub in sorted(item.sub_items, key=lambda x: x.sub_item_order):
+            # Get allergens for sub-item
+            sub_allergen_data = [{
+                "id": allergen.id,
+                "name": allergen.name,
+                "display_name": allergen.display_name,
+                "display_name_ar": allergen.display_name_ar,
+                "icon_url": allergen.icon_url
+            } for allergen in sub.allergens]
+            
+            # Sub-item inherits parent category if it doesn't have one
+            sub_category = category_value  # Use parent's category
+            
+            sub_item_data = {
+                "id": sub.id,
+                "name": sub.name,
+                "nameAr": sub.name_ar,
+                "description": sub.description,
+                "descriptionAr": sub.description_ar,
+                "category": sub_category,  # Inherit parent category
+                "categoryId": item.category_id,  # Inherit parent category ID
+                "price": _amount(sub.price),
+                "priceWithoutVat": _amount(sub.price_without_vat),
+                "promotionPrice": _amount(sub.promotion_price),
+                "image": sub.image,
+                
+                # All nutrition fields
+                "calories": sub.calories,
+                "preparationTime": sub.preparation_time,
+                "servingSize": sub.serving_size,
+                "totalFat": float(sub.total_fat) if sub.total_fat else None,
+                "saturatedFat": float(sub.saturated_fat) if sub.saturated_fat else None,
+                "transFat": float(sub.trans_fat) if sub.trans_fat else None,
+                "cholesterol": sub.cholesterol,
+                "sodium": sub.sodium,
+                "totalCarbs": float(sub.total_carbs) if sub.total_carbs else None,
+                "dietaryFiber": float(sub.dietary_fiber) if sub.dietary_fiber else None,
+                "sugars": float(sub.sugars) if sub.sugars else None,
+                "protein": float(sub.protein) if sub.protein else None,
+                "vitaminA": sub.vitamin_a,
+                "vitaminC": sub.vitamin_c,
+                "vitaminD": sub.vitamin_d,
+                "calcium": sub.calcium,
+                "iron": sub.iron,
+                "caffeineMg": sub.caffeine_mg,
+                
+                # Exercise info
+                "walkMinutes": sub.walk_minutes,
+                "runMinutes": sub.run_minutes,
+                
+                # Dietary flags
+                "halal": sub.halal,
+                "vegetarian": sub.vegetarian,
+                "vegan": sub.vegan,
+                "glutenFree": sub.gluten_free,
+                "dairyFree": sub.dairy_free,
+                "nutFree": sub.nut_free,
+                "spicyLevel": sub.spicy_level,
+                "highSodium": sub.high_sodium,
+                "containsCaffeine": sub.contains_caffeine,
+                "organic": sub.organic_certified,
+                
+                # Feature flags
+                "signatureDish": sub.signature_dish,
+                "limitedAvailability": sub.limited_availability,
+                
+                # Allergens with full details
+                "allergens": sub_allergen_data,
+                
+                # Additional fields
+                "ingredients": sub.ingredients,
+                "chefNotes": sub.chef_notes,
+                "pairingSuggestions": sub.pairing_suggestions,
+                
+                # Upsell fields for sub-items
+                "is_upsell": sub.is_upsell,
+                "upsell_style": sub.upsell_style,
+                "upsell_border_color": sub.upsell_border_color,
+                "upsell_background_color": sub.upsell_background_color,
+                "upsell_badge_text": sub.upsell_badge_text,
+                "upsell_badge_color": sub.upsell_badge_color,
+                "upsell_animation": sub.upsell_animation,
+                "upsell_icon": sub.upsell_icon,
+                
+                # Order
+                "sub_item_order": sub.sub_item_order
+            }
+            sub_windows = item_windows(sub)
+            if sub_windows:
+                sub_item_data[WINDOWS_KEY] = sub_windows
+            sub_items.append(sub_item_data)
+        
+        item_data["sub_items"] = sub_items
+    elif item.is_multi_item:
+        item_data["sub_items"] = []
+    
+    # Promotion, season and meal windows, resolved when served (time_windows.py)
+    windows = item_windows(item)
+    if windows:
+        item_data[WINDOWS_KEY] = windows
+    
+    return item_data
+
+def current_public_items(db: Session, tenant: Tenant) -> Tuple[List[dict], Optional[datetime]]:
+    """
+    Items guests see right now (from the published snapshot or the live menu)
+    and the instant that next changes; cached until then
+    """
+    cache_key = f"public_menu:subdomain:{tenant.subdomain}:current"
+    cached_data = cache.get(cache_key)
+    if cached_data is not None:
+        return cached_data["items"], cached_data["transition"]
+    
+    # Published tenants serve their menu snapshot, not the draft being edited
+    snapshot = published_menu(db, tenant)
+    if snapshot is not None:
+        items = snapshot["items"]
+    else:
+        items = [serialize_public_item(item) for item in public_items_query(db, tenant.id).all()]
+    
+    now = datetime.now(tenant_timezone(db, tenant.id))
+    transition = next_transition(items, now)
+    # Currency comes from the live settings, also for published snapshots
+    current = format_prices(resolve_items(items, now), public_currency(db, tenant.id))
+    
+    # The scheduler rebuilds this at the transition; entries expire then anyway
+    schedule_rebuild(tenant.subdomain, transition)
+    ttl = ttl_until(transition, CACHE_TTL["public_menu"])
+    if ttl > 0:
+        cache.set(cache_key, {"items": current, "transition": transition}, ttl)
+    return current, transition
+
 @router.get("/{subdomain}/menu-items")
 async def get_public_menu_items(
     subdomain: str,
@@ -45,253 +355,26 @@ async def get_public_menu_items(
     
     tenant = get_tenant_by_subdomain(db, subdomain)
     
-    # Get settings for currency
-    settings = db.query(Settings).filter(
-        Settings.tenant_id == tenant.id
-    ).first()
-    
-    currency = settings.currency if settings else "SAR"
-    
     # Parse requested fields
     requested_fields = set(fields.split(',')) if fields else None
     
-    # Define field groups for common use cases
-    basic_fields = {'id', 'name', 'nameAr', 'price', 'image', 'category', 'categoryId'}
-    nutritional_fields = {
-        'calories', 'totalFat', 'saturatedFat', 'transFat', 'cholesterol', 
-        'sodium', 'totalCarbs', 'dietaryFiber', 'sugars', 'protein',
-        'vitaminA', 'vitaminC', 'vitaminD', 'calcium', 'iron', 'caffeineMg'
-    }
-    dietary_fields = {
-        'halal', 'vegetarian', 'vegan', 'glutenFree', 'dairyFree', 
-        'nutFree', 'spicyLevel', 'highSodium', 'containsCaffeine'
-    }
-    
-    # Get total count for pagination
-    total_count = db.query(func.count(MenuItem.id)).filter(
-        MenuItem.tenant_id == tenant.id,
-        MenuItem.is_available == True,
-        MenuItem.parent_item_id == None
-    ).scalar()
-    
-    # Get all active menu items (exclude sub-items from main list)
-    items = db.query(MenuItem).filter(
-        MenuItem.tenant_id == tenant.id,
-        MenuItem.is_available == True,
-        MenuItem.parent_item_id == None  # Only get top-level items
-    ).options(
-        joinedload(MenuItem.sub_items),
-        joinedload(MenuItem.allergens),
-        joinedload(MenuItem.category)
-    ).order_by(MenuItem.sort_order, MenuItem.id).offset(skip).limit(limit).all()
-    
-    # Convert to frontend format
-    result = []
-    for item in items:
-        # Get category value
-        category_value = None
-        if item.category:
-            category_value = item.category.value or f"category_{item.category_id}"
-        
-        # Get allergens with full details
-        allergen_data = [{
-            "id": allergen.id,
-            "name": allergen.name,
-            "display_name": allergen.display_name,
-            "display_name_ar": allergen.display_name_ar,
-            "icon_url": allergen.icon_url
-        } for allergen in item.allergens]
-        
-        # Format item for frontend - build dynamically based on requested fields
-        item_data = {"id": item.id}  # Always include ID
-        
-        # Helper function to add field if requested
-        def add_field(field_name, value):
-            if requested_fields is None or field_name in requested_fields:
-                item_data[field_name] = value
-        
-        # Basic fields
-        add_field("name", item.name)
-        add_field("nameAr", item.name_ar)
-        add_field("description", item.description)
-        add_field("descriptionAr", item.description_ar)
-        add_field("category", category_value)
-        add_field("categoryId", item.category_id)
-        add_field("image", item.image)
-        add_field("price", f"{item.price:.2f} {currency}" if item.price else None)
-        add_field("priceWithoutVat", f"{item.price_without_vat:.2f} {currency}" if item.price_without_vat else None)
-        add_field("promotionPrice", f"{item.promotion_price:.2f} {currency}" if item.promotion_price else None)
-        
-        # Feature flags
-        add_field("signatureDish", item.signature_dish)
-        add_field("instagramWorthy", item.instagram_worthy)
-        add_field("isFeatured", item.is_featured)
-        
-        # Basic nutrition
-        add_field("calories", item.calories)
-        add_field("preparationTime", item.preparation_time)
-        add_field("servingSize", item.serving_size)
-        
-        # Dietary restrictions
-        add_field("halal", item.halal)
-        add_field("vegetarian", item.vegetarian)
-        add_field("vegan", item.vegan)
-        add_field("glutenFree", item.gluten_free)
-        add_field("dairyFree", item.dairy_free)
-        add_field("nutFree", item.nut_free)
-        add_field("spicyLevel", item.spicy_level)
-        add_field("highSodium", item.high_sodium)
-        add_field("containsCaffeine", item.contains_caffeine)
-        add_field("organic", item.organic_certified)
-        
-        # Exercise info
-        add_field("walkMinutes", item.walk_minutes)
-        add_field("runMinutes", item.run_minutes)
-        
-        # Allergens
-        add_field("allergens", allergen_data)
-        
-        # Detailed nutrition info
-        add_field("totalFat", float(item.total_fat) if item.total_fat else None)
-        add_field("saturatedFat", float(item.saturated_fat) if item.saturated_fat else None)
-        add_field("transFat", float(item.trans_fat) if item.trans_fat else None)
-        add_field("cholesterol", item.cholesterol)
-        add_field("sodium", item.sodium)
-        add_field("totalCarbs", float(item.total_carbs) if item.total_carbs else None)
-        add_field("dietaryFiber", float(item.dietary_fiber) if item.dietary_fiber else None)
-        add_field("sugars", float(item.sugars) if item.sugars else None)
-        add_field("protein", float(item.protein) if item.protein else None)
-        add_field("vitaminA", item.vitamin_a)
-        add_field("vitaminC", item.vitamin_c)
-        add_field("vitaminD", item.vitamin_d)
-        add_field("calcium", item.calcium)
-        add_field("iron", item.iron)
-        add_field("caffeineMg", item.caffeine_mg)
-        
-        # Upsell fields
-        add_field("is_upsell", item.is_upsell)
-        add_field("upsell_style", item.upsell_style)
-        add_field("upsell_border_color", item.upsell_border_color)
-        add_field("upsell_background_color", item.upsell_background_color)
-        add_field("upsell_badge_text", item.upsell_badge_text)
-        add_field("upsell_badge_color", item.upsell_badge_color)
-        add_field("upsell_animation", item.upsell_animation)
-        add_field("upsell_icon", item.upsell_icon)
-        
-        # Multi-item fields
-        add_field("is_multi_item", item.is_multi_item)
-        add_field("price_min", f"{item.price_min:.2f} {currency}" if item.price_min else None)
-        add_field("price_max", f"{item.price_max:.2f} {currency}" if item.price_max else None)
-        add_field("display_as_grid", item.display_as_grid)
-        
-        # Sub-items (only if requested)
-        if (requested_fields is None or "sub_items" in requested_fields) and item.is_multi_item:
-            sub_items = []
-            for sub in sorted(item.sub_items, key=lambda x: x.sub_item_order):
-                # Get allergens for sub-item
-                sub_allergen_data = [{
-                    "id": allergen.id,
-                    "name": allergen.name,
-                    "display_name": allergen.display_name,
-                    "display_name_ar": allergen.display_name_ar,
-                    "icon_url": allergen.icon_url
-                } for allergen in sub.allergens]
-                
-                # Sub-item inherits parent category if it doesn't have one
-                sub_category = category_value  # Use parent's category
-                
-                sub_item_data = {
-                    "id": sub.id,
-                    "name": sub.name,
-                    "nameAr": sub.name_ar,
-                    "description": sub.description,
-                    "descriptionAr": sub.description_ar,
-                    "category": sub_category,  # Inherit parent category
-                    "categoryId": item.category_id,  # Inherit parent category ID
-                    "price": f"{sub.price:.2f} {currency}" if sub.price else None,
-                    "priceWithoutVat": f"{sub.price_without_vat:.2f} {currency}" if sub.price_without_vat else None,
-                    "promotionPrice": f"{sub.promotion_price:.2f} {currency}" if sub.promotion_price else None,
-                    "image": sub.image,
-                    
-                    # All nutrition fields
-                    "calories": sub.calories,
-                    "preparationTime": sub.preparation_time,
-                    "servingSize": sub.serving_size,
-                    "totalFat": float(sub.total_fat) if sub.total_fat else None,
-                    "saturatedFat": float(sub.saturated_fat) if sub.saturated_fat else None,
-                    "transFat": float(sub.trans_fat) if sub.trans_fat else None,
-                    "cholesterol": sub.cholesterol,
-                    "sodium": sub.sodium,
-                    "totalCarbs": float(sub.total_carbs) if sub.total_carbs else None,
-                    "dietaryFiber": float(sub.dietary_fiber) if sub.dietary_fiber else None,
-                    "sugars": float(sub.sugars) if sub.sugars else None,
-                    "protein": float(sub.protein) if sub.protein else None,
-                    "vitaminA": sub.vitamin_a,
-                    "vitaminC": sub.vitamin_c,
-                    "vitaminD": sub.vitamin_d,
-                    "calcium": sub.calcium,
-                    "iron": sub.iron,
-                    "caffeineMg": sub.caffeine_mg,
-                    
-                    # Exercise info
-                    "walkMinutes": sub.walk_minutes,
-                    "runMinutes": sub.run_minutes,
-                    
-                    # Dietary flags
-                    "halal": sub.halal,
-                    "vegetarian": sub.vegetarian,
-                    "vegan": sub.vegan,
-                    "glutenFree": sub.gluten_free,
-                    "dairyFree": sub.dairy_free,
-                    "nutFree": sub.nut_free,
-                    "spicyLevel": sub.spicy_level,
-                    "highSodium": sub.high_sodium,
-                    "containsCaffeine": sub.contains_caffeine,
-                    "organic": sub.organic_certified,
-                    
-                    # Feature flags
-                    "signatureDish": sub.signature_dish,
-                    "limitedAvailability": sub.limited_availability,
-                    
-                    # Allergens with full details
-                    "allergens": sub_allergen_data,
-                    
-                    # Additional fields
-                    "ingredients": sub.ingredients,
-                    "chefNotes": sub.chef_notes,
-                    "pairingSuggestions": sub.pairing_suggestions,
-                    
-                    # Upsell fields for sub-items
-                    "is_upsell": sub.is_upsell,
-                    "upsell_style": sub.upsell_style,
-                    "upsell_border_color": sub.upsell_border_color,
-                    "upsell_background_color": sub.upsell_background_color,
-                    "upsell_badge_text": sub.upsell_badge_text,
-                    "upsell_badge_color": sub.upsell_badge_color,
-                    "upsell_animation": sub.upsell_animation,
-                    "upsell_icon": sub.upsell_icon,
-                    
-                    # Order
-                    "sub_item_order": sub.sub_item_order
-                }
-                sub_items.append(sub_item_data)
-            
-            item_data["sub_items"] = sub_items
-        elif item.is_multi_item:
-            item_data["sub_items"] = []
-        
-        result.append(item_data)
+    items, transition = current_public_items(db, tenant)
     
     # Prepare response with pagination info
     response = {
-        "items": result,
-        "total": total_count,
+        "items": [
+            project_public_item(item_data, requested_fields)
+            for item_data in items[skip:skip + limit]
+        ],
+        "total": len(items),
         "skip": skip,
         "limit": limit
     }
     
-    # Cache the result
-    cache.set(cache_key, response, CACHE_TTL["public_menu"])
+    # Cache the result until the menu next changes
+    ttl = ttl_until(transition, CACHE_TTL["public_menu"])
+    if ttl > 0:
+        cache.set(cache_key, response, ttl)
     
     return response
 
@@ -309,23 +392,8 @@ async def get_public_categories(
     
     tenant = get_tenant_by_subdomain(db, subdomain)
     
-    # Get all active categories
-    categories = db.query(Category).filter(
-        Category.tenant_id == tenant.id,
-        Category.is_active == True
-    ).order_by(Category.sort_order, Category.id).all()
-    
-    # Convert to frontend format
-    result = []
-    for cat in categories:
-        cat_data = {
-            "id": cat.id,
-            "value": cat.value or f"category_{cat.id}",
-            "label": cat.label or cat.name,
-            "labelAr": cat.label_ar or cat.name,
-            "sortOrder": cat.sort_order
-        }
-        result.append(cat_data)
+    snapshot = published_menu(db, tenant)
+    result = snapshot["categories"] if snapshot is not None else build_public_categories(db, tenant.id)
     
     # Cache the result
     cache.set(cache_key, result, CACHE_TTL["categories"])
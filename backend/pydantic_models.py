@@ -411,6 +411,10 @@ class FlowStepUpdate(BaseModel):
     option3: Optional[FlowStepOptionCreate] = None
     option4: Optional[FlowStepOptionCreate] = None
 
+class FlowStepMove(BaseModel):
+    before_id: Optional[int] = None
+    after_id: Optional[int] = None
+
 class FlowStepResponse(BaseModel):
     id: int
     flow_id: int
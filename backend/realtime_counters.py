@@ -0,0 +1,313 @@
+"""
+Real-time Analytics Counters for MenuIQ
+
+Keeps today's analytics totals per tenant (sessions, unique visitors, page
+views, item clicks, device split, hourly buckets and per-item clicks) as
+counters that the tracking endpoints increment, so the dashboard "today"
+tiles are read in O(1) instead of aggregating the raw tables.
+
+Counters live in process memory by default, where a worker only sees its own
+increments until it re-seeds, so in-memory counters are re-seeded every
+ANALYTICS_COUNTERS_MEMORY_RECONCILE_SECONDS (a few seconds) to pick up the
+events other workers recorded. Set ANALYTICS_COUNTERS_REDIS_URL to share them
+between several workers through Redis instead.
+
+The raw tables stay the source of truth: a tenant's counters are seeded from
+the database the first time they are read each day and re-seeded every
+ANALYTICS_COUNTERS_RECONCILE_SECONDS (Redis), which also corrects any drift (events
+recorded by another process, a restart, ...). A seed rebases the counters on
+the database totals and keeps the increments made while the database was
+being read, so those events are neither lost nor counted twice; of two
+concurrent seeds of a key only the first is applied. Counters of previous
+days are discarded at rollover; those days are served from analytics_daily.
+"""
+import os
+import time
+import threading
+import logging
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import func, Integer, cast
+from sqlalchemy.orm import Session
+
+from models import AnalyticsSession, AnalyticsItemClick
+
+logger = logging.getLogger(__name__)
+
+# Seconds after which a tenant's counters are re-seeded from the database
+RECONCILE_SECONDS = int(os.getenv("ANALYTICS_COUNTERS_RECONCILE_SECONDS", "600"))
+
+# Same for in-memory counters, which miss other workers' increments until re-seeded
+MEMORY_RECONCILE_SECONDS = int(os.getenv("ANALYTICS_COUNTERS_MEMORY_RECONCILE_SECONDS", "5"))
+
+# Optional Redis backend shared by all workers
+REDIS_URL = os.getenv("ANALYTICS_COUNTERS_REDIS_URL", "")
+
+DEVICE_TYPES = ("mobile", "desktop", "tablet")
+
+class MemoryCounterStore:
+    """Counters kept in this process"""
+
+    reconcile_seconds = MEMORY_RECONCILE_SECONDS
+
+    def __init__(self):
+        self.counters: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+
+    def is_loaded(self, key: str) -> Optional[float]:
+        """Time the key was last seeded, None if it never was"""
+        with self.lock:
+            entry = self.counters.get(key)
+            return entry["loaded_at"] if entry else None
+
+    def begin_seed(self, key: str) -> Tuple[float, Dict[str, int]]:
+        """
+        (token, current fields) before key is re-seeded. A new key starts
+        empty and stale, and counts increments from now on.
+        """
+        with self.lock:
+            entry = self.counters.setdefault(key, {"loaded_at": 0.0, "fields": Counter(), "members": set()})
+            return entry["loaded_at"], dict(entry["fields"])
+
+    def seed(self, key: str, token: float, base: Dict[str, int], fields: Dict[str, int],
+             members: Iterable[str]) -> bool:
+        """
+        Rebase key on fields read from the database, keeping the increments
+        made since begin_seed returned base. False if another seed came first.
+        """
+        with self.lock:
+            entry = self.counters.get(key)
+            if entry is None or entry["loaded_at"] != token:
+                return False
+            current = entry["fields"]
+            rebased = Counter()
+            for field in set(fields) | set(current) | set(base):
+                value = fields.get(field, 0) + current.get(field, 0) - base.get(field, 0)
+                if value:
+                    rebased[field] = value
+            entry["fields"] = rebased
+            entry["members"].update(members)
+            entry["loaded_at"] = time.time()
+            return True
+
+    def incr(self, key: str, fields: Dict[str, int], member: Optional[str] = None):
+        """Increment fields of key (ignored until key has been seeded)"""
+        with self.lock:
+            entry = self.counters.get(key)
+            if entry is None:
+                return
+            entry["fields"].update(fields)
+            if member:
+                entry["members"].add(member)
+
+    def snapshot(self, key: str) -> Optional[Dict]:
+        """Current fields and number of unique members of key"""
+        with self.lock:
+            entry = self.counters.get(key)
+            if entry is None:
+                return None
+            return {"fields": dict(entry["fields"]), "unique": len(entry["members"])}
+
+    def discard_except(self, suffix: str):
+        """Drop every key that does not end with suffix (previous days)"""
+        with self.lock:
+            for key in [k for k in self.counters if not k.endswith(suffix)]:
+                del self.counters[key]
+
+class RedisCounterStore:
+    """Counters shared through Redis hashes (fields) and HyperLogLogs (unique members)"""
+
+    # Keys outlive the day they count so a late read around midnight still finds them
+    KEY_TTL = 2 * 24 * 3600
+
+    reconcile_seconds = RECONCILE_SECONDS
+
+    def __init__(self, url: str):
+        import redis
+        self.redis_client = redis.from_url(url, decode_responses=True)
+
+    def is_loaded(self, key: str) -> Optional[float]:
+        loaded_at = self.redis_client.get(f"{key}:loaded_at")
+        return float(loaded_at) if loaded_at else None
+
+    def begin_seed(self, key: str) -> Tuple[str, Dict[str, int]]:
+        self.redis_client.set(f"{key}:loaded_at", 0, nx=True, ex=self.KEY_TTL)
+        # MULTI/EXEC: the token and the fields are read atomically
+        pipe = self.redis_client.pipeline()
+        pipe.get(f"{key}:loaded_at")
+        pipe.hgetall(f"{key}:fields")
+        token, fields = pipe.execute()
+        return token, {field: int(value) for field, value in fields.items()}
+
+    def seed(self, key: str, token: str, base: Dict[str, int], fields: Dict[str, int],
+             members: Iterable[str]) -> bool:
+        from redis import WatchError
+
+        members = list(members)
+        deltas = {field: fields.get(field, 0) - base.get(field, 0) for field in set(fields) | set(base)}
+        with self.redis_client.pipeline() as pipe:
+            try:
+                # Applied only if no other seed changed loaded_at since begin_seed
+                pipe.watch(f"{key}:loaded_at")
+                if pipe.get(f"{key}:loaded_at") != token:
+                    return False
+                pipe.multi()
+                for field, delta in deltas.items():
+                    if delta:
+                        pipe.hincrby(f"{key}:fields", field, delta)
+                if members:
+                    pipe.pfadd(f"{key}:members", *members)
+                pipe.set(f"{key}:loaded_at", time.time())
+                for suffix in ("fields", "members", "loaded_at"):
+                    pipe.expire(f"{key}:{suffix}", self.KEY_TTL)
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    def incr(self, key: str, fields: Dict[str, int], member: Optional[str] = None):
+        if not self.redis_client.exists(f"{key}:loaded_at"):
+            return
+        pipe = self.redis_client.pipeline()
+        for field, amount in fields.items():
+            pipe.hincrby(f"{key}:fields", field, amount)
+        if member:
+            pipe.pfadd(f"{key}:members", member)
+        pipe.execute()
+
+    def snapshot(self, key: str) -> Optional[Dict]:
+        if not self.redis_client.exists(f"{key}:loaded_at"):
+            return None
+        pipe = self.redis_client.pipeline()
+        pipe.hgetall(f"{key}:fields")
+        pipe.pfcount(f"{key}:members")
+        fields, unique = pipe.execute()
+        return {"fields": {field: int(value) for field, value in fields.items()}, "unique": unique}
+
+    def discard_except(self, suffix: str):
+        # Redis keys expire on their own
+        pass
+
+def _create_store():
+    if REDIS_URL:
+        try:
+            store = RedisCounterStore(REDIS_URL)
+            store.redis_client.ping()
+            return store
+        except Exception as e:
+            logger.error(f"Redis counters unavailable, using in-memory counters: {e}")
+    return MemoryCounterStore()
+
+class TodayCounters:
+    """Per-tenant counters for the current day"""
+
+    def __init__(self, store):
+        self.store = store
+        self.current_day = date.today()
+
+    def _key(self, tenant_id: int) -> str:
+        today = date.today()
+        if today != self.current_day:
+            # Rollover: yesterday now comes from analytics_daily
+            self.current_day = today
+            self.store.discard_except(f":{today.isoformat()}")
+        return f"analytics_today:{tenant_id}:{today.isoformat()}"
+
+    def _incr(self, tenant_id: int, fields: Dict[str, int], member: Optional[str] = None):
+        # Counting must never fail a tracking request; reconcile() repairs misses
+        try:
+            self.store.incr(self._key(tenant_id), fields, member)
+        except Exception as e:
+            logger.error(f"Failed to update analytics counters for tenant {tenant_id}: {e}")
+
+    def record_session(self, tenant_id: int, ip_address_hash: Optional[str],
+                       device_type: Optional[str], started_at: datetime):
+        """Count a new session"""
+        fields = {"sessions": 1, f"hour:{started_at.hour}": 1}
+        device = (device_type or "").lower()
+        if device in DEVICE_TYPES:
+            fields[f"device:{device}"] = 1
+        self._incr(tenant_id, fields, ip_address_hash)
+
+    def record_page_view(self, tenant_id: int):
+        """Count a page view"""
+        self._incr(tenant_id, {"page_views": 1})
+
+    def record_item_click(self, tenant_id: int, item_id: Optional[int]):
+        """Count an item click"""
+        fields = {"item_clicks": 1}
+        if item_id is not None:
+            fields[f"item:{item_id}"] = 1
+        self._incr(tenant_id, fields)
+
+    def reconcile(self, db: Session, tenant_id: int):
+        """Re-seed a tenant's counters from the raw tables"""
+        from analytics_optimizer import AnalyticsOptimizer, day_range
+
+        key = self._key(tenant_id)
+        today_start, today_end = day_range(date.today(), date.today())
+
+        # Taken before reading, so increments made meanwhile survive the seed
+        token, base = self.store.begin_seed(key)
+
+        stats = AnalyticsOptimizer._range_stats_query(db, tenant_id, today_start, today_end).first()
+        fields = {
+            "sessions": stats.total_sessions,
+            "page_views": stats.page_views,
+            "item_clicks": stats.item_clicks
+        }
+        for device in DEVICE_TYPES:
+            fields[f"device:{device}"] = getattr(stats, device)
+
+        hour = cast(func.extract('hour', AnalyticsSession.started_at), Integer)
+        for row_hour, count in db.query(hour, func.count(AnalyticsSession.id)).filter(
+            AnalyticsSession.tenant_id == tenant_id,
+            AnalyticsSession.started_at >= today_start,
+            AnalyticsSession.started_at < today_end
+        ).group_by(hour).all():
+            fields[f"hour:{row_hour}"] = count
+
+        for item_id, count in db.query(AnalyticsItemClick.item_id, func.count(AnalyticsItemClick.id)).filter(
+            AnalyticsItemClick.tenant_id == tenant_id,
+            AnalyticsItemClick.timestamp >= today_start,
+            AnalyticsItemClick.timestamp < today_end,
+            AnalyticsItemClick.item_id.isnot(None)
+        ).group_by(AnalyticsItemClick.item_id).all():
+            fields[f"item:{item_id}"] = count
+
+        visitors = db.query(func.distinct(AnalyticsSession.ip_address_hash)).filter(
+            AnalyticsSession.tenant_id == tenant_id,
+            AnalyticsSession.started_at >= today_start,
+            AnalyticsSession.started_at < today_end,
+            AnalyticsSession.ip_address_hash.isnot(None)
+        ).all()
+
+        self.store.seed(key, token, base, fields, (visitor for visitor, in visitors))
+
+    def get(self, db: Session, tenant_id: int) -> Dict:
+        """Today's totals for a tenant, seeding the counters from the database when stale"""
+        key = self._key(tenant_id)
+        loaded_at = self.store.is_loaded(key)
+        if loaded_at is None or time.time() - loaded_at > self.store.reconcile_seconds:
+            self.reconcile(db, tenant_id)
+
+        snapshot = self.store.snapshot(key) or {"fields": {}, "unique": 0}
+        fields = snapshot["fields"]
+
+        return {
+            "sessions": fields.get("sessions", 0),
+            "visitors": snapshot["unique"],
+            "page_views": fields.get("page_views", 0),
+            "item_clicks": fields.get("item_clicks", 0),
+            "devices": {device: fields.get(f"device:{device}", 0) for device in DEVICE_TYPES},
+            "hourly_distribution": {str(hour): fields.get(f"hour:{hour}", 0) for hour in range(24)},
+            "item_clicks_by_item": {
+                int(field.split(":", 1)[1]): count
+                for field, count in fields.items()
+                if field.startswith("item:")
+            }
+        }
+
+# Singleton instance
+today_counters = TodayCounters(_create_store())
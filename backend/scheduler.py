@@ -0,0 +1,345 @@
+"""
+Background Job Scheduler for MenuIQ
+
+Runs named periodic jobs inside the API process, started from the FastAPI
+startup event, so the daily analytics rollup, popularity ranking, ordering
+rebalance, cache sweeps, cache warming and time window rebuilds need no
+external cron and never run on a request path.
+
+- Every job sleeps its interval plus a random jitter between runs, so the
+  workers of a deployment do not all fire at the same moment. A job with a
+  due callback wakes up earlier when that is due (the time_windows job at
+  the next promotion, season or meal period transition).
+- Jobs touching shared state (the database) take a PostgreSQL advisory lock
+  named after the job; if another worker holds it, or finished the job less
+  than half an interval ago (scheduled_job_runs), the run is skipped. A
+  rollup therefore never overlaps itself across workers or servers and runs
+  about once per interval for the whole deployment.
+- Jobs touching per-process state (the in-memory cache) run in every worker
+  without a lock.
+- Job bodies are synchronous and run in a worker thread, keeping the event
+  loop free; each job records run/skip/failure counts and timings, exposed at
+  /api/admin/jobs.
+
+Set SCHEDULER_ENABLED=false to turn it off (e.g. when running
+aggregate_analytics.py from cron instead).
+"""
+import os
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine
+from models import AnalyticsDaily, ScheduledJobRun, Tenant
+from time_windows import seconds_until_next_rebuild
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+
+# Seconds between runs of each job
+ROLLUP_INTERVAL = int(os.getenv("SCHEDULER_ROLLUP_SECONDS", "3600"))
+CACHE_SWEEP_INTERVAL = int(os.getenv("SCHEDULER_CACHE_SWEEP_SECONDS", "300"))
+POPULARITY_INTERVAL = int(os.getenv("SCHEDULER_POPULARITY_SECONDS", "3600"))
+ORDERING_REBALANCE_INTERVAL = int(os.getenv("SCHEDULER_ORDERING_REBALANCE_SECONDS", "86400"))
+# Below the public menu TTL so warmed entries are refreshed before they expire
+CACHE_WARM_INTERVAL = int(os.getenv("SCHEDULER_CACHE_WARM_SECONDS", "240"))
+# Longest sleep of the time_windows job, which otherwise wakes at each transition;
+# transitions noted closer than this to a sleep's end may be rebuilt late (by requests)
+TIME_WINDOWS_INTERVAL = int(os.getenv("SCHEDULER_TIME_WINDOWS_SECONDS", "300"))
+
+# Tenants (by sessions over the last CACHE_WARM_DAYS) kept warm in every worker
+CACHE_WARM_TOP_TENANTS = int(os.getenv("SCHEDULER_CACHE_WARM_TOP_TENANTS", "10"))
+CACHE_WARM_DAYS = 7
+
+# Upper bound of the random delay added to each interval, as a fraction of it
+JITTER_FRACTION = 0.1
+
+def advisory_lock_key(name: str) -> int:
+    """Stable signed 64-bit advisory lock key for a job name"""
+    return int.from_bytes(hashlib.sha256(f"menuiq:job:{name}".encode()).digest()[:8], "big", signed=True)
+
+class Job:
+    """A named periodic job and its timing metrics"""
+
+    def __init__(self, name: str, interval: int, func: Callable[[], None], lock: bool = True,
+                 due: Optional[Callable[[], Optional[float]]] = None):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.lock = lock
+        # Seconds until the job has work to do, if it knows (None: nothing scheduled)
+        self.due = due
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_duration: Optional[float] = None
+        self.last_started_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.next_run_at: Optional[datetime] = None
+        self.running = False
+
+    def delay(self) -> float:
+        """Seconds until the next run: the interval plus jitter, or sooner if due"""
+        delay = self.interval + random.uniform(0, self.interval * JITTER_FRACTION)
+        due = self.due() if self.due is not None else None
+        return delay if due is None else min(delay, due)
+
+    def _claim(self, conn) -> bool:
+        """Take the job's advisory lock unless another worker holds it or ran the job recently"""
+        key = advisory_lock_key(self.name)
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar():
+            return False
+
+        last_finished_at = conn.execute(
+            select(ScheduledJobRun.last_finished_at).where(ScheduledJobRun.job_name == self.name)
+        ).scalar()
+        conn.commit()
+
+        if last_finished_at and last_finished_at > datetime.utcnow() - timedelta(seconds=self.interval / 2):
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+            conn.commit()
+            return False
+        return True
+
+    def _record(self, conn, started_at: datetime, duration: float, error: Optional[str]):
+        """Store the run in scheduled_job_runs and release the advisory lock"""
+        values = {
+            "job_name": self.name,
+            "last_started_at": started_at,
+            "last_finished_at": datetime.utcnow(),
+            "last_duration": duration,
+            "last_error": error,
+        }
+        stmt = insert(ScheduledJobRun).values(runs=1, **values)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[ScheduledJobRun.job_name],
+            set_={**values, "runs": ScheduledJobRun.runs + 1}
+        ))
+        conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": advisory_lock_key(self.name)})
+        conn.commit()
+
+    def run(self):
+        """Run once (in a worker thread), holding the job's advisory lock if it has one"""
+        conn = None
+        if self.lock:
+            # Dedicated connection: the job's own session commits and returns
+            # its connection to the pool, a session-level lock must stay put
+            conn = engine.connect()
+            try:
+                claimed = self._claim(conn)
+            except Exception as e:
+                conn.invalidate()
+                conn.close()
+                self.failures += 1
+                self.last_error = str(e)
+                logger.error(f"Job {self.name} could not take its lock: {e}")
+                return
+            if not claimed:
+                conn.close()
+                self.skipped += 1
+                logger.info(f"Job {self.name} skipped: running or recently run in another worker")
+                return
+
+        self.running = True
+        self.last_started_at = datetime.utcnow()
+        started = time.perf_counter()
+        try:
+            self.func()
+            self.last_error = None
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.error(f"Job {self.name} failed: {e}")
+        finally:
+            duration = time.perf_counter() - started
+            self.runs += 1
+            self.total_duration += duration
+            self.max_duration = max(self.max_duration, duration)
+            self.last_duration = duration
+            self.running = False
+            if conn is not None:
+                try:
+                    self._record(conn, self.last_started_at, duration, self.last_error)
+                except Exception as e:
+                    logger.error(f"Job {self.name} could not record its run: {e}")
+                    # Discarding the connection drops the lock it may still hold
+                    conn.invalidate()
+                finally:
+                    conn.close()
+
+        logger.info(f"Job {self.name} finished in {duration:.2f}s")
+
+    def metrics(self) -> Dict:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval,
+            "locked": self.lock,
+            "running": self.running,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "last_started_at": self.last_started_at,
+            "last_duration_seconds": round(self.last_duration, 3) if self.last_duration is not None else None,
+            "avg_duration_seconds": round(self.total_duration / self.runs, 3) if self.runs else None,
+            "max_duration_seconds": round(self.max_duration, 3),
+            "last_error": self.last_error,
+            "next_run_at": self.next_run_at
+        }
+
+class JobScheduler:
+    """Runs registered jobs on the event loop, one asyncio task per job"""
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self.tasks: List[asyncio.Task] = []
+
+    def add_job(self, name: str, interval: int, func: Callable[[], None], lock: bool = True,
+                due: Optional[Callable[[], Optional[float]]] = None) -> Job:
+        job = Job(name, interval, func, lock, due)
+        self.jobs[name] = job
+        return job
+
+    async def _loop(self, job: Job):
+        loop = asyncio.get_running_loop()
+        # First run after a random share of the interval to spread worker start-up
+        delay = random.uniform(0, job.interval * JITTER_FRACTION)
+        while True:
+            job.next_run_at = datetime.utcnow() + timedelta(seconds=delay)
+            await asyncio.sleep(delay)
+            await loop.run_in_executor(None, job.run)
+            delay = job.delay()
+
+    def start(self):
+        if self.tasks:
+            return
+        for job in self.jobs.values():
+            if job.interval > 0:
+                self.tasks.append(asyncio.create_task(self._loop(job)))
+        logger.info(f"Scheduler started: {', '.join(self.jobs)}")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def metrics(self) -> List[Dict]:
+        return [job.metrics() for job in self.jobs.values()]
+
+# Job bodies
+
+def rollup_analytics():
+    """Roll up the days since the last rollup, then archive and maintain partitions (what aggregate_analytics.py does)"""
+    from aggregate_analytics import pending_rollup_start, run_rollup
+
+    db = SessionLocal()
+    try:
+        # Today is served live; days a missed run skipped are caught up here
+        yesterday = date.today() - timedelta(days=1)
+        run_rollup(db, pending_rollup_start(db), yesterday)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def rank_popular_items():
+    """Recompute best_seller_rank of menu items from recent clicks"""
+    from popularity import update_best_seller_ranks
+
+    db = SessionLocal()
+    try:
+        update_best_seller_ranks(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def rebalance_orderings():
+    """Renumber ordered lists whose neighbours are running out of room"""
+    from ordering import rebalance_crowded
+
+    db = SessionLocal()
+    try:
+        renumbered = rebalance_crowded(db)
+        logger.info(f"Ordering rebalance renumbered rows: {renumbered}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def sweep_cache():
+    """Drop expired entries of this worker's in-memory cache"""
+    from simple_cache import cache
+    cache.cleanup_expired()
+
+def top_tenants(db: Session, limit: int = CACHE_WARM_TOP_TENANTS) -> List[Dict]:
+    """Active tenants with the most sessions over the last CACHE_WARM_DAYS"""
+    sessions = func.sum(AnalyticsDaily.total_sessions)
+    rows = db.query(Tenant.id, Tenant.subdomain).join(
+        AnalyticsDaily, AnalyticsDaily.tenant_id == Tenant.id
+    ).filter(
+        Tenant.status == "active",
+        AnalyticsDaily.date >= date.today() - timedelta(days=CACHE_WARM_DAYS)
+    ).group_by(Tenant.id, Tenant.subdomain).order_by(sessions.desc()).limit(limit).all()
+
+    return [{"id": tenant_id, "subdomain": subdomain} for tenant_id, subdomain in rows]
+
+def warm_top_tenants():
+    """Refresh the public menu cache of the busiest tenants in this worker"""
+    from simple_cache import invalidate_public_menu_cache
+
+    db = SessionLocal()
+    try:
+        for tenant in top_tenants(db):
+            invalidate_public_menu_cache(tenant["subdomain"], db, warm_cache=True)
+    finally:
+        db.close()
+
+def rebuild_time_windows():
+    """Rebuild the public menu cache of tenants whose menu changed with the time in this worker"""
+    from simple_cache import invalidate_public_menu_cache
+    from public_menu_routes import current_public_items
+    from time_windows import due_rebuilds
+
+    subdomains = due_rebuilds()
+    if not subdomains:
+        return
+
+    db = SessionLocal()
+    try:
+        tenants = db.query(Tenant).filter(
+            Tenant.subdomain.in_(subdomains),
+            Tenant.status == "active"
+        ).all()
+        for tenant in tenants:
+            invalidate_public_menu_cache(tenant.subdomain, warm_cache=False)
+            current_public_items(db, tenant)
+    finally:
+        db.close()
+
+def create_scheduler() -> JobScheduler:
+    scheduler = JobScheduler()
+    scheduler.add_job("analytics_rollup", ROLLUP_INTERVAL, rollup_analytics)
+    scheduler.add_job("popularity_ranking", POPULARITY_INTERVAL, rank_popular_items)
+    scheduler.add_job("ordering_rebalance", ORDERING_REBALANCE_INTERVAL, rebalance_orderings)
+    scheduler.add_job("cache_sweep", CACHE_SWEEP_INTERVAL, sweep_cache, lock=False)
+    scheduler.add_job("cache_warm", CACHE_WARM_INTERVAL, warm_top_tenants, lock=False)
+    scheduler.add_job("time_windows", TIME_WINDOWS_INTERVAL, rebuild_time_windows, lock=False,
+                      due=seconds_until_next_rebuild)
+    return scheduler
+
+# Singleton instance
+scheduler = create_scheduler()
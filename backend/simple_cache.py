@@ -13,6 +13,8 @@ import threading
 class SimpleCache:
     def __init__(self):
         self.cache: Dict[str, Dict[str, Any]] = {}
+        # Generation numbers: entries keyed by a generation go stale once it is bumped
+        self.generations: Dict[str, int] = {}
         self.lock = threading.Lock()
         
     def _is_expired(self, entry: Dict[str, Any]) -> bool:
@@ -65,6 +67,17 @@ class SimpleCache:
         with self.lock:
             self.cache.clear()
     
+    def generation(self, name: str) -> int:
+        """Current generation of name (0 until first bumped)"""
+        with self.lock:
+            return self.generations.get(name, 0)
+    
+    def bump_generation(self, name: str) -> int:
+        """Start a new generation of name"""
+        with self.lock:
+            self.generations[name] = self.generations.get(name, 0) + 1
+            return self.generations[name]
+    
     def cleanup_expired(self):
         """Remove expired entries"""
         with self.lock:
@@ -81,6 +94,8 @@ CACHE_TTL = {
     "settings": 600,         # 10 minutes for settings
     "categories": 300,       # 5 minutes for categories
     "menu_items": 300,       # 5 minutes for menu items
+    "dashboard": 60,         # 1 minute for dashboard stats (other workers miss the generation bump)
+    "menu_version": 3600,    # 1 hour for published menu snapshots (immutable)
 }
 
 def cached(prefix: str, ttl: Optional[int] = None):
@@ -110,6 +125,10 @@ def cached(prefix: str, ttl: Optional[int] = None):
     return decorator
 
 # Helper functions
+def tenant_generation_key(subdomain: str) -> str:
+    """Generation name bumped whenever a tenant's menu data changes"""
+    return f"tenant:{subdomain}"
+
 def invalidate_tenant_cache(tenant_id: int, db=None, warm_cache: bool = True):
     """Invalidate all cache entries for a tenant"""
     patterns = [
@@ -130,8 +149,13 @@ def invalidate_tenant_cache(tenant_id: int, db=None, warm_cache: bool = True):
         if tenant:
             CacheWarmer.invalidate_and_warm_async(db, tenant_id, tenant.subdomain)
 
+def invalidate_dashboard_cache(subdomain: str):
+    """Invalidate the tenant dashboard only (draft menu edits of a published menu)"""
+    cache.bump_generation(tenant_generation_key(subdomain))
+
 def invalidate_public_menu_cache(subdomain: str, db=None, warm_cache: bool = True):
     """Invalidate public menu cache for a subdomain"""
+    cache.bump_generation(tenant_generation_key(subdomain))
     cache.delete_pattern(f"public_menu:subdomain:{subdomain}")
     cache.delete_pattern(f"categories:subdomain:{subdomain}")
     cache.delete_pattern(f"settings:subdomain:{subdomain}")
@@ -9,13 +9,15 @@ import os
 from database import get_db
 from models import (
     Tenant, User, MenuItem, Category, 
-    ActivityLog, Settings, SystemAdmin, AllergenIcon
+    ActivityLog, Settings, SystemAdmin, AllergenIcon, ScheduledJobRun
 )
 from auth import (
     get_current_admin, require_system_admin, 
     get_password_hash, create_access_token
 )
 
+from scheduler import scheduler
+
 router = APIRouter(prefix="/api/admin", tags=["system-admin"])
 
 # Pydantic models
@@ -164,6 +166,23 @@ async def get_system_stats(db: Session = Depends(get_db)):
         "revenue": revenue
     }
 
+@router.get("/jobs", dependencies=[Depends(require_system_admin)])
+async def get_scheduled_jobs(db: Session = Depends(get_db)):
+    """Background job metrics of this worker and last runs across all workers"""
+    last_runs = db.query(ScheduledJobRun).all()
+    
+    return {
+        "jobs": scheduler.metrics(),
+        "last_runs": [{
+            "name": run.job_name,
+            "last_started_at": run.last_started_at,
+            "last_finished_at": run.last_finished_at,
+            "last_duration_seconds": round(run.last_duration, 3) if run.last_duration is not None else None,
+            "last_error": run.last_error,
+            "runs": run.runs
+        } for run in last_runs]
+    }
+
 @router.get("/tenants")
 async def get_tenants(db: Session = Depends(get_db)):
     """Get all tenants"""
@@ -2,16 +2,14 @@
 Enhanced tenant routes with support for all rich menu fields
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, or_
 from typing import List, Optional
 import os
 import shutil
-import json
 from datetime import datetime
 from pathlib import Path
-from decimal import Decimal, InvalidOperation
-import decimal
 import aiofiles
 from image_optimizer import ImageOptimizer
 from cache_warmer import CacheWarmer
@@ -24,7 +22,15 @@ from models import (
     MenuItemReview, DietaryCertification, PreparationStep
 )
 from auth import get_current_user_dict
-from simple_cache import cache, invalidate_public_menu_cache
+from simple_cache import cache, CACHE_TTL, tenant_generation_key
+from menu_item_fields import (
+    parse_menu_item_payload, assign_sub_items, refresh_price_ranges, set_item_allergens,
+    COMPUTED_FIELDS, DERIVED_FIELDS
+)
+from menu_import_export import IMPORT_FORMATS, MenuImportError, import_menu, stream_menu_export
+from menu_publishing import list_menu_versions, publish_menu, switch_menu_version
+from ordering import CATEGORIES, MENU_ITEMS, SUB_ITEMS, apply_sort_orders, move, next_position
+from time_windows import running_promotion, tenant_timezone, zone
 
 router = APIRouter(prefix="/api/tenant", tags=["tenant"])
 
@@ -62,62 +68,97 @@ def get_tenant_from_user(user_dict: dict, db: Session) -> Tenant:
     
     return tenant
 
+def serialize_settings(settings: Settings) -> dict:
+    """Settings as returned by the API"""
+    return {
+        "id": settings.id,
+        "currency": settings.currency,
+        "tax_rate": float(settings.tax_rate) if settings.tax_rate else 0,
+        "language": settings.language,
+        "timezone": settings.timezone,
+        "primary_color": settings.primary_color,
+        "secondary_color": settings.secondary_color,
+        "font_family": settings.font_family,
+        "menu_layout": settings.menu_layout,
+        "card_style": settings.card_style,
+        "color_scheme": settings.color_scheme,
+        "animation_enabled": settings.animation_enabled,
+        "enable_search": settings.enable_search,
+        "enable_reviews": settings.enable_reviews,
+        "enable_ratings": settings.enable_ratings,
+        "enable_nutritional_info": settings.enable_nutritional_info,
+        "enable_allergen_info": settings.enable_allergen_info,
+        "enable_sustainability_info": settings.enable_sustainability_info,
+        "enable_pairing_suggestions": settings.enable_pairing_suggestions,
+        "enable_ar_preview": settings.enable_ar_preview,
+        "enable_video_preview": settings.enable_video_preview,
+        "enable_loyalty_points": settings.enable_loyalty_points,
+        "quick_view_enabled": settings.quick_view_enabled,
+        "comparison_enabled": settings.comparison_enabled,
+        "wishlist_enabled": settings.wishlist_enabled,
+        "social_sharing_enabled": settings.social_sharing_enabled,
+        "whatsapp_ordering_enabled": settings.whatsapp_ordering_enabled,
+        "whatsapp_number": settings.whatsapp_number,
+        "instagram_handle": settings.instagram_handle,
+        "tiktok_handle": settings.tiktok_handle,
+        "website_url": settings.website_url,
+        "footer_enabled": settings.footer_enabled,
+        "footer_text_en": settings.footer_text_en,
+        "footer_text_ar": settings.footer_text_ar,
+        "hero_subtitle_en": settings.hero_subtitle_en,
+        "hero_subtitle_ar": settings.hero_subtitle_ar,
+        "footer_tagline_en": settings.footer_tagline_en,
+        "footer_tagline_ar": settings.footer_tagline_ar,
+        "show_calories": settings.show_calories,
+        "show_preparation_time": settings.show_preparation_time,
+        "show_allergens": settings.show_allergens,
+        "show_price_without_vat": settings.show_price_without_vat,
+        "show_all_category": settings.show_all_category,
+        "show_include_vat": settings.show_include_vat,
+        # Multi-item badge customization
+        "multi_item_badge_text_en": settings.multi_item_badge_text_en,
+        "multi_item_badge_text_ar": settings.multi_item_badge_text_ar,
+        "multi_item_badge_color": settings.multi_item_badge_color,
+        # Upsell settings
+        "upsell_enabled": settings.upsell_enabled,
+        "upsell_default_style": settings.upsell_default_style,
+        "upsell_default_border_color": settings.upsell_default_border_color,
+        "upsell_default_background_color": settings.upsell_default_background_color,
+        "upsell_default_badge_color": settings.upsell_default_badge_color,
+        "upsell_default_animation": settings.upsell_default_animation,
+        "upsell_default_icon": settings.upsell_default_icon,
+        # SEO/Meta tags
+        "meta_title_en": settings.meta_title_en,
+        "meta_title_ar": settings.meta_title_ar,
+        "meta_description_en": settings.meta_description_en,
+        "meta_description_ar": settings.meta_description_ar,
+        "meta_keywords_en": settings.meta_keywords_en,
+        "meta_keywords_ar": settings.meta_keywords_ar,
+        "og_image_url": settings.og_image_url
+    }
+
 # Dashboard Stats
 @router.get("/dashboard/stats")
 async def get_dashboard_stats(
     current_user: dict = Depends(get_current_user_dict),
     db: Session = Depends(get_db)
 ):
-    """Get enhanced dashboard statistics"""
-    tenant = get_tenant_from_user(current_user, db)
-    
-    # Basic counts
-    total_categories = db.query(func.count(Category.id)).filter(
-        Category.tenant_id == tenant.id
-    ).scalar() or 0
-    
-    total_items = db.query(func.count(MenuItem.id)).filter(
-        MenuItem.tenant_id == tenant.id
-    ).scalar() or 0
-    
-    active_items = db.query(func.count(MenuItem.id)).filter(
-        MenuItem.tenant_id == tenant.id,
-        MenuItem.is_available == True
-    ).scalar() or 0
-    
-    featured_items = db.query(func.count(MenuItem.id)).filter(
-        MenuItem.tenant_id == tenant.id,
-        MenuItem.is_featured == True
-    ).scalar() or 0
-    
-    signature_dishes = db.query(func.count(MenuItem.id)).filter(
-        MenuItem.tenant_id == tenant.id,
-        MenuItem.signature_dish == True
-    ).scalar() or 0
-    
-    # Get items with promotions
-    promo_items = db.query(func.count(MenuItem.id)).filter(
-        MenuItem.tenant_id == tenant.id,
-        MenuItem.promotion_price.isnot(None),
-        MenuItem.promotion_start_date <= datetime.now().date(),
-        MenuItem.promotion_end_date >= datetime.now().date()
-    ).scalar() or 0
+    """
+    Get enhanced dashboard statistics.
     
-    # Get recent items with enhanced info
-    recent_items = db.query(MenuItem).filter(
-        MenuItem.tenant_id == tenant.id
-    ).order_by(MenuItem.created_at.desc()).limit(10).all()
+    Counts, recent/popular items and settings are cached per tenant under its
+    cache generation, so any committed menu change (see change_capture.py)
+    makes the next visit recompute them; tenant details and limits are always live.
+    """
+    tenant = get_tenant_from_user(current_user, db)
     
-    # Get popular items (by review count)
-    popular_items = db.query(MenuItem).filter(
-        MenuItem.tenant_id == tenant.id
-    ).order_by(MenuItem.review_count.desc()).limit(5).all()
-    
-    # Get settings
-    settings = db.query(Settings).filter(
-        Settings.tenant_id == tenant.id
-    ).first()
+    cache_key = f"dashboard:subdomain:{tenant.subdomain}:{cache.generation(tenant_generation_key(tenant.subdomain))}"
+    dashboard = cache.get(cache_key)
+    if dashboard is None:
+        dashboard = build_dashboard(db, tenant.id)
+        cache.set(cache_key, dashboard, CACHE_TTL["dashboard"])
     
+    stats = dashboard["stats"]
     return {
         "tenant": {
             "id": tenant.id,
@@ -128,20 +169,66 @@ async def get_dashboard_stats(
             "logo_url": tenant.logo_url,
             "dashboard_logo_url": tenant.dashboard_logo_url
         },
-        "stats": {
-            "total_categories": total_categories,
-            "total_items": total_items,
-            "active_items": active_items,
-            "inactive_items": total_items - active_items,
-            "featured_items": featured_items,
-            "signature_dishes": signature_dishes,
-            "promo_items": promo_items
-        },
+        "stats": stats,
         "limits": {
             "max_categories": tenant.max_categories,
             "max_items": tenant.max_menu_items,
-            "categories_used": total_categories,
-            "items_used": total_items
+            "categories_used": stats["total_categories"],
+            "items_used": stats["total_items"]
+        },
+        "recent_items": dashboard["recent_items"],
+        "popular_items": dashboard["popular_items"],
+        "settings": dashboard["settings"]
+    }
+
+def build_dashboard(db: Session, tenant_id: int) -> dict:
+    """Dashboard counts (one aggregate query), recent and popular items, and settings"""
+    # Get settings
+    settings = db.query(Settings).filter(
+        Settings.tenant_id == tenant_id
+    ).first()
+    today = datetime.now(zone(settings.timezone if settings else None)).date()
+    
+    total_categories = db.query(func.count(Category.id)).filter(
+        Category.tenant_id == tenant_id
+    ).scalar_subquery()
+    
+    counts = db.query(
+        total_categories.label("total_categories"),
+        func.count(MenuItem.id).label("total_items"),
+        func.count(MenuItem.id).filter(MenuItem.is_available == True).label("active_items"),
+        func.count(MenuItem.id).filter(MenuItem.is_featured == True).label("featured_items"),
+        func.count(MenuItem.id).filter(MenuItem.signature_dish == True).label("signature_dishes"),
+        # Items with a running promotion
+        func.count(MenuItem.id).filter(running_promotion(today)).label("promo_items")
+    ).filter(MenuItem.tenant_id == tenant_id).one()
+    
+    # Get recent items with enhanced info
+    recent_items = db.query(
+        MenuItem.id, MenuItem.name, MenuItem.price, MenuItem.category_id, MenuItem.created_at,
+        MenuItem.badge_text, MenuItem.is_featured, MenuItem.customer_rating
+    ).filter(
+        MenuItem.tenant_id == tenant_id
+    ).order_by(MenuItem.created_at.desc()).limit(10).all()
+    
+    # Get popular items (by recent clicks, see popularity.py)
+    popular_items = db.query(
+        MenuItem.id, MenuItem.name, MenuItem.review_count, MenuItem.customer_rating,
+        MenuItem.best_seller_rank
+    ).filter(
+        MenuItem.tenant_id == tenant_id,
+        MenuItem.best_seller_rank.isnot(None)
+    ).order_by(MenuItem.best_seller_rank, MenuItem.id).limit(5).all()
+    
+    return {
+        "stats": {
+            "total_categories": counts.total_categories,
+            "total_items": counts.total_items,
+            "active_items": counts.active_items,
+            "inactive_items": counts.total_items - counts.active_items,
+            "featured_items": counts.featured_items,
+            "signature_dishes": counts.signature_dishes,
+            "promo_items": counts.promo_items
         },
         "recent_items": [
             {
@@ -164,7 +251,7 @@ async def get_dashboard_stats(
                 "best_seller_rank": item.best_seller_rank
             } for item in popular_items
         ],
-        "settings": settings
+        "settings": serialize_settings(settings) if settings else None
     }
 
 # Enhanced Categories CRUD
@@ -176,7 +263,20 @@ async def get_categories(
     """Get all categories for the tenant"""
     tenant = get_tenant_from_user(current_user, db)
     
-    categories = db.query(Category).filter(
+    # Item counts per category in one grouped subquery
+    item_counts = db.query(
+        MenuItem.category_id,
+        func.count(MenuItem.id).label("menu_items_count")
+    ).filter(
+        MenuItem.tenant_id == tenant.id
+    ).group_by(MenuItem.category_id).subquery()
+    
+    categories = db.query(
+        Category,
+        func.coalesce(item_counts.c.menu_items_count, 0)
+    ).outerjoin(
+        item_counts, item_counts.c.category_id == Category.id
+    ).filter(
         Category.tenant_id == tenant.id
     ).order_by(Category.sort_order, Category.id).all()
     
@@ -201,9 +301,9 @@ async def get_categories(
             "meta_description": cat.meta_description,
             "created_at": cat.created_at.isoformat() if cat.created_at else None,
             "updated_at": cat.updated_at.isoformat() if cat.updated_at else None,
-            "menu_items_count": len(cat.menu_items)
+            "menu_items_count": menu_items_count
         }
-        for cat in categories
+        for cat, menu_items_count in categories
     ]
 
 @router.post("/categories")
@@ -240,12 +340,16 @@ async def create_category(
         is_active=category_data.get("is_active", True),
         is_featured=category_data.get("is_featured", False),
         display_style=category_data.get("display_style", "grid"),
-        sort_order=category_data.get("sort_order", 0),
+        sort_order=category_data.get("sort_order"),
         hero_image=category_data.get("hero_image"),
         meta_keywords=category_data.get("meta_keywords"),
         meta_description=category_data.get("meta_description")
     )
     
+    if db_category.sort_order is None:
+        # Append after the last category, leaving a gap for later moves
+        db_category.sort_order = next_position(db, CATEGORIES, db_category)
+    
     db.add(db_category)
     db.commit()
     db.refresh(db_category)
@@ -298,7 +402,10 @@ async def delete_category(
         raise HTTPException(status_code=404, detail="Category not found")
     
     # Check if category has menu items
-    if category.menu_items:
+    has_items = db.query(
+        db.query(MenuItem.id).filter(MenuItem.category_id == category.id).exists()
+    ).scalar()
+    if has_items:
         raise HTTPException(
             status_code=400, 
             detail="Cannot delete category with existing menu items"
@@ -321,25 +428,42 @@ async def update_categories_sort_order(
     categories = data.get("categories", [])
     
     try:
-        for cat_data in categories:
-            category = db.query(Category).filter(
-                Category.id == cat_data["id"],
-                Category.tenant_id == tenant.id
-            ).first()
-            
-            if category:
-                category.sort_order = cat_data["sort_order"]
-        
+        # Whole reorder in one UPDATE ... FROM (VALUES ...)
+        updated = apply_sort_orders(db, Category, tenant.id, categories)
         db.commit()
         
-        # Invalidate cache
-        invalidate_public_menu_cache(tenant.subdomain)
-        
-        return {"message": "Category sort order updated successfully"}
+        return {"message": "Category sort order updated successfully", "updated": updated}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/categories/{category_id}/move")
+async def move_category(
+    category_id: int,
+    data: dict,
+    current_user: dict = Depends(get_current_user_dict),
+    db: Session = Depends(get_db)
+):
+    """Move a category right after after_id and/or right before before_id"""
+    tenant = get_tenant_from_user(current_user, db)
+    
+    category = db.query(Category).filter(
+        Category.id == category_id,
+        Category.tenant_id == tenant.id
+    ).first()
+    
+    if not category:
+        raise HTTPException(status_code=404, detail="Category not found")
+    
+    try:
+        position = move(db, CATEGORIES, category, data.get("before_id"), data.get("after_id"))
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    
+    return {"id": category.id, "sort_order": position}
+
 # Settings endpoints
 @router.get("/settings")
 async def get_settings(
@@ -365,70 +489,7 @@ async def get_settings(
         db.refresh(settings)
     
     return {
-        "id": settings.id,
-        "currency": settings.currency,
-        "tax_rate": float(settings.tax_rate) if settings.tax_rate else 0,
-        "language": settings.language,
-        "timezone": settings.timezone,
-        "primary_color": settings.primary_color,
-        "secondary_color": settings.secondary_color,
-        "font_family": settings.font_family,
-        "menu_layout": settings.menu_layout,
-        "card_style": settings.card_style,
-        "color_scheme": settings.color_scheme,
-        "animation_enabled": settings.animation_enabled,
-        "enable_search": settings.enable_search,
-        "enable_reviews": settings.enable_reviews,
-        "enable_ratings": settings.enable_ratings,
-        "enable_nutritional_info": settings.enable_nutritional_info,
-        "enable_allergen_info": settings.enable_allergen_info,
-        "enable_sustainability_info": settings.enable_sustainability_info,
-        "enable_pairing_suggestions": settings.enable_pairing_suggestions,
-        "enable_ar_preview": settings.enable_ar_preview,
-        "enable_video_preview": settings.enable_video_preview,
-        "enable_loyalty_points": settings.enable_loyalty_points,
-        "quick_view_enabled": settings.quick_view_enabled,
-        "comparison_enabled": settings.comparison_enabled,
-        "wishlist_enabled": settings.wishlist_enabled,
-        "social_sharing_enabled": settings.social_sharing_enabled,
-        "whatsapp_ordering_enabled": settings.whatsapp_ordering_enabled,
-        "whatsapp_number": settings.whatsapp_number,
-        "instagram_handle": settings.instagram_handle,
-        "tiktok_handle": settings.tiktok_handle,
-        "website_url": settings.website_url,
-        "footer_enabled": settings.footer_enabled,
-        "footer_text_en": settings.footer_text_en,
-        "footer_text_ar": settings.footer_text_ar,
-        "hero_subtitle_en": settings.hero_subtitle_en,
-        "hero_subtitle_ar": settings.hero_subtitle_ar,
-        "footer_tagline_en": settings.footer_tagline_en,
-        "footer_tagline_ar": settings.footer_tagline_ar,
-        "show_calories": settings.show_calories,
-        "show_preparation_time": settings.show_preparation_time,
-        "show_allergens": settings.show_allergens,
-        "show_price_without_vat": settings.show_price_without_vat,
-        "show_all_category": settings.show_all_category,
-        "show_include_vat": settings.show_include_vat,
-        # Multi-item badge customization
-        "multi_item_badge_text_en": settings.multi_item_badge_text_en,
-        "multi_item_badge_text_ar": settings.multi_item_badge_text_ar,
-        "multi_item_badge_color": settings.multi_item_badge_color,
-        # Upsell settings
-        "upsell_enabled": settings.upsell_enabled,
-        "upsell_default_style": settings.upsell_default_style,
-        "upsell_default_border_color": settings.upsell_default_border_color,
-        "upsell_default_background_color": settings.upsell_default_background_color,
-        "upsell_default_badge_color": settings.upsell_default_badge_color,
-        "upsell_default_animation": settings.upsell_default_animation,
-        "upsell_default_icon": settings.upsell_default_icon,
-        # SEO/Meta tags
-        "meta_title_en": settings.meta_title_en,
-        "meta_title_ar": settings.meta_title_ar,
-        "meta_description_en": settings.meta_description_en,
-        "meta_description_ar": settings.meta_description_ar,
-        "meta_keywords_en": settings.meta_keywords_en,
-        "meta_keywords_ar": settings.meta_keywords_ar,
-        "og_image_url": settings.og_image_url,
+        **serialize_settings(settings),
         # Include tenant name for better context
         "tenantName": tenant.name,
         "logo_url": tenant.logo_url
@@ -461,9 +522,6 @@ async def update_settings(
     db.commit()
     db.refresh(settings)
     
-    # Invalidate and warm cache for this tenant
-    invalidate_public_menu_cache(tenant.subdomain, db=db, warm_cache=True)
-    
     return {"message": "Settings updated successfully", "updated_fields": updated_fields}
 
 # Allergen Icons endpoint
@@ -537,11 +595,8 @@ async def get_menu_items(
         query = query.filter(MenuItem.is_featured == is_featured)
     
     if has_promotion:
-        query = query.filter(
-            MenuItem.promotion_price.isnot(None),
-            MenuItem.promotion_start_date <= datetime.now().date(),
-            MenuItem.promotion_end_date >= datetime.now().date()
-        )
+        today = datetime.now(tenant_timezone(db, tenant.id)).date()
+        query = query.filter(running_promotion(today))
     
     if dietary_filter:
         if dietary_filter == "vegetarian":
@@ -561,7 +616,8 @@ async def get_menu_items(
     elif sort_by == "newest":
         query = query.order_by(MenuItem.created_at.desc())
     elif sort_by == "popular":
-        query = query.order_by(MenuItem.best_seller_rank)
+        # Unranked items (no recent clicks) sort last
+        query = query.order_by(MenuItem.best_seller_rank.asc().nullslast(), MenuItem.id)
     else:
         query = query.order_by(MenuItem.sort_order, MenuItem.id)
     
@@ -774,12 +830,11 @@ async def create_menu_item(
         dict: Contains the created item ID and success message
         
     Raises:
-        HTTPException: 400 if menu item limit reached, 404 if category not found
+        HTTPException: 400 if menu item limit reached or fields are invalid (all
+            invalid fields are listed), 404 if category not found
     """
     tenant = get_tenant_from_user(current_user, db)
     
-    # Process incoming data for menu item creation
-    
     # Check limits
     current_count = db.query(func.count(MenuItem.id)).filter(
         MenuItem.tenant_id == tenant.id
@@ -791,169 +846,53 @@ async def create_menu_item(
             detail=f"Menu item limit reached. Maximum allowed: {tenant.max_menu_items}"
         )
     
+    # Parse and validate the whole payload against the MenuItem columns
+    values, errors = parse_menu_item_payload(item_data, ignored=DERIVED_FIELDS)
+    if errors:
+        raise HTTPException(status_code=400, detail={
+            "message": "Invalid menu item fields",
+            "errors": errors
+        })
+    
     # Verify category exists and belongs to tenant
-    if item_data.get("category_id"):
+    if values.get("category_id"):
         category = db.query(Category).filter(
-            Category.id == item_data["category_id"],
+            Category.id == values["category_id"],
             Category.tenant_id == tenant.id
         ).first()
         
         if not category:
             raise HTTPException(status_code=404, detail="Category not found")
     
-    # Prepare data with proper type conversions
-    db_item = MenuItem(
-        tenant_id=tenant.id,
-        category_id=item_data.get("category_id"),
-        # Basic info
-        name=item_data.get("name"),
-        name_ar=item_data.get("name_ar"),
-        description=item_data.get("description"),
-        description_ar=item_data.get("description_ar"),
-        price=Decimal(str(item_data["price"])) if item_data.get("price") and str(item_data["price"]).strip() else None,
-        price_without_vat=Decimal(str(item_data["price_without_vat"])) if item_data.get("price_without_vat") and str(item_data["price_without_vat"]).strip() else None,
-        promotion_price=Decimal(str(item_data["promotion_price"])) if item_data.get("promotion_price") and str(item_data["promotion_price"]).strip() else None,
-        image=item_data.get("image"),
-        video_url=item_data.get("video_url"),
-        ar_model_url=item_data.get("ar_model_url"),
-        # Badge & highlights
-        badge_text=item_data.get("badge_text"),
-        badge_color=item_data.get("badge_color"),
-        highlight_message=item_data.get("highlight_message"),
-        # Availability
-        is_available=item_data.get("is_available", True),
-        is_featured=item_data.get("is_featured", False),
-        is_spicy=item_data.get("is_spicy", False),
-        spicy_level=item_data.get("spicy_level", 0),
-        signature_dish=item_data.get("signature_dish", False),
-        instagram_worthy=item_data.get("instagram_worthy", False),
-        limited_availability=item_data.get("limited_availability", False),
-        pre_order_required=item_data.get("pre_order_required", False),
-        min_order_quantity=item_data.get("min_order_quantity", 1),
-        max_daily_orders=item_data.get("max_daily_orders"),
-        # Dietary
-        halal=item_data.get("halal", True),
-        vegetarian=item_data.get("vegetarian", False),
-        vegan=item_data.get("vegan", False),
-        gluten_free=item_data.get("gluten_free", False),
-        dairy_free=item_data.get("dairy_free", False),
-        nut_free=item_data.get("nut_free", False),
-        organic_certified=item_data.get("organic_certified", False),
-        local_ingredients=item_data.get("local_ingredients", False),
-        fair_trade=item_data.get("fair_trade", False),
-        # Warnings
-        high_sodium=item_data.get("high_sodium", False),
-        contains_caffeine=item_data.get("contains_caffeine", False),
-        # Culinary
-        cooking_method=item_data.get("cooking_method"),
-        origin_country=item_data.get("origin_country"),
-        texture_notes=item_data.get("texture_notes"),
-        flavor_profile=item_data.get("flavor_profile"),
-        plating_style=item_data.get("plating_style"),
-        recommended_time=item_data.get("recommended_time"),
-        seasonal_availability=item_data.get("seasonal_availability"),
-        portion_size=item_data.get("portion_size"),
-        # Pairings
-        pairing_suggestions=item_data.get("pairing_suggestions"),
-        wine_pairing=item_data.get("wine_pairing"),
-        beer_pairing=item_data.get("beer_pairing"),
-        cocktail_pairing=item_data.get("cocktail_pairing"),
-        mocktail_pairing=item_data.get("mocktail_pairing"),
-        chef_notes=item_data.get("chef_notes"),
-        customization_options=item_data.get("customization_options"),
-        # Time & Exercise
-        preparation_time=item_data.get("preparation_time"),
-        walk_minutes=item_data.get("walk_minutes"),
-        run_minutes=item_data.get("run_minutes"),
-        # Nutrition
-        calories=item_data.get("calories"),
-        serving_size=item_data.get("serving_size"),
-        ingredients=item_data.get("ingredients"),
-        total_fat=Decimal(str(item_data["total_fat"])) if item_data.get("total_fat") else None,
-        saturated_fat=Decimal(str(item_data["saturated_fat"])) if item_data.get("saturated_fat") else None,
-        trans_fat=Decimal(str(item_data["trans_fat"])) if item_data.get("trans_fat") else None,
-        cholesterol=item_data.get("cholesterol"),
-        sodium=item_data.get("sodium"),
-        total_carbs=Decimal(str(item_data["total_carbs"])) if item_data.get("total_carbs") else None,
-        dietary_fiber=Decimal(str(item_data["dietary_fiber"])) if item_data.get("dietary_fiber") else None,
-        sugars=Decimal(str(item_data["sugars"])) if item_data.get("sugars") else None,
-        protein=Decimal(str(item_data["protein"])) if item_data.get("protein") else None,
-        vitamin_a=item_data.get("vitamin_a"),
-        vitamin_c=item_data.get("vitamin_c"),
-        vitamin_d=item_data.get("vitamin_d"),
-        calcium=item_data.get("calcium"),
-        iron=item_data.get("iron"),
-        caffeine_mg=item_data.get("caffeine_mg"),
-        # Sustainability
-        carbon_footprint=item_data.get("carbon_footprint"),
-        sustainability_info=item_data.get("sustainability_info"),
-        # Recognition
-        michelin_recommended=item_data.get("michelin_recommended", False),
-        award_winning=item_data.get("award_winning", False),
-        reward_points=item_data.get("reward_points", 0),
-        # Related
-        pairs_well_with=item_data.get("pairs_well_with"),
-        similar_items=item_data.get("similar_items"),
-        tags=item_data.get("tags", []),
-        # Promotions
-        promotion_start_date=datetime.fromisoformat(item_data["promotion_start_date"]).date() if item_data.get("promotion_start_date") else None,
-        promotion_end_date=datetime.fromisoformat(item_data["promotion_end_date"]).date() if item_data.get("promotion_end_date") else None,
-        # Metadata
-        sort_order=item_data.get("sort_order", 0),
-        # Upsell fields
-        is_upsell=item_data.get("is_upsell", False),
-        upsell_style=item_data.get("upsell_style", "standard"),
-        upsell_border_color=item_data.get("upsell_border_color"),
-        upsell_background_color=item_data.get("upsell_background_color"),
-        upsell_badge_text=item_data.get("upsell_badge_text"),
-        upsell_badge_color=item_data.get("upsell_badge_color"),
-        upsell_animation=item_data.get("upsell_animation"),
-        upsell_icon=item_data.get("upsell_icon"),
-        # Multi-item fields
-        is_multi_item=item_data.get("is_multi_item", False),
-        display_as_grid=item_data.get("display_as_grid", True)
-    )
-    
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    # Fields left out of the payload get their column defaults
+    values.setdefault("tags", [])
+    db_item = MenuItem(tenant_id=tenant.id, **values)
     
-    # Item created successfully
+    if db_item.sort_order is None:
+        # Append after the last item, leaving a gap for later moves
+        db_item.sort_order = next_position(db, MENU_ITEMS, db_item)
     
-    # Add allergens if provided
-    if item_data.get("allergen_ids"):
-        for allergen_id in item_data["allergen_ids"]:
-            allergen_icon = db.query(AllergenIcon).filter(
-                AllergenIcon.id == allergen_id,
-                AllergenIcon.tenant_id == tenant.id
-            ).first()
-            
-            if allergen_icon:
-                db_item.allergens.append(allergen_icon)
-        
-        db.commit()
+    db.add(db_item)
+    # Flush for the id; allergens, sub-items and the price range are written
+    # in the same transaction and committed once
+    db.flush()
     
-    # Handle multi-item sub-items
-    if db_item.is_multi_item and item_data.get("sub_item_ids"):
-        for index, sub_item_id in enumerate(item_data["sub_item_ids"]):
-            sub_item = db.query(MenuItem).filter(
-                MenuItem.id == sub_item_id,
-                MenuItem.tenant_id == tenant.id,
-                MenuItem.is_multi_item == False,
-                MenuItem.parent_item_id == None
-            ).first()
-            
-            if sub_item:
-                sub_item.parent_item_id = db_item.id
-                sub_item.sub_item_order = index + 1
+    try:
+        # Add allergens if provided
+        if item_data.get("allergen_ids"):
+            set_item_allergens(db, tenant.id, db_item.id, item_data["allergen_ids"])
         
-        db.commit()
-        # Calculate price range for multi-item
-        db_item.calculate_price_range()
-        db.commit()
+        # Handle multi-item sub-items
+        if db_item.is_multi_item and item_data.get("sub_item_ids"):
+            parent_ids = assign_sub_items(
+                db, tenant.id, db_item.id, item_data["sub_item_ids"], unassigned_only=True
+            )
+            refresh_price_ranges(db, parent_ids)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid allergen or sub-item id: {str(e)}")
     
-    # Invalidate and warm cache for this tenant
-    invalidate_public_menu_cache(tenant.subdomain, db=db, warm_cache=True)
+    db.commit()
     
     return {"id": db_item.id, "message": "Menu item created successfully"}
 
@@ -1000,125 +939,49 @@ async def update_menu_item(
         if not item:
             raise HTTPException(status_code=404, detail="Menu item not found")
         
-        # Update all fields
-        for field, value in item_data.items():
-            # Skip allergen_ids, allergens, and sub_item_ids as they're handled separately
-            if field in ["allergen_ids", "allergens", "sub_item_ids", "sub_items"]:
-                continue
-            
-            try:
-                # Handle integer fields
-                if field in ["category_id", "calories", "preparation_time", "walk_minutes", "run_minutes",
-                             "min_order_quantity", "max_daily_orders", "reward_points", "spicy_level",
-                             "cholesterol", "sodium", "vitamin_a", "vitamin_c", "vitamin_d", 
-                             "calcium", "iron", "caffeine_mg", "sort_order", "parent_item_id", 
-                             "sub_item_order"]:
-                    if value is not None and value != '':
-                        try:
-                            value = int(value)
-                        except (ValueError, TypeError):
-                            value = None
-                    else:
-                        value = None
-                elif field in ["price", "price_without_vat", "promotion_price", "total_fat", 
-                             "saturated_fat", "trans_fat", "total_carbs", "dietary_fiber", 
-                             "sugars", "protein", "reorder_rate", "customer_rating", "best_seller_rank",
-                             "price_min", "price_max"]:
-                    if value is not None and value != '':
-                        try:
-                            value = Decimal(str(value))
-                        except (ValueError, decimal.InvalidOperation):
-                            # If conversion fails, set to None for optional fields
-                            if field in ["price"]:
-                                value = Decimal('0')  # Price is required, default to 0
-                            else:
-                                value = None
-                    else:
-                        value = None
-                elif field in ["promotion_start_date", "promotion_end_date"]:
-                    if value and value != '':
-                        value = datetime.fromisoformat(value).date()
-                    else:
-                        value = None
-                elif field in ["pairs_well_with", "similar_items", "tags"]:
-                    # Handle JSONB fields
-                    if value == '' or value is None:
-                        value = [] if field == "tags" else None
-                    elif isinstance(value, str) and value:
-                        try:
-                            import json
-                            value = json.loads(value)
-                        except:
-                            value = [] if field == "tags" else None
-                
-                if hasattr(item, field) and field not in ["id", "tenant_id", "created_at", "allergens"]:
-                    setattr(item, field, value)
-            except Exception as e:
-                # Error setting field - will be handled by exception below
-                raise HTTPException(status_code=400, detail=f"Invalid value for field '{field}': {str(e)}")
+        # Update all fields; allergen_ids and sub_item_ids are handled separately,
+        # and fields the jobs compute are never taken from a (possibly stale) payload
+        values, errors = parse_menu_item_payload(item_data, ignored=COMPUTED_FIELDS)
+        if errors:
+            raise HTTPException(status_code=400, detail={
+                "message": "Invalid menu item fields",
+                "errors": errors
+            })
+        
+        for field, value in values.items():
+            setattr(item, field, value)
         
         item.updated_at = datetime.utcnow()
         
+        # Write the item before the set-based statements below read it
+        db.flush()
+        
         # Update allergens if provided
         if "allergen_ids" in item_data:
             try:
-                # Clear existing allergens
-                item.allergens = []
-                
-                # Add new allergens
-                for allergen_id in item_data["allergen_ids"]:
-                    allergen_icon = db.query(AllergenIcon).filter(
-                        AllergenIcon.id == allergen_id,
-                        AllergenIcon.tenant_id == tenant.id
-                    ).first()
-                    
-                    if allergen_icon:
-                        item.allergens.append(allergen_icon)
+                set_item_allergens(db, tenant.id, item.id, item_data["allergen_ids"])
             except Exception as e:
                 print(f"[UPDATE MENU ITEM] Error updating allergens: {str(e)}")
                 raise HTTPException(status_code=400, detail=f"Error updating allergens: {str(e)}")
         
+        # Multi-items whose price range may have changed
+        parent_ids = []
+        if item.parent_item_id and "price" in item_data:
+            parent_ids.append(item.parent_item_id)
+        
         # Handle multi-item sub-items updates
         if item.is_multi_item and "sub_item_ids" in item_data:
             try:
-                print(f"[UPDATE MENU ITEM] Processing sub-items: {item_data['sub_item_ids']}")
-                
-                # First, clear parent_item_id from all current sub-items
-                cleared = db.query(MenuItem).filter(
-                    MenuItem.parent_item_id == item.id
-                ).update({"parent_item_id": None, "sub_item_order": 0})
-                print(f"[UPDATE MENU ITEM] Cleared {cleared} existing sub-items")
-                
-                # Then assign new sub-items
-                for index, sub_item_id in enumerate(item_data["sub_item_ids"]):
-                    sub_item = db.query(MenuItem).filter(
-                        MenuItem.id == sub_item_id,
-                        MenuItem.tenant_id == tenant.id,
-                        MenuItem.is_multi_item == False
-                    ).first()
-                    
-                    if sub_item:
-                        sub_item.parent_item_id = item.id
-                        sub_item.sub_item_order = index + 1
-                        print(f"[UPDATE MENU ITEM] Assigned sub-item {sub_item_id} to parent {item.id}")
-                    else:
-                        print(f"[UPDATE MENU ITEM] Sub-item {sub_item_id} not found or invalid")
-                
-                # Calculate price range
-                db.commit()
-                item.calculate_price_range()
+                parent_ids += assign_sub_items(db, tenant.id, item.id, item_data["sub_item_ids"])
             except Exception as e:
                 print(f"[UPDATE MENU ITEM] Error updating sub-items: {str(e)}")
                 raise HTTPException(status_code=400, detail=f"Error updating sub-items: {str(e)}")
         
         try:
+            refresh_price_ranges(db, parent_ids)
+
             db.commit()
             print(f"[UPDATE MENU ITEM] Successfully updated item ID: {item_id}")
-            
-            # Invalidate cache for this tenant - with cache warming
-            print(f"[UPDATE MENU ITEM] Invalidating cache for subdomain: {tenant.subdomain}")
-            invalidate_public_menu_cache(tenant.subdomain, db=db, warm_cache=True)
-            print(f"[UPDATE MENU ITEM] Cache invalidated and warmed for subdomain: {tenant.subdomain}")
         except Exception as e:
             db.rollback()
             print(f"[UPDATE MENU ITEM] Database commit error: {str(e)}")
@@ -1173,26 +1036,134 @@ async def delete_menu_item(
             MenuItem.parent_item_id == item.id
         ).update({"parent_item_id": None, "sub_item_order": 0})
     
-    # If this item is a sub-item of another item, unlink it first
-    if item.parent_item_id:
-        parent_item = db.query(MenuItem).filter(
-            MenuItem.id == item.parent_item_id
-        ).first()
-        if parent_item:
-            # Recalculate price range for parent after removing this sub-item
-            item.parent_item_id = None
-            db.commit()
-            parent_item.calculate_price_range()
+    parent_id = item.parent_item_id
     
     # Delete the item
     db.delete(item)
-    db.commit()
+    db.flush()
     
-    # Invalidate and warm cache for this tenant
-    invalidate_public_menu_cache(tenant.subdomain, db=db, warm_cache=True)
+    # Recalculate price range for the parent after removing this sub-item
+    if parent_id:
+        refresh_price_ranges(db, [parent_id])
+    db.commit()
     
     return {"message": "Menu item deleted successfully"}
 
+@router.post("/menu-items/import")
+async def import_menu_items(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    dry_run: bool = False,
+    current_user: dict = Depends(get_current_user_dict),
+    db: Session = Depends(get_db)
+):
+    """
+    Create and update menu items in bulk from a CSV, XLSX or JSON file.
+    
+    The format comes from the file extension unless given. The whole file is
+    validated first and imported in one transaction; with dry_run=true it is
+    only validated. See menu_import_export.py for the file layout.
+    
+    Raises:
+        HTTPException: 400 with every invalid row if the file is invalid
+    """
+    tenant = get_tenant_from_user(current_user, db)
+    
+    file_format = (format or Path(file.filename or "").suffix.lstrip(".")).lower()
+    if file_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Use one of: {', '.join(IMPORT_FORMATS)}")
+    
+    try:
+        result = import_menu(db, tenant, file.file, file_format, dry_run=dry_run)
+    except MenuImportError as e:
+        raise HTTPException(status_code=400, detail={
+            "message": e.message,
+            "error_count": e.error_count,
+            "errors": e.errors
+        })
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read {file_format} file: {str(e)}")
+    
+    return {**result, "message": "Menu imported successfully" if not dry_run else "Menu file is valid"}
+
+@router.get("/menu-items/export")
+async def export_menu_items(
+    format: str = "csv",
+    current_user: dict = Depends(get_current_user_dict),
+    db: Session = Depends(get_db)
+):
+    """Stream all menu items as CSV, XLSX or JSON in the layout the import accepts"""
+    tenant = get_tenant_from_user(current_user, db)
+    
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Use one of: {', '.join(IMPORT_FORMATS)}")
+    
+    filename = f"{tenant.subdomain}_menu_{datetime.utcnow().strftime('%Y%m%d')}.{format}"
+    return StreamingResponse(
+        stream_menu_export(tenant.id, format),
+        media_type=IMPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# Menu publishing (draft/publish, see menu_publishing.py)
+@router.get("/menu/versions")
+async def get_menu_versions(
+    current_user: dict = Depends(get_current_user_dict),
+    db: Session = Depends(get_db)
+):
+    """Get the published menu version and the kept versions"""
+    tenant = get_tenant_from_user(current_user, db)
+    
+    return {
+        "published_version": tenant.published_menu_version,
+        "versions": list_menu_versions(db, tenant)
+    }
+
+@router.post("/menu/publish")
+async def publish_tenant_menu(
+    current_user: dict = Depends(get_current_user_dict),
+    db: Session = Depends(get_db)
+):
+    """Publish the current menu; until the next publish, menu edits are a draft guests don't see"""
+    tenant = get_tenant_from_user(current_user, db)
+    
+    menu_version = publish_menu(db, tenant.id, current_user.get("id"))
+    
+    return {
+        "version": menu_version.version,
+        "item_count": menu_version.item_count,
+        "published_at": menu_version.published_at,
+        "message": "Menu published successfully"
+    }
+
+@router.post("/menu/versions/{version}/publish")
+async def republish_menu_version(
+    version: int,
+    current_user: dict = Depends(get_current_user_dict),
+    db: Session = Depends(get_db)
+):
+    """Put an earlier published version back in front of guests"""
+    tenant = get_tenant_from_user(current_user, db)
+    
+    try:
+        switch_menu_version(db, tenant, version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return {"version": version, "message": "Menu version published successfully"}
+
+@router.post("/menu/unpublish")
+async def unpublish_tenant_menu(
+    current_user: dict = Depends(get_current_user_dict),
+    db: Session = Depends(get_db)
+):
+    """Stop using published versions: guests see menu edits as soon as they are saved"""
+    tenant = get_tenant_from_user(current_user, db)
+    
+    switch_menu_version(db, tenant, None)
+    
+    return {"message": "Menu is served live"}
+
 # Additional endpoints for images, reviews, etc.
 @router.post("/menu-items/{item_id}/images")
 async def add_menu_item_image(
@@ -1543,22 +1514,11 @@ async def update_menu_items_sort_order(
     tenant = get_tenant_from_user(current_user, db)
     
     try:
-        # Update each item's sort_order
-        for item_data in items:
-            item = db.query(MenuItem).filter(
-                MenuItem.id == item_data["id"],
-                MenuItem.tenant_id == tenant.id
-            ).first()
-            
-            if item:
-                item.sort_order = item_data["sort_order"]
-        
+        # Whole reorder in one UPDATE ... FROM (VALUES ...)
+        updated = apply_sort_orders(db, MenuItem, tenant.id, items)
         db.commit()
         
-        # Invalidate and warm cache for this tenant
-        invalidate_public_menu_cache(tenant.subdomain, db=db, warm_cache=True)
-        
-        return {"message": "Sort order updated successfully"}
+        return {"message": "Sort order updated successfully", "updated": updated}
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -1566,6 +1526,37 @@ async def update_menu_items_sort_order(
             detail=f"Failed to update sort order: {str(e)}"
         )
 
+@router.post("/menu-items/{item_id}/move")
+async def move_menu_item(
+    item_id: int,
+    data: dict,
+    current_user: dict = Depends(get_current_user_dict),
+    db: Session = Depends(get_db)
+):
+    """
+    Move a menu item right after after_id and/or right before before_id.
+    Sub-items move within their multi-item, other items within the menu.
+    """
+    tenant = get_tenant_from_user(current_user, db)
+    
+    item = db.query(MenuItem).filter(
+        MenuItem.id == item_id,
+        MenuItem.tenant_id == tenant.id
+    ).first()
+    
+    if not item:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+    
+    ordered = SUB_ITEMS if item.parent_item_id else MENU_ITEMS
+    try:
+        position = move(db, ordered, item, data.get("before_id"), data.get("after_id"))
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    
+    return {"id": item.id, ordered.order_column: position}
+
 @router.post("/upload-logo")
 async def upload_tenant_logo(
     file: UploadFile = File(...),
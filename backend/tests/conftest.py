@@ -0,0 +1,115 @@
+"""
+Shared fixtures for the backend tests
+
+Tests that use the database run against a real PostgreSQL database
+migrated to head (alembic upgrade head) and are skipped unless
+TEST_DATABASE_URL points at it. Every such test runs inside a transaction
+that is rolled back afterwards. Unit tests of pure functions always run.
+"""
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+else:
+    # database.py requires a URL to build its engine, which never connects
+    # unless a test uses the db fixture (and those are skipped)
+    os.environ.setdefault("DATABASE_URL", "postgresql://localhost/menuiq_test_unconfigured")
+
+@pytest.fixture
+def db():
+    """Session whose changes (commits included) are rolled back after the test"""
+    from sqlalchemy.orm import Session
+    from database import engine
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+@pytest.fixture
+def tenant(db):
+    """A tenant with one category and menu item"""
+    from models import Category, MenuItem, Tenant
+
+    tenant = Tenant(name="Test Tenant", subdomain=f"test-{uuid.uuid4().hex[:12]}", status="active")
+    db.add(tenant)
+    db.flush()
+
+    category = Category(tenant_id=tenant.id, name="Mains", value="mains")
+    db.add(category)
+    db.flush()
+
+    item = MenuItem(tenant_id=tenant.id, category_id=category.id, name="Test Dish", price=10)
+    db.add(item)
+    db.flush()
+
+    tenant.test_item_id = item.id
+    tenant.test_category_id = category.id
+    return tenant
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    """Parquet archive (and its watermark) in a temporary directory"""
+    import analytics_archive
+
+    monkeypatch.setattr(analytics_archive, "ARCHIVE_DIR", tmp_path)
+    monkeypatch.setattr(analytics_archive, "WATERMARK_PATH", tmp_path / "archived_through")
+    return tmp_path
+
+def seed_analytics(db, tenant, start: datetime, sessions):
+    """
+    Insert sessions starting at start, one minute apart. sessions is a list of
+    (device_type, visitor, page_views, item_clicks) tuples; every session gets
+    that many page views and item clicks.
+    """
+    from models import AnalyticsDevice, AnalyticsItemClick, AnalyticsPageView, AnalyticsSession
+
+    devices = {}
+    for index, (device_type, visitor, page_views, item_clicks) in enumerate(sessions):
+        if device_type not in devices:
+            device = AnalyticsDevice(ua_hash=uuid.uuid4().hex, user_agent=f"test {device_type}", device_type=device_type)
+            db.add(device)
+            db.flush()
+            devices[device_type] = device.id
+
+        started_at = start + timedelta(minutes=index)
+        session_id = uuid.uuid4().hex
+        db.add(AnalyticsSession(
+            tenant_id=tenant.id,
+            session_id=session_id,
+            started_at=started_at,
+            duration_seconds=60 * (index + 1),
+            ip_address_hash=f"visitor-{visitor}",
+            device_id=devices[device_type]
+        ))
+        for view in range(page_views):
+            db.add(AnalyticsPageView(
+                tenant_id=tenant.id,
+                session_id=session_id,
+                page_type="category",
+                category_id=tenant.test_category_id,
+                timestamp=started_at + timedelta(seconds=view + 1)
+            ))
+        for click in range(item_clicks):
+            db.add(AnalyticsItemClick(
+                tenant_id=tenant.id,
+                session_id=session_id,
+                item_id=tenant.test_item_id,
+                category_id=tenant.test_category_id,
+                action_type="view_details",
+                timestamp=started_at + timedelta(seconds=click + 30)
+            ))
+    db.flush()
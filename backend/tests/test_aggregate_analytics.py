@@ -0,0 +1,41 @@
+"""
+Catching up the daily rollup
+
+A scheduled run starts the day after the last day in analytics_daily, so days
+a missed run skipped are rolled up by the next one.
+"""
+import os
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+if not os.getenv("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+from aggregate_analytics import aggregate_range, pending_rollup_start
+from conftest import seed_analytics
+from models import AnalyticsDaily
+
+def test_rollup_catches_up_missed_days(db, tenant):
+    today = date.today()
+    last_rolled_up = today - timedelta(days=4)
+    # Only this test's rollup rows exist in the window (rolled back afterwards)
+    db.query(AnalyticsDaily).filter(AnalyticsDaily.date >= last_rolled_up).delete(synchronize_session=False)
+    for days_ago in (4, 3, 2):
+        day = today - timedelta(days=days_ago)
+        seed_analytics(db, tenant, datetime.combine(day, time(12)), [("mobile", "a", 1, 1)])
+    aggregate_range(db, last_rolled_up, last_rolled_up, [tenant.id])
+
+    start = pending_rollup_start(db)
+    assert start == today - timedelta(days=3)
+
+    aggregate_range(db, start, today - timedelta(days=1), [tenant.id])
+    rolled_up = {day for day, in db.query(AnalyticsDaily.date).filter(AnalyticsDaily.tenant_id == tenant.id)}
+    assert rolled_up == {today - timedelta(days=days_ago) for days_ago in (4, 3, 2)}
+
+def test_rollup_start_is_never_after_yesterday(db, tenant):
+    yesterday = date.today() - timedelta(days=1)
+    db.add(AnalyticsDaily(tenant_id=tenant.id, date=yesterday, total_sessions=1))
+    db.flush()
+
+    assert pending_rollup_start(db) == yesterday
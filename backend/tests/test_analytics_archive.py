@@ -0,0 +1,82 @@
+"""
+Archiving raw analytics days to Parquet
+
+A day is exported, deleted from PostgreSQL and read back from the archive;
+the archived_through watermark only moves once the delete has happened.
+"""
+import os
+from datetime import date, datetime, time
+
+import pytest
+
+if not os.getenv("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+import analytics_archive
+from analytics_archive import archive_range, archived_through, read_archive
+from conftest import seed_analytics
+from models import AnalyticsItemClick, AnalyticsPageView, AnalyticsSession
+
+# Far before any monthly partition, so no other data shares the day
+ARCHIVED_DAY = date(2001, 1, 15)
+
+SESSIONS = [
+    ("mobile", "a", 3, 2),
+    ("desktop", "b", 1, 0),
+]
+
+def raw_counts(db, tenant_id: int):
+    return {
+        "analytics_sessions": db.query(AnalyticsSession).filter(AnalyticsSession.tenant_id == tenant_id).count(),
+        "analytics_page_views": db.query(AnalyticsPageView).filter(AnalyticsPageView.tenant_id == tenant_id).count(),
+        "analytics_item_clicks": db.query(AnalyticsItemClick).filter(AnalyticsItemClick.tenant_id == tenant_id).count(),
+    }
+
+def test_archive_round_trip(db, tenant, archive_dir):
+    seed_analytics(db, tenant, datetime.combine(ARCHIVED_DAY, time(12)), SESSIONS)
+    session_ids = {session_id for session_id, in db.query(AnalyticsSession.session_id).filter(
+        AnalyticsSession.tenant_id == tenant.id
+    )}
+
+    archived = archive_range(db, ARCHIVED_DAY, ARCHIVED_DAY)
+
+    assert archived[ARCHIVED_DAY] == {"analytics_sessions": 2, "analytics_page_views": 4, "analytics_item_clicks": 2}
+    assert raw_counts(db, tenant.id) == {"analytics_sessions": 0, "analytics_page_views": 0, "analytics_item_clicks": 0}
+
+    sessions = read_archive("analytics_sessions", tenant.id, ARCHIVED_DAY, ARCHIVED_DAY).to_pylist()
+    assert {row["session_id"] for row in sessions} == session_ids
+    assert {row["ip_address_hash"] for row in sessions} == {"visitor-a", "visitor-b"}
+    assert all(row["tenant_id"] == tenant.id and row["date"] == ARCHIVED_DAY for row in sessions)
+    assert read_archive("analytics_page_views", tenant.id, ARCHIVED_DAY, ARCHIVED_DAY).num_rows == 4
+    clicks = read_archive("analytics_item_clicks", tenant.id, ARCHIVED_DAY, ARCHIVED_DAY, columns=["item_id"])
+    assert clicks.to_pylist() == [{"item_id": tenant.test_item_id}] * 2
+
+def test_watermark_advances_after_delete(db, tenant, archive_dir, monkeypatch):
+    seed_analytics(db, tenant, datetime.combine(ARCHIVED_DAY, time(12)), SESSIONS)
+    archive_day = analytics_archive.archive_day
+    watermarks = []
+
+    def checked_archive_day(db, day):
+        counts = archive_day(db, day)
+        watermarks.append(archived_through())
+        return counts
+
+    monkeypatch.setattr(analytics_archive, "archive_day", checked_archive_day)
+    archive_range(db, ARCHIVED_DAY, ARCHIVED_DAY)
+
+    assert watermarks == [None]
+    assert archived_through() == ARCHIVED_DAY
+
+def test_watermark_kept_when_delete_fails(db, tenant, archive_dir, monkeypatch):
+    seed_analytics(db, tenant, datetime.combine(ARCHIVED_DAY, time(12)), SESSIONS)
+
+    def failing_archive_day(db, day):
+        analytics_archive._export_day(db, "analytics_sessions", day)
+        raise RuntimeError("delete failed")
+
+    monkeypatch.setattr(analytics_archive, "archive_day", failing_archive_day)
+    with pytest.raises(RuntimeError):
+        archive_range(db, ARCHIVED_DAY, ARCHIVED_DAY)
+
+    assert archived_through() is None
+    assert raw_counts(db, tenant.id)["analytics_sessions"] == 2
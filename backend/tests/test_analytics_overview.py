@@ -0,0 +1,172 @@
+"""
+Dashboard figures against the per-metric counts
+
+The single-statement overview (_range_stats_query and
+get_dashboard_overview_optimized) and the today counters must agree with one
+plain COUNT query per figure, including when sessions have several page views
+and item clicks each, and past days must count whether or not they were
+rolled up into analytics_daily.
+"""
+import os
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+if not os.getenv("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+from sqlalchemy import func
+
+from aggregate_analytics import aggregate_range
+from analytics_archive import archive_range
+from analytics_optimizer import AnalyticsOptimizer, day_range
+from conftest import seed_analytics
+from models import AnalyticsDaily, AnalyticsDevice, AnalyticsItemClick, AnalyticsPageView, AnalyticsSession, Tenant
+
+# (device_type, visitor, page_views, item_clicks) per session
+ONE_EVENT_EACH = [
+    ("mobile", "a", 1, 1),
+    ("desktop", "b", 1, 1),
+    ("tablet", "c", 1, 1),
+]
+FAN_OUT = [
+    ("mobile", "a", 3, 2),
+    ("desktop", "b", 1, 0),
+    ("mobile", "a", 2, 4),
+    ("tablet", "c", 0, 3),
+    ("Mobile", "d", 5, 1),
+]
+
+def reference_counts(db, tenant_id: int, range_start: datetime, range_end: datetime):
+    """The overview figures, one query each"""
+    sessions = db.query(AnalyticsSession).filter(
+        AnalyticsSession.tenant_id == tenant_id,
+        AnalyticsSession.started_at >= range_start,
+        AnalyticsSession.started_at < range_end
+    )
+    devices = dict(
+        sessions.join(AnalyticsDevice, AnalyticsDevice.id == AnalyticsSession.device_id)
+        .with_entities(func.lower(AnalyticsDevice.device_type), func.count(AnalyticsSession.id))
+        .group_by(func.lower(AnalyticsDevice.device_type))
+        .all()
+    )
+    return {
+        "sessions": sessions.count(),
+        "visitors": sessions.with_entities(func.count(func.distinct(AnalyticsSession.ip_address_hash))).scalar(),
+        "avg_duration": sessions.filter(AnalyticsSession.duration_seconds > 0).with_entities(
+            func.avg(AnalyticsSession.duration_seconds)
+        ).scalar(),
+        "page_views": db.query(AnalyticsPageView).filter(
+            AnalyticsPageView.tenant_id == tenant_id,
+            AnalyticsPageView.timestamp >= range_start,
+            AnalyticsPageView.timestamp < range_end
+        ).count(),
+        "item_clicks": db.query(AnalyticsItemClick).filter(
+            AnalyticsItemClick.tenant_id == tenant_id,
+            AnalyticsItemClick.timestamp >= range_start,
+            AnalyticsItemClick.timestamp < range_end
+        ).count(),
+        "devices": {device: devices.get(device, 0) for device in ("mobile", "desktop", "tablet")}
+    }
+
+@pytest.fixture(params=[ONE_EVENT_EACH, FAN_OUT], ids=["one_event_each", "fan_out"])
+def today_traffic(request, db, tenant):
+    """Today's sessions for tenant, next to another tenant's and yesterday's traffic"""
+    midnight = datetime.combine(date.today(), time.min)
+    seed_analytics(db, tenant, midnight, request.param)
+    seed_analytics(db, tenant, midnight - timedelta(hours=1), [("mobile", "z", 2, 2)])
+
+    other = Tenant(name="Other Tenant", subdomain=f"{tenant.subdomain}-other", status="active")
+    db.add(other)
+    db.flush()
+    other.test_item_id = tenant.test_item_id
+    other.test_category_id = tenant.test_category_id
+    seed_analytics(db, other, midnight, FAN_OUT)
+
+    return reference_counts(db, tenant.id, *day_range(date.today(), date.today()))
+
+def test_range_stats_query_matches_counts(db, tenant, today_traffic):
+    stats = AnalyticsOptimizer._range_stats_query(db, tenant.id, *day_range(date.today(), date.today())).first()
+
+    assert stats.total_sessions == today_traffic["sessions"]
+    assert stats.unique_visitors == today_traffic["visitors"]
+    assert stats.avg_duration == today_traffic["avg_duration"]
+    assert stats.page_views == today_traffic["page_views"]
+    assert stats.item_clicks == today_traffic["item_clicks"]
+    assert {"mobile": stats.mobile, "desktop": stats.desktop, "tablet": stats.tablet} == today_traffic["devices"]
+
+def test_dashboard_overview_matches_counts(db, tenant, today_traffic):
+    today = date.today()
+
+    overview = AnalyticsOptimizer.get_dashboard_overview_optimized(db, tenant.id, today, today)
+
+    assert overview["total_sessions"] == today_traffic["sessions"]
+    assert overview["unique_visitors"] == today_traffic["visitors"]
+    assert overview["total_page_views"] == today_traffic["page_views"]
+    assert overview["total_item_clicks"] == today_traffic["item_clicks"]
+    assert overview["avg_session_duration"] == int(today_traffic["avg_duration"])
+    assert overview["device_breakdown"] == today_traffic["devices"]
+    assert overview["today_sessions"] == today_traffic["sessions"]
+
+def test_today_realtime_stats_match_counts(db, tenant, today_traffic):
+    stats = AnalyticsOptimizer._get_today_realtime_stats(db, tenant.id)
+
+    assert stats["sessions"] == today_traffic["sessions"]
+    assert stats["visitors"] == today_traffic["visitors"]
+    assert stats["page_views"] == today_traffic["page_views"]
+    assert stats["item_clicks"] == today_traffic["item_clicks"]
+    assert stats["devices"] == today_traffic["devices"]
+    assert sum(stats["hourly_distribution"].values()) == today_traffic["sessions"]
+    assert stats["item_clicks_by_item"] == {tenant.test_item_id: today_traffic["item_clicks"]}
+
+def drop_sketches(db, tenant_id: int):
+    """Make the tenant's rollup rows look like rows written before sketches existed"""
+    db.query(AnalyticsDaily).filter(AnalyticsDaily.tenant_id == tenant_id).update(
+        {AnalyticsDaily.visitor_sketch: None}, synchronize_session=False
+    )
+
+def test_overview_counts_days_without_rollup_row(db, tenant):
+    today = date.today()
+    first_day = today - timedelta(days=3)
+    seed_analytics(db, tenant, datetime.combine(first_day, time(12)), ONE_EVENT_EACH)
+    aggregate_range(db, first_day, first_day, [tenant.id])
+    # Rolled up nowhere: the job has not run (or missed) these days
+    seed_analytics(db, tenant, datetime.combine(today - timedelta(days=2), time(12)), FAN_OUT)
+    seed_analytics(db, tenant, datetime.combine(today - timedelta(days=1), time(23)), [("desktop", "e", 2, 1)])
+    seed_analytics(db, tenant, datetime.combine(today, time.min), ONE_EVENT_EACH)
+    expected = reference_counts(db, tenant.id, *day_range(first_day, today))
+
+    overview = AnalyticsOptimizer.get_dashboard_overview_optimized(db, tenant.id, first_day, today)
+
+    assert overview["total_sessions"] == expected["sessions"]
+    assert overview["unique_visitors"] == expected["visitors"]
+    assert overview["total_page_views"] == expected["page_views"]
+    assert overview["total_item_clicks"] == expected["item_clicks"]
+    assert overview["device_breakdown"] == expected["devices"]
+
+def test_overview_does_not_add_up_unsketched_visitors(db, tenant):
+    first_day = date.today() - timedelta(days=3)
+    last_day = first_day + timedelta(days=1)
+    for day in (first_day, last_day):
+        seed_analytics(db, tenant, datetime.combine(day, time(12)), [("mobile", "a", 1, 0)])
+    aggregate_range(db, first_day, last_day, [tenant.id])
+    drop_sketches(db, tenant.id)
+
+    overview = AnalyticsOptimizer.get_dashboard_overview_optimized(db, tenant.id, first_day, last_day)
+
+    assert overview["total_sessions"] == 2
+    assert overview["unique_visitors"] == 1
+
+def test_overview_reads_unsketched_visitors_from_archive(db, tenant, archive_dir):
+    # Far before any monthly partition, so no other data shares the days
+    first_day = date(2001, 1, 15)
+    last_day = first_day + timedelta(days=1)
+    for day in (first_day, last_day):
+        seed_analytics(db, tenant, datetime.combine(day, time(12)), [("mobile", "a", 1, 0), ("tablet", "b", 0, 1)])
+    archive_range(db, first_day, last_day)
+    drop_sketches(db, tenant.id)
+
+    overview = AnalyticsOptimizer.get_dashboard_overview_optimized(db, tenant.id, first_day, last_day)
+
+    assert overview["total_sessions"] == 4
+    assert overview["unique_visitors"] == 2
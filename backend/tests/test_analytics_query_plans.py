@@ -0,0 +1,131 @@
+"""
+Query plans of the dashboard overview and the daily rollup
+
+Both must reach the raw analytics tables through the composite
+(tenant_id, started_at/timestamp) indexes. The tenant gets a few weeks of
+history next to other tenants' traffic and the tables are analyzed, so the
+planner sees that one tenant's day is a small slice of them.
+"""
+import os
+import re
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+
+if not os.getenv("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+from sqlalchemy import event, insert
+
+from aggregate_analytics import compute_daily_rows
+from analytics_optimizer import AnalyticsOptimizer, day_range
+from models import AnalyticsItemClick, AnalyticsPageView, AnalyticsSession, Tenant
+
+RAW_TABLES = ("analytics_sessions", "analytics_page_views", "analytics_item_clicks")
+
+# Composite index names on the parent tables and on their partitions
+COMPOSITE_INDEX = re.compile(r"tenant_started|tenant_timestamp|tenant_id_started_at|tenant_id_timestamp")
+
+HISTORY_DAYS = 28
+SESSIONS_PER_DAY = 40
+OTHER_TENANTS = 4
+
+def seed_history(db, tenant, today: date):
+    """
+    SESSIONS_PER_DAY sessions (3 page views, 1 click each) on every day of the
+    history, for tenant and for OTHER_TENANTS others
+    """
+    others = [
+        Tenant(name="Other Tenant", subdomain=f"test-{uuid.uuid4().hex[:12]}", status="active")
+        for _ in range(OTHER_TENANTS)
+    ]
+    db.add_all(others)
+    db.flush()
+
+    midnight = datetime.combine(today, datetime.min.time())
+    sessions, page_views, item_clicks = [], [], []
+    for tenant_id in [tenant.id, *(other.id for other in others)]:
+        for day in range(HISTORY_DAYS):
+            for index in range(SESSIONS_PER_DAY):
+                started_at = midnight - timedelta(days=day) + timedelta(minutes=10 * index)
+                session_id = uuid.uuid4().hex
+                sessions.append(dict(
+                    tenant_id=tenant_id, session_id=session_id, started_at=started_at,
+                    ip_address_hash=f"visitor-{index}", duration_seconds=30
+                ))
+                for view in range(3):
+                    page_views.append(dict(
+                        tenant_id=tenant_id, session_id=session_id, page_type="category",
+                        category_id=tenant.test_category_id, timestamp=started_at + timedelta(seconds=view)
+                    ))
+                item_clicks.append(dict(
+                    tenant_id=tenant_id, session_id=session_id, item_id=tenant.test_item_id,
+                    category_id=tenant.test_category_id, action_type="view_details", timestamp=started_at
+                ))
+    db.execute(insert(AnalyticsSession), sessions)
+    db.execute(insert(AnalyticsPageView), page_views)
+    db.execute(insert(AnalyticsItemClick), item_clicks)
+
+    connection = db.connection()
+    for table in RAW_TABLES:
+        connection.exec_driver_sql(f"ANALYZE {table}")
+
+def captured_statements(db, run):
+    """(statement, parameters) of every query run() sends that reads a raw table"""
+    connection = db.connection()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if any(table in statement for table in RAW_TABLES):
+            statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        run()
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+    return statements
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+def assert_composite_index_scans(db, statements):
+    assert statements
+    connection = db.connection()
+    for statement, parameters in statements:
+        plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        nodes = list(plan_nodes(plan[0]["Plan"]))
+
+        raw_scans = [node for node in nodes if node.get("Relation Name", "").startswith(RAW_TABLES)]
+        assert raw_scans, statement
+        assert not [node for node in raw_scans if node["Node Type"] == "Seq Scan"], statement
+
+        raw_indexes = [
+            node["Index Name"] for node in nodes
+            if re.search("|".join(RAW_TABLES), node.get("Index Name", ""))
+        ]
+        assert raw_indexes, statement
+        assert all(COMPOSITE_INDEX.search(name) for name in raw_indexes), (raw_indexes, statement)
+
+def test_overview_uses_tenant_time_indexes(db, tenant):
+    today = date.today()
+    seed_history(db, tenant, today)
+    range_start, range_end = day_range(today, today)
+
+    statements = captured_statements(
+        db, lambda: AnalyticsOptimizer._range_stats_query(db, tenant.id, range_start, range_end).first()
+    )
+
+    assert_composite_index_scans(db, statements)
+
+def test_rollup_uses_tenant_time_indexes(db, tenant):
+    today = date.today()
+    seed_history(db, tenant, today)
+    yesterday = today - timedelta(days=1)
+
+    statements = captured_statements(db, lambda: compute_daily_rows(db, yesterday, yesterday, [tenant.id]))
+
+    assert_composite_index_scans(db, statements)
@@ -0,0 +1,142 @@
+"""
+Bulk menu import and export
+
+A file with any invalid row writes nothing, empty cells leave fields
+unchanged, and an exported menu imports back onto itself unchanged.
+"""
+import io
+import os
+
+import pytest
+
+if not os.getenv("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+import menu_import_export
+from menu_import_export import MenuImportError, import_menu, stream_menu_export
+from models import AllergenIcon, MenuItem
+
+class BorrowedSession:
+    """The test session, lent to code that opens and closes its own"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def menu(db, tenant):
+    """tenant's menu with allergens, tags and a multi-item with two sub-items"""
+    gluten = AllergenIcon(tenant_id=tenant.id, name="gluten", display_name="Gluten")
+    dairy = AllergenIcon(tenant_id=tenant.id, name="dairy", display_name="Dairy")
+    db.add_all([gluten, dairy])
+    db.flush()
+
+    item = db.get(MenuItem, tenant.test_item_id)
+    item.tags = ["spicy", "new"]
+    item.allergens = [gluten, dairy]
+    item.sort_order = 1000
+
+    platter = MenuItem(
+        tenant_id=tenant.id, category_id=tenant.test_category_id, name="Platter",
+        is_multi_item=True, sort_order=2000, tags=[]
+    )
+    db.add(platter)
+    db.flush()
+    for position, name in enumerate(["Small", "Large"], start=1):
+        db.add(MenuItem(
+            tenant_id=tenant.id, category_id=tenant.test_category_id, name=name, price=5 * position,
+            parent_item_id=platter.id, sub_item_order=1000 * position, tags=[]
+        ))
+    db.flush()
+    return tenant
+
+def csv_file(*lines: str) -> io.BytesIO:
+    return io.BytesIO(("\n".join(lines) + "\n").encode())
+
+def export(db, monkeypatch, tenant_id: int, file_format: str) -> bytes:
+    monkeypatch.setattr(menu_import_export, "SessionLocal", lambda: BorrowedSession(db))
+    return b"".join(stream_menu_export(tenant_id, file_format))
+
+def xlsx_rows(data: bytes):
+    return list(menu_import_export.read_rows(io.BytesIO(data), "xlsx"))
+
+def items_by_name(db, tenant_id: int):
+    return {item.name: item for item in db.query(MenuItem).filter(MenuItem.tenant_id == tenant_id)}
+
+def test_one_invalid_row_rejects_file(db, menu):
+    before = db.query(MenuItem).filter(MenuItem.tenant_id == menu.id).count()
+    upload = csv_file(
+        "name,category,price",
+        "Soup,Starters,4.50",
+        "Salad,Starters,not a price",
+        "Cake,Desserts,6",
+    )
+
+    with pytest.raises(MenuImportError) as error:
+        import_menu(db, menu, upload, "csv")
+
+    assert [(e["row"], e["field"]) for e in error.value.errors] == [(3, "price")]
+    assert db.query(MenuItem).filter(MenuItem.tenant_id == menu.id).count() == before
+    assert "Soup" not in items_by_name(db, menu.id)
+
+def test_empty_allergens_cell_keeps_allergens(db, menu):
+    upload = csv_file(
+        "id,name,allergens,tags",
+        f"{menu.test_item_id},Renamed Dish,,",
+    )
+
+    result = import_menu(db, menu, upload, "csv")
+
+    item = db.get(MenuItem, menu.test_item_id)
+    db.refresh(item)
+    assert result["updated"] == 1
+    assert item.name == "Renamed Dish"
+    assert sorted(allergen.name for allergen in item.allergens) == ["dairy", "gluten"]
+    assert item.tags == ["spicy", "new"]
+
+def test_new_items_get_tags_and_positions(db, menu):
+    upload = csv_file(
+        "name,category,price",
+        "Soup,Mains,4.50",
+        "Cake,Desserts,6",
+    )
+
+    result = import_menu(db, menu, upload, "csv")
+
+    items = items_by_name(db, menu.id)
+    assert result == {"created": 2, "updated": 0, "categories_created": 1}
+    assert items["Soup"].tags == [] and items["Cake"].tags == []
+    assert items["Soup"].category_id == menu.test_category_id
+    assert 2000 < items["Soup"].sort_order < items["Cake"].sort_order
+
+@pytest.mark.parametrize("file_format", ["csv", "json", "xlsx"])
+def test_export_import_round_trip(db, menu, monkeypatch, file_format):
+    exported = export(db, monkeypatch, menu.id, file_format)
+
+    result = import_menu(db, menu, io.BytesIO(exported), file_format)
+
+    assert result == {"created": 0, "updated": 4, "categories_created": 0}
+    db.expire_all()
+    if file_format == "xlsx":
+        # Zip timestamps differ between two exports; compare the rows instead
+        assert xlsx_rows(export(db, monkeypatch, menu.id, file_format)) == xlsx_rows(exported)
+    else:
+        assert export(db, monkeypatch, menu.id, file_format) == exported
+
+def test_new_sub_item_goes_after_kept_ones(db, menu):
+    upload = csv_file(
+        "name,category,price,parent_item",
+        "Family,Mains,20,Platter",
+    )
+
+    import_menu(db, menu, upload, "csv")
+
+    items = items_by_name(db, menu.id)
+    assert items["Family"].parent_item_id == items["Platter"].id
+    assert items["Family"].sub_item_order > items["Large"].sub_item_order
+    assert (items["Small"].sub_item_order, items["Large"].sub_item_order) == (1000, 2000)
@@ -0,0 +1,59 @@
+"""
+Published menu snapshots
+
+Snapshots freeze the menu but not the settings: prices are stored as
+numbers and shown in the tenant's current currency.
+"""
+import os
+
+import pytest
+
+if not os.getenv("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+from menu_publishing import publish_menu
+from models import MenuItem, Settings
+from public_menu_routes import current_public_items, format_prices
+from simple_cache import invalidate_public_menu_cache
+
+@pytest.fixture
+def settings(db, tenant):
+    settings = Settings(tenant_id=tenant.id, currency="SAR")
+    db.add(settings)
+    db.flush()
+    return settings
+
+def guest_prices(db, tenant):
+    invalidate_public_menu_cache(tenant.subdomain)
+    items, _ = current_public_items(db, tenant)
+    return {item["id"]: item["price"] for item in items}
+
+def test_snapshot_stores_numeric_prices(db, tenant, settings):
+    version = publish_menu(db, tenant.id)
+
+    assert [item["price"] for item in version.items] == [10.0]
+
+def test_currency_change_reaches_published_menu(db, tenant, settings):
+    publish_menu(db, tenant.id)
+    assert guest_prices(db, tenant) == {tenant.test_item_id: "10.00 SAR"}
+
+    settings.currency = "AED"
+    db.get(MenuItem, tenant.test_item_id).price = 99
+    db.flush()
+
+    # New currency, but still the published price rather than the draft
+    assert guest_prices(db, tenant) == {tenant.test_item_id: "10.00 AED"}
+
+def test_format_prices_keeps_legacy_strings():
+    items = [{
+        "id": 1, "price": 12.5, "promotionPrice": None, "price_min": "5.00 SAR",
+        "sub_items": [{"id": 2, "price": 5, "priceWithoutVat": 4.35}]
+    }]
+
+    formatted = format_prices(items, "USD")
+
+    assert formatted == [{
+        "id": 1, "price": "12.50 USD", "promotionPrice": None, "price_min": "5.00 SAR",
+        "sub_items": [{"id": 2, "price": "5.00 USD", "priceWithoutVat": "4.35 USD"}]
+    }]
+    assert items[0]["price"] == 12.5
@@ -0,0 +1,156 @@
+"""
+Moving rows of ordered lists
+
+move() places a row at the midpoint of its new neighbours, renumbering the
+list first when they leave no room, and only accepts neighbours from the
+same list (tenant, top-level items or one multi-item's sub-items).
+"""
+import os
+
+import pytest
+
+if not os.getenv("TEST_DATABASE_URL"):
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+from models import Category, MenuItem, Tenant
+from ordering import MENU_ITEMS, ORDER_GAP, SUB_ITEMS, move, rebalance_crowded
+
+@pytest.fixture
+def items(db, tenant):
+    """Factory of top-level items of tenant at the given positions"""
+    db.delete(db.get(MenuItem, tenant.test_item_id))
+    db.flush()
+
+    def create(*positions, **fields):
+        created = [
+            MenuItem(
+                tenant_id=tenant.id, category_id=tenant.test_category_id, name=f"Item {index}",
+                sort_order=position, tags=[], **fields
+            )
+            for index, position in enumerate(positions)
+        ]
+        db.add_all(created)
+        db.flush()
+        return created
+    return create
+
+def sub_items(db, parent: MenuItem, *positions):
+    created = [
+        MenuItem(
+            tenant_id=parent.tenant_id, category_id=parent.category_id, name=f"{parent.name} {index}",
+            parent_item_id=parent.id, sub_item_order=position, tags=[]
+        )
+        for index, position in enumerate(positions)
+    ]
+    db.add_all(created)
+    db.flush()
+    return created
+
+def order_of(db, ordered, rows):
+    """rows sorted by their stored position (ties by id), as in the public menu"""
+    db.flush()
+    for row in rows:
+        db.refresh(row)
+    return sorted(rows, key=lambda row: (getattr(row, ordered.order_column), row.id))
+
+def test_after_last_row(db, items):
+    first, second, third = items(1 * ORDER_GAP, 2 * ORDER_GAP, 3 * ORDER_GAP)
+
+    position = move(db, MENU_ITEMS, first, after_id=third.id)
+
+    assert position == 4 * ORDER_GAP
+    assert order_of(db, MENU_ITEMS, [first, second, third]) == [second, third, first]
+
+def test_before_first_row(db, items):
+    first, second, third = items(1 * ORDER_GAP, 2 * ORDER_GAP, 3 * ORDER_GAP)
+
+    position = move(db, MENU_ITEMS, third, before_id=first.id)
+
+    assert position == 0
+    assert order_of(db, MENU_ITEMS, [first, second, third]) == [third, first, second]
+
+def test_between_neighbours_writes_only_the_row(db, items):
+    first, second, third = items(1 * ORDER_GAP, 2 * ORDER_GAP, 3 * ORDER_GAP)
+
+    position = move(db, MENU_ITEMS, third, after_id=first.id, before_id=second.id)
+
+    assert position == ORDER_GAP + ORDER_GAP // 2
+    order = order_of(db, MENU_ITEMS, [first, second, third])
+    assert order == [first, third, second]
+    assert (first.sort_order, second.sort_order) == (1 * ORDER_GAP, 2 * ORDER_GAP)
+
+def test_no_room_rebalances_and_retries(db, items):
+    first, second, third = items(1, 2, 3)
+
+    move(db, MENU_ITEMS, third, after_id=first.id)
+
+    order = order_of(db, MENU_ITEMS, [first, second, third])
+    assert order == [first, third, second]
+    assert first.sort_order == ORDER_GAP
+    assert second.sort_order - first.sort_order > 2
+
+def test_shared_positions(db, items):
+    first, second, third = items(500, 500, 500)
+
+    move(db, MENU_ITEMS, third, after_id=first.id)
+
+    order = order_of(db, MENU_ITEMS, [first, second, third])
+    assert order == [first, third, second]
+    assert len({row.sort_order for row in order}) == 3
+
+def test_after_must_come_before_before(db, items):
+    first, second, third = items(1 * ORDER_GAP, 2 * ORDER_GAP, 3 * ORDER_GAP)
+
+    with pytest.raises(ValueError):
+        move(db, MENU_ITEMS, second, after_id=third.id, before_id=first.id)
+
+def test_neighbour_from_other_tenant(db, items):
+    row, = items(ORDER_GAP)
+    other = Tenant(name="Other Tenant", subdomain=f"other-{row.tenant_id}-{row.id}", status="active")
+    db.add(other)
+    db.flush()
+    category = Category(tenant_id=other.id, name="Mains", value="mains")
+    db.add(category)
+    db.flush()
+    stranger = MenuItem(tenant_id=other.id, category_id=category.id, name="Stranger", sort_order=ORDER_GAP, tags=[])
+    db.add(stranger)
+    db.flush()
+
+    with pytest.raises(ValueError):
+        move(db, MENU_ITEMS, row, after_id=stranger.id)
+    with pytest.raises(ValueError):
+        move(db, MENU_ITEMS, row, before_id=row.id)
+
+def test_neighbour_from_other_list(db, items):
+    row, platter = items(ORDER_GAP, 2 * ORDER_GAP, is_multi_item=True)
+    sub_item, = sub_items(db, platter, ORDER_GAP)
+
+    with pytest.raises(ValueError):
+        move(db, MENU_ITEMS, row, after_id=sub_item.id)
+    with pytest.raises(ValueError):
+        move(db, SUB_ITEMS, sub_item, after_id=row.id)
+
+def test_sub_items_are_scoped_by_parent(db, items):
+    platter, combo = items(ORDER_GAP, 2 * ORDER_GAP, is_multi_item=True)
+    small, medium, large = sub_items(db, platter, 1, 2, 3)
+    other, = sub_items(db, combo, 2)
+
+    move(db, SUB_ITEMS, large, after_id=small.id)
+
+    assert order_of(db, SUB_ITEMS, [small, medium, large]) == [small, large, medium]
+    # Only the platter's sub-items were renumbered
+    db.refresh(other)
+    assert other.sub_item_order == 2
+    with pytest.raises(ValueError):
+        move(db, SUB_ITEMS, small, after_id=other.id)
+
+def test_rebalance_crowded_renumbers_only_crowded_lists(db, items):
+    platter, combo = items(ORDER_GAP, 2 * ORDER_GAP, is_multi_item=True)
+    crowded = sub_items(db, platter, 10, 12, 11)
+    spaced = sub_items(db, combo, ORDER_GAP, 3 * ORDER_GAP)
+
+    rebalance_crowded(db)
+
+    assert order_of(db, SUB_ITEMS, crowded) == [crowded[0], crowded[2], crowded[1]]
+    assert [row.sub_item_order for row in order_of(db, SUB_ITEMS, crowded)] == [ORDER_GAP, 2 * ORDER_GAP, 3 * ORDER_GAP]
+    assert [row.sub_item_order for row in order_of(db, SUB_ITEMS, spaced)] == [ORDER_GAP, 3 * ORDER_GAP]
@@ -0,0 +1,131 @@
+"""
+Promotion, season and meal windows of public menu items
+
+Pure functions: which months a seasonal_availability text covers, how a
+serialized item resolves at a given local time, and when that next changes.
+"""
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from time_windows import WINDOWS_KEY, next_transition, resolve_items, season_months, ttl_until
+
+TZ = ZoneInfo("Asia/Riyadh")
+
+def at(year, month, day, hour=12, minute=0):
+    return datetime(year, month, day, hour, minute, tzinfo=TZ)
+
+def item(windows=None, **fields):
+    data = {"id": 1, "name": "Dish", "price": 20.0, **fields}
+    if windows:
+        data[WINDOWS_KEY] = windows
+    return data
+
+@pytest.mark.parametrize("text, months", [
+    ("Nov-Feb", (1, 2, 11, 12)),
+    ("Dec to Feb", (1, 2, 12)),
+    ("Summer", (6, 7, 8)),
+    ("winter", (1, 2, 12)),
+    ("Spring and Autumn", (3, 4, 5, 9, 10, 11)),
+    ("June, July", (6, 7)),
+    ("sept.", (9,)),
+    ("Jan-Dec", None),
+    ("Available all year round", None),
+    ("Fresh daily", None),
+    ("", None),
+    (None, None),
+])
+def test_season_months(text, months):
+    assert season_months(text) == months
+
+def test_out_of_season_items_are_hidden():
+    winter = item({"months": [12, 1, 2]})
+
+    assert resolve_items([winter], at(2026, 1, 10)) != []
+    assert resolve_items([winter], at(2026, 7, 10)) == []
+
+@pytest.mark.parametrize("promotion, today, shown", [
+    (["2026-03-10", "2026-03-20"], date(2026, 3, 9), False),
+    (["2026-03-10", "2026-03-20"], date(2026, 3, 10), True),
+    (["2026-03-10", "2026-03-20"], date(2026, 3, 20), True),
+    (["2026-03-10", "2026-03-20"], date(2026, 3, 21), False),
+    ([None, "2026-03-20"], date(2020, 1, 1), True),
+    ([None, "2026-03-20"], date(2026, 3, 21), False),
+    (["2026-03-10", None], date(2030, 1, 1), True),
+    (["2026-03-10", None], date(2026, 3, 9), False),
+])
+def test_promotion_bounds(promotion, today, shown):
+    promoted = item({"promotion": promotion}, promotionPrice=15.0)
+    now = datetime(today.year, today.month, today.day, 23, 59, tzinfo=TZ)
+
+    resolved, = resolve_items([promoted], now)
+
+    assert resolved["promotionPrice"] == (15.0 if shown else None)
+    assert WINDOWS_KEY not in resolved
+
+@pytest.mark.parametrize("hour, minute, recommended", [
+    (5, 59, False),
+    (6, 0, True),
+    (10, 59, True),
+    (11, 0, False),
+])
+def test_meal_period(hour, minute, recommended):
+    breakfast = item({"meal": "breakfast"})
+
+    resolved, = resolve_items([breakfast], at(2026, 5, 1, hour, minute))
+
+    assert resolved["recommendedNow"] is recommended
+
+def test_sub_items_are_resolved():
+    platter = item(sub_items=[
+        item({"months": [6, 7, 8]}, id=2),
+        item({"meal": "dinner"}, id=3),
+    ])
+
+    resolved, = resolve_items([platter], at(2026, 12, 1, 19))
+
+    assert [(sub["id"], sub["recommendedNow"]) for sub in resolved["sub_items"]] == [(3, True)]
+    assert resolved["recommendedNow"] is False
+
+@pytest.mark.parametrize("now, transition", [
+    (at(2026, 5, 1, 5), at(2026, 5, 1, 6, 0)),
+    (at(2026, 5, 1, 7), at(2026, 5, 1, 11, 0)),
+    (at(2026, 5, 1, 12), at(2026, 5, 2, 6, 0)),
+])
+def test_next_meal_transition(now, transition):
+    assert next_transition([item({"meal": "breakfast"})], now) == transition
+
+@pytest.mark.parametrize("months, now, transition", [
+    ([6, 7, 8], at(2026, 8, 20), at(2026, 9, 1, 0)),
+    ([6, 7, 8], at(2026, 3, 31, 23, 59), at(2026, 6, 1, 0)),
+    ([11, 12], at(2026, 12, 31, 23), at(2027, 1, 1, 0)),
+    ([12, 1, 2], at(2026, 11, 15), at(2026, 12, 1, 0)),
+])
+def test_next_season_transition_crosses_month_boundary(months, now, transition):
+    assert next_transition([item({"months": months})], now) == transition
+
+def test_next_promotion_transition():
+    promoted = item({"promotion": ["2026-03-10", "2026-03-20"]}, promotionPrice=15.0)
+
+    assert next_transition([promoted], at(2026, 3, 1)) == at(2026, 3, 10, 0)
+    assert next_transition([promoted], at(2026, 3, 15)) == at(2026, 3, 21, 0)
+    assert next_transition([promoted], at(2026, 3, 22)) is None
+
+def test_next_transition_is_earliest_of_all_items():
+    items = [
+        item({"months": [6, 7, 8]}),
+        item(sub_items=[item({"meal": "lunch"}, id=3)]),
+        item(),
+    ]
+
+    assert next_transition(items, at(2026, 5, 31, 13)) == at(2026, 5, 31, 16, 0)
+    assert next_transition([item()], at(2026, 5, 31)) is None
+
+def test_ttl_until():
+    now = datetime.now(timezone.utc)
+
+    assert ttl_until(None, 300) == 300
+    assert ttl_until(now + timedelta(days=1), 300) == 300
+    assert 0 < ttl_until(now + timedelta(seconds=60), 300) <= 60
+    assert ttl_until(now - timedelta(seconds=1), 300) <= 0
@@ -0,0 +1,245 @@
+"""
+Time Windows for MenuIQ
+
+Parts of the public menu depend on the date and time in the tenant's
+timezone (Settings.timezone):
+
+- promotion_price is only shown between promotion_start_date and
+  promotion_end_date (inclusive; a missing date leaves that end open)
+- items whose seasonal_availability names months or seasons ("Summer",
+  "Nov-Feb", "June, July") are left out of the menu outside them
+  (northern hemisphere seasons; any other text means all year)
+- items whose recommended_time is a meal period get recommendedNow while
+  it lasts (MEAL_PERIODS)
+
+Serialized items carry their windows under WINDOWS_KEY, so the live menu and
+published snapshots (menu_publishing.py) are resolved the same way. Between
+two transitions the resolved menu is constant: public responses are cached
+until the next transition of the tenant, and the scheduler's time_windows
+job rebuilds them at that instant (schedule_rebuild/due_rebuilds), so no
+request does date math.
+"""
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from models import MenuItem, Settings
+
+DEFAULT_TIMEZONE = "Asia/Riyadh"
+
+# Key of the windows in a serialized item (never returned to guests)
+WINDOWS_KEY = "_windows"
+
+# recommended_time values (see MenuCardEditor) and their local hours, end excluded
+MEAL_PERIODS = {
+    "breakfast": (time(6), time(11)),
+    "brunch": (time(10), time(14)),
+    "lunch": (time(12), time(16)),
+    "snack": (time(15), time(18)),
+    "dinner": (time(18), time(23)),
+}
+
+# First and last month of each season
+SEASONS = {
+    "spring": (3, 5),
+    "summer": (6, 8),
+    "autumn": (9, 11),
+    "fall": (9, 11),
+    "winter": (12, 2),
+}
+
+MONTH_NAMES = [
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december"
+]
+
+@lru_cache(maxsize=64)
+def zone(name: Optional[str]) -> ZoneInfo:
+    """Timezone called name, or DEFAULT_TIMEZONE if it is missing or unknown"""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ValueError, KeyError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+def tenant_timezone(db: Session, tenant_id: int) -> ZoneInfo:
+    return zone(db.query(Settings.timezone).filter(Settings.tenant_id == tenant_id).scalar())
+
+def running_promotion(today: date):
+    """SQL condition of items with a promotion running on today"""
+    return and_(
+        MenuItem.promotion_price.isnot(None),
+        or_(MenuItem.promotion_start_date.is_(None), MenuItem.promotion_start_date <= today),
+        or_(MenuItem.promotion_end_date.is_(None), MenuItem.promotion_end_date >= today)
+    )
+
+def _month(name: str) -> Optional[Tuple[int, int]]:
+    """(first, last) month of a month name, abbreviation or season"""
+    name = name.strip().rstrip(".")
+    if name in SEASONS:
+        return SEASONS[name]
+    if len(name) >= 3:
+        for number, month_name in enumerate(MONTH_NAMES, 1):
+            if month_name.startswith(name):
+                return number, number
+    return None
+
+@lru_cache(maxsize=1024)
+def season_months(text: Optional[str]) -> Optional[Tuple[int, ...]]:
+    """Months (1-12) seasonal_availability text covers, or None for all year"""
+    if not text:
+        return None
+
+    normalized = text.lower().replace("–", "-").replace("—", "-").replace(" to ", "-")
+    for separator in ("/", "&", " and ", ";"):
+        normalized = normalized.replace(separator, ",")
+
+    months = set()
+    for part in filter(None, (part.strip() for part in normalized.split(","))):
+        bounds = [_month(name) for name in part.split("-")]
+        if len(bounds) > 2 or None in bounds:
+            # Not a list of months or seasons: a description, available all year
+            return None
+        first, last = bounds[0][0], bounds[-1][1]
+        month = first
+        months.add(month)
+        while month != last:
+            month = month % 12 + 1
+            months.add(month)
+
+    if not months or len(months) == 12:
+        return None
+    return tuple(sorted(months))
+
+def item_windows(item: MenuItem) -> Optional[Dict]:
+    """Windows of an item to store in its serialized form, or None if it never changes"""
+    windows = {}
+    if item.promotion_price and (item.promotion_start_date or item.promotion_end_date):
+        windows["promotion"] = [
+            item.promotion_start_date.isoformat() if item.promotion_start_date else None,
+            item.promotion_end_date.isoformat() if item.promotion_end_date else None
+        ]
+    months = season_months(item.seasonal_availability)
+    if months:
+        windows["months"] = list(months)
+    if item.recommended_time in MEAL_PERIODS:
+        windows["meal"] = item.recommended_time
+    return windows or None
+
+def _promotion_bounds(promotion: List[Optional[str]]) -> Tuple[Optional[date], Optional[date]]:
+    start, end = promotion
+    return (
+        date.fromisoformat(start) if start else None,
+        date.fromisoformat(end) if end else None
+    )
+
+def _resolve_item(item_data: Dict, now: datetime) -> Optional[Dict]:
+    windows = item_data.get(WINDOWS_KEY) or {}
+    months = windows.get("months")
+    if months and now.month not in months:
+        return None
+
+    current = {field: value for field, value in item_data.items() if field != WINDOWS_KEY}
+    if windows.get("promotion") and current.get("promotionPrice") is not None:
+        start, end = _promotion_bounds(windows["promotion"])
+        today = now.date()
+        if (start and today < start) or (end and today > end):
+            current["promotionPrice"] = None
+
+    meal = windows.get("meal")
+    if meal:
+        start, end = MEAL_PERIODS[meal]
+        current["recommendedNow"] = start <= now.time() < end
+    else:
+        current["recommendedNow"] = False
+
+    if current.get("sub_items"):
+        current["sub_items"] = resolve_items(current["sub_items"], now)
+    return current
+
+def resolve_items(items: Iterable[Dict], now: datetime) -> List[Dict]:
+    """Serialized items as guests see them at now (tenant local time)"""
+    resolved = []
+    for item_data in items:
+        current = _resolve_item(item_data, now)
+        if current is not None:
+            resolved.append(current)
+    return resolved
+
+def _transitions(windows: Dict, now: datetime) -> Iterable[datetime]:
+    """Instants after now at which an item's windows may change what guests see"""
+    tz = now.tzinfo
+    if windows.get("promotion"):
+        start, end = _promotion_bounds(windows["promotion"])
+        if start:
+            yield datetime.combine(start, time(), tzinfo=tz)
+        if end:
+            yield datetime.combine(end + timedelta(days=1), time(), tzinfo=tz)
+
+    months = windows.get("months")
+    if months:
+        in_season = now.month in months
+        year, month = now.year, now.month
+        for _ in range(12):
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            if (month in months) != in_season:
+                yield datetime(year, month, 1, tzinfo=tz)
+                break
+
+    meal = windows.get("meal")
+    if meal:
+        start, end = MEAL_PERIODS[meal]
+        today = now.date()
+        yield datetime.combine(today, start, tzinfo=tz)
+        yield datetime.combine(today, end, tzinfo=tz)
+        yield datetime.combine(today + timedelta(days=1), start, tzinfo=tz)
+
+def next_transition(items: Iterable[Dict], now: datetime) -> Optional[datetime]:
+    """Earliest instant after now at which serialized items resolve differently"""
+    upcoming = None
+    for item_data in items:
+        for data in [item_data, *(item_data.get("sub_items") or [])]:
+            windows = data.get(WINDOWS_KEY)
+            if not windows:
+                continue
+            for instant in _transitions(windows, now):
+                if instant > now and (upcoming is None or instant < upcoming):
+                    upcoming = instant
+    return upcoming
+
+def ttl_until(transition: Optional[datetime], ttl: int) -> float:
+    """Cache TTL that also ends at transition; not positive if it has passed"""
+    if transition is None:
+        return ttl
+    return min(ttl, (transition - datetime.now(timezone.utc)).total_seconds())
+
+# Next transition of each tenant (by subdomain) whose menu this worker cached
+_rebuilds: Dict[str, datetime] = {}
+_rebuilds_lock = threading.Lock()
+
+def schedule_rebuild(subdomain: str, transition: Optional[datetime]):
+    """Rebuild subdomain's public menu cache at transition (None: no upcoming change)"""
+    with _rebuilds_lock:
+        if transition is None:
+            _rebuilds.pop(subdomain, None)
+        else:
+            _rebuilds[subdomain] = transition
+
+def due_rebuilds() -> List[str]:
+    """Subdomains whose transition has come, removed from the schedule"""
+    now = datetime.now(timezone.utc)
+    with _rebuilds_lock:
+        due = [subdomain for subdomain, transition in _rebuilds.items() if transition <= now]
+        for subdomain in due:
+            del _rebuilds[subdomain]
+    return due
+
+def seconds_until_next_rebuild() -> Optional[float]:
+    with _rebuilds_lock:
+        if not _rebuilds:
+            return None
+        upcoming = min(_rebuilds.values())
+    return max((upcoming - datetime.now(timezone.utc)).total_seconds(), 0)